@@ -0,0 +1,890 @@
+import abc
+import heapq
+import math
+import mmap
+import os
+import threading
+import time
+import wave
+from collections import deque
+
+import pcm
+import stats
+
+
+BLOCK_FRAMES = 512  # Frames mixed per block, the trigger latency is bounded by one block plus the sink latency.
+MAX_VOICES = 16  # Voices that can play at once before the oldest is stolen.
+LIMITER_CEILING = -1.0  # dB relative to full scale the limiter holds the mix under
+LIMITER_RELEASE = 0.25  # Seconds the limiter takes to go from full gain reduction back to none
+STREAM_THRESHOLD = 32 * 1024 * 1024  # Bytes of decoded audio past which a clip is streamed rather than held in memory
+STREAM_CHUNK = 16384  # Frames of the file read and converted at a time when streaming
+READ_AHEAD = 1.0  # Seconds of audio a streaming voice keeps decoded ahead of the mixer
+STOP_FADE = 0.01  # Seconds a stopped voice takes to fade out, so cutting a sound off doesn't click
+
+
+class Clip:
+    """Decoded audio in the engine's native format"""
+    def __init__ (self, data, name=None):
+        self.Data = data  # Any bytes-like object, in pcm.RATE / pcm.CHANNELS / pcm.WIDTH format
+        self.Name = name
+        self.Frames = len(data) // pcm.FRAME_BYTES
+
+    def __len__ (self):
+        return len(self.Data)
+
+
+class StreamClip:
+    """A clip too long to keep in memory. Only the first READ_AHEAD seconds are decoded up front, so a voice can start
+    straight away, the rest is read and converted a piece at a time while it plays."""
+    def __init__ (self, path, fmt, name=None):
+        self.Path = path
+        self.Format = fmt
+        self.Name = name
+        sourceFrames = (fmt.DataEnd - fmt.DataStart) // (fmt.Channels * fmt.Width)
+        self.Frames = sourceFrames * pcm.RATE // fmt.Rate
+
+        # Decode the start now and remember where it ended, so the reader carries on from there
+        head = []
+        size = 0
+        self._Resume = None  # (offset, resampler state) the head ended at, None if the head is the whole clip
+        for chunk, offset, state in self._Decode(fmt.DataStart, None):
+            head.append(chunk)
+            size += len(chunk)
+            if size >= READ_AHEAD * pcm.RATE * pcm.FRAME_BYTES:
+                if offset < fmt.DataEnd:
+                    self._Resume = (offset, state)
+                break
+        self.Head = b"".join(head)
+
+    def __len__ (self):
+        # Only the head is held in memory
+        return len(self.Head)
+
+    def _Decode(self, offset, state):
+        """Generate (converted audio, offset, resampler state) from a byte offset in the file onwards, with the
+        offset and state to carry on from after each chunk"""
+        fmt = self.Format
+        chunkBytes = STREAM_CHUNK * fmt.Channels * fmt.Width
+        with open(self.Path, "rb") as fle:
+            fle.seek(offset)
+            while offset < fmt.DataEnd:
+                data = fle.read(min(chunkBytes, fmt.DataEnd - offset))
+                if not data:
+                    return  # File has been cut short since it was opened
+                offset += len(data)
+                if not fmt.IsNative():
+                    data, state = pcm.ToNative(data, fmt, state)
+                yield data, offset, state
+
+    def Chunks(self, loop=False):
+        """Generate the audio after the head, and if looping then the head and the rest again, forever"""
+        while self._Resume is not None:
+            for chunk, _offset, _state in self._Decode(*self._Resume):
+                yield chunk
+            if not loop:
+                return
+            yield self.Head
+        if loop:
+            # All of it is in the head
+            while True:
+                yield self.Head
+
+
+def LoadClip(path, streamThreshold=None):
+    """Map a wave file into memory and decode it into a Clip.
+
+    Files already in the native format are played straight out of the mapping without being copied. If the decoded
+    clip would be over streamThreshold bytes a StreamClip is returned instead."""
+    with open(path, "rb") as fle:
+        mapped = mmap.mmap(fle.fileno(), 0, access=mmap.ACCESS_READ)
+
+    fmt = pcm.ReadWaveFormat(mapped)
+    if streamThreshold is not None:
+        sourceFrames = (fmt.DataEnd - fmt.DataStart) // (fmt.Channels * fmt.Width)
+        if sourceFrames * pcm.RATE // fmt.Rate * pcm.FRAME_BYTES > streamThreshold:
+            mapped.close()
+            return StreamClip(path, fmt, name=path)
+
+    view = memoryview(mapped)[fmt.DataStart:fmt.DataEnd]
+    if fmt.IsNative():
+        # The view keeps the mapping open for as long as the clip is alive
+        return Clip(view, name=path)
+
+    # Needs converting, so the mapping is only needed until the converted copy has been made
+    data, _state = pcm.ToNative(view, fmt)
+    view.release()
+    mapped.close()
+    return Clip(data, name=path)
+
+
+def LoadRaw(path, streamThreshold=None):
+    """Map a file of raw audio that is already in the native format into a Clip, without copying it.
+
+    As with LoadClip a StreamClip is returned instead if it is over streamThreshold bytes."""
+    size = os.path.getsize(path)
+    size -= size % pcm.FRAME_BYTES
+    fmt = pcm.WaveFormat(pcm.WAVE_FORMAT_PCM, pcm.CHANNELS, pcm.RATE, pcm.WIDTH, 0, size)
+    if streamThreshold is not None and size > streamThreshold:
+        return StreamClip(path, fmt, name=path)
+    if size == 0:
+        return Clip(b"", name=path)  # Empty files can't be mapped
+
+    with open(path, "rb") as fle:
+        mapped = mmap.mmap(fle.fileno(), 0, access=mmap.ACCESS_READ)
+    return Clip(memoryview(mapped)[:size], name=path)
+
+
+class Voice:
+    """A single playing instance of a clip"""
+    def __init__ (self, clip, loop=False, triggered=None, gain=1.0):
+        self.Clip = clip
+        self.Loop = loop
+        self.Gain = gain  # Applied as the voice is mixed, the clip itself is never changed
+        self.Position = 0  # Byte offset of the next sample to be read
+        self.Triggered = triggered  # time.perf_counter() when the voice was requested
+        self.Mixed = None  # time.perf_counter() when the first sample was mixed
+        self.Started = None  # time.perf_counter() when the first sample was handed to the sink
+        self.Finished = False
+
+        # Positions on the engine's sample clock, see AudioEngine.FrameAt. Only changed by the mixer once playing.
+        self.StartFrame = None  # The frame the voice starts on, None for the start of the next block
+        self.StopFrame = None  # The frame the voice ends on, None to play to the end of the clip
+        self.FadeIn = 0  # Frames the voice fades in over once it starts
+        self._Fade = None  # (first frame, end frame, level from, level to) while fading in or out
+
+    def LevelAt(self, frame):
+        """The fade level at a frame of the engine's clock, 1 unless fading"""
+        fade = self._Fade
+        if fade is None:
+            return 1.0
+        first, end, source, target = fade
+        if frame <= first:
+            return source
+        if frame >= end:
+            return target
+        return source + (target - source) * (frame - first) / (end - first)
+
+    def FadeAt(self, frame, frames, level):
+        """Fade from whatever the level is at a frame to the given level over a number of frames"""
+        self._Fade = (frame, frame + frames, self.LevelAt(frame), level)
+
+    def StopAt(self, frame, fade=0):
+        """End the voice at a frame, after fading out over fade frames from it"""
+        if self.StopFrame is not None and self.StopFrame <= frame + fade:
+            return  # Already ending sooner
+        if fade:
+            self.FadeAt(frame, fade, 0.0)
+        self.StopFrame = frame + fade
+
+    def Read(self, size):
+        """Return the next size bytes of audio, wrapping if looping and padding with silence once finished."""
+        data = self.Clip.Data
+        chunk = data[self.Position:self.Position+size]
+        self.Position += len(chunk)
+
+        if len(chunk) == size:
+            return chunk
+
+        # Not enough data left in the clip, either wrap back to the start or pad the end with silence
+        parts = [bytes(chunk)]
+        remaining = size - len(chunk)
+        if self.Loop and len(data):
+            while remaining:
+                chunk = data[0:remaining]
+                parts.append(bytes(chunk))
+                remaining -= len(chunk)
+                self.Position = len(chunk)
+        else:
+            parts.append(bytes(remaining))
+            self.Finished = True
+
+        return b"".join(parts)
+
+
+class StreamVoice (Voice):
+    """A playing instance of a StreamClip. Starts on the clip's head while the Streamer decodes what comes after it.
+
+    The mixer only ever takes audio off the buffer and the streamer only ever adds to it, so neither waits on the
+    other. If the streamer falls behind the gap is filled with silence and counted as an underrun."""
+    def __init__ (self, clip, streamer, loop=False, triggered=None, gain=1.0):
+        Voice.__init__(self, clip, loop=loop, triggered=triggered, gain=gain)
+        self.Streamer = streamer
+
+        self._Buffer = deque([clip.Head])  # Decoded audio waiting to be mixed
+        self._Current = b""  # What's left of the chunk being mixed
+        self._Produced = len(clip.Head)  # Bytes added to the buffer, only changed by the streamer
+        self._Consumed = 0  # Bytes taken off the buffer, only changed by the mixer
+        self._Chunks = None  # The clip's Chunks generator, made on the first fill
+        self._Ended = False  # Set once there is nothing more to add to the buffer
+        self._Filling = threading.Lock()
+
+    def Read(self, size):
+        """Return the next size bytes of audio from the buffer, padding with silence if it runs dry."""
+        parts = []
+        remaining = size
+        while remaining:
+            if not self._Current:
+                try:
+                    self._Current = memoryview(self._Buffer.popleft())
+                except IndexError:
+                    break
+            part = self._Current[:remaining]
+            self._Current = self._Current[remaining:]
+            parts.append(part)
+            remaining -= len(part)
+        self._Consumed += size - remaining
+        self.Position += size - remaining
+
+        if remaining:
+            # The streamer sets _Ended after adding its last chunk, so the buffer has to be looked at again after
+            if self._Ended and not self._Buffer:
+                self.Finished = True
+            else:
+                self.Streamer.Underruns += 1
+            parts.append(bytes(remaining))
+
+        if not self._Ended and self._Produced - self._Consumed < self.Streamer.ReadAhead // 2:
+            self.Streamer.Request(self)
+        return b"".join(parts)
+
+    def Fill(self, target):
+        """Decode ahead until target bytes are waiting to be mixed, returns False once the clip has run out"""
+        with self._Filling:
+            if self._Ended:
+                return False
+            if self._Chunks is None:
+                self._Chunks = self.Clip.Chunks(self.Loop)
+            try:
+                while self._Produced - self._Consumed < target:
+                    chunk = next(self._Chunks)
+                    self._Buffer.append(chunk)
+                    self._Produced += len(chunk)
+            except StopIteration:
+                self._Ended = True
+            except (OSError, ValueError) as e:
+                print("Could not stream {0}: {1}".format(self.Clip.Name, e))
+                self._Ended = True
+            return not self._Ended
+
+    def Close(self):
+        """Close the file being streamed from"""
+        with self._Filling:
+            self._Ended = True
+            if self._Chunks is not None:
+                self._Chunks.close()
+
+
+class Streamer:
+    """Keeps the buffers of every streaming voice topped up from a background thread."""
+    def __init__ (self, readAhead=READ_AHEAD):
+        self.ReadAhead = int(readAhead * pcm.RATE) * pcm.FRAME_BYTES  # Bytes kept decoded ahead of each voice
+        self.Underruns = 0  # Blocks a voice had to pad with silence because its buffer ran dry
+
+        self._Requests = deque()  # Voices running low, filled by the mixer
+        self._Voices = set()  # Voices still streaming, only touched by the streamer thread
+        self._Wake = threading.Event()
+        self._Thread = None
+        self._Running = False
+
+    def Start(self):
+        """Start the streamer thread if it isn't running"""
+        if self._Thread is not None:
+            return
+        self._Running = True
+        self._Thread = threading.Thread(target=self._Run, name="AudioStreamer", daemon=True)
+        self._Thread.start()
+
+    def Close(self):
+        """Stop the streamer thread and close every file being streamed from"""
+        self._Running = False
+        self._Wake.set()
+        if self._Thread is not None:
+            self._Thread.join()
+            self._Thread = None
+
+    def Request(self, voice):
+        """Have a voice's buffer topped up"""
+        self._Requests.append(voice)
+        self._Wake.set()
+
+    def _Run(self):
+        """The streamer thread"""
+        try:
+            while self._Running:
+                # Woken by requests, otherwise look round now and then for voices that have been stopped
+                self._Wake.wait(0.1)
+                self._Wake.clear()
+                while self._Requests:
+                    self._Voices.add(self._Requests.popleft())
+
+                for voice in list(self._Voices):
+                    if voice.Finished or not voice.Fill(self.ReadAhead):
+                        voice.Close()
+                        self._Voices.discard(voice)
+        finally:
+            for voice in self._Voices:
+                voice.Close()
+            self._Voices.clear()
+
+
+class Sequence (abc.ABC):
+    """Starts voices at set frames of the engine's sample clock, such as a Playlist or a Repeater.
+
+    Sequences are run by the mixer, which asks each one for the voices starting before the end of every block, so
+    they are always started on exactly the right sample. Subclasses only have to provide Due."""
+    def __init__ (self, startFrame=None):
+        self.StartFrame = startFrame  # The frame to begin on, None for the next block
+        self.Finished = False
+        self.Playing = []  # Voices it has started that may still be playing
+
+    @abc.abstractmethod
+    def Due(self, engine, blockStart, until):
+        """The voices that start before the frame until, each with its StartFrame set.
+
+        Called on the mixer thread once a block, with blockStart the block's first frame. Voices are made with
+        engine.NewVoice, start no earlier than blockStart and are passed to _Started. Set Finished once nothing more
+        will be started and the last voice has ended, and the mixer stops asking."""
+
+    def _Started(self, voice):
+        """Keep track of a voice that has been handed to the mixer"""
+        self.Playing = [playing for playing in self.Playing if not playing.Finished]
+        self.Playing.append(voice)
+
+
+class Playlist (Sequence):
+    """Clips played one after another, each fading in over the last crossfade seconds of the one before.
+
+    Clips can be added with Add while it plays. With loop set it goes back to the first clip after the last, and with
+    hold set it waits for more clips once it runs out rather than finishing."""
+    def __init__ (self, clips=(), gains=None, crossfade=0.0, loop=False, hold=False, startFrame=None):
+        Sequence.__init__(self, startFrame)
+        self.Clips = list(clips)
+        self.Gains = list(gains) if gains is not None else [1.0] * len(self.Clips)
+        self.Crossfade = int(crossfade * pcm.RATE)  # Frames
+        self.Loop = loop
+        self.Hold = hold
+        self.Index = 0  # The next clip to start
+
+        self._Last = None  # (Voice, frame it ends on) of the last clip started
+
+    def Add(self, clip, gain=1.0):
+        """Put another clip on the end, safe from any thread"""
+        # The gain goes on first, the mixer only looks at as many clips as there are gains
+        self.Gains.append(gain)
+        self.Clips.append(clip)
+
+    def Due(self, engine, blockStart, until):
+        voices = []
+        while True:
+            if self.Index >= len(self.Clips):
+                if not (self.Loop and self.Clips):
+                    if not self.Hold and (self._Last is None or self._Last[1] <= blockStart):
+                        self.Finished = True
+                    return voices
+                self.Index = 0
+
+            clip = self.Clips[self.Index]
+            if self._Last is None:
+                start = self.StartFrame if self.StartFrame is not None else blockStart
+                overlap = 0
+            else:
+                # Crossfades are never more than half of either clip
+                last, end = self._Last
+                overlap = min(self.Crossfade, last.Clip.Frames // 2, clip.Frames // 2)
+                start = max(end - overlap, blockStart)
+                overlap = min(overlap, end - start)
+            if start >= until:
+                return voices
+
+            voice = engine.NewVoice(clip, gain=self.Gains[self.Index])
+            voice.StartFrame = start
+            if overlap > 0:
+                self._Last[0].StopAt(start, overlap)
+                voice.FadeIn = overlap
+            voices.append(voice)
+            self._Started(voice)
+            self._Last = (voice, start + clip.Frames)
+            self.Index += 1
+
+
+class Repeater (Sequence):
+    """A clip retriggered every few beats of a tempo, for a given number of hits or until stopped.
+
+    The hits are worked out from the start rather than from each other, so they never drift off the tempo. Without a
+    start frame the first hit is on the next beat of a grid running from the start of the engine's clock, so every
+    repeater at the same tempo is in time with the others. With choke set each hit cuts off the one before."""
+    def __init__ (self, clip, bpm, beats=1.0, count=None, gain=1.0, choke=True, startFrame=None):
+        if bpm <= 0 or beats <= 0:
+            raise ValueError("the tempo and number of beats have to be more than 0")
+        Sequence.__init__(self, startFrame)
+        self.Clip = clip
+        self.Interval = pcm.RATE * 60.0 * beats / bpm  # Frames between hits, kept fractional
+        self.Count = count  # Hits to play, None to keep going until stopped
+        self.Gain = gain
+        self.Choke = choke
+        self.Hits = 0
+
+        self._Beat = None  # Beats from the origin of the next hit
+
+    def Due(self, engine, blockStart, until):
+        origin = self.StartFrame if self.StartFrame is not None else 0
+        if self._Beat is None:
+            # The first beat that hasn't gone by already
+            self._Beat = max(0, math.ceil((blockStart - origin) / self.Interval))
+
+        voices = []
+        while self.Count is None or self.Hits < self.Count:
+            start = origin + round(self._Beat * self.Interval)
+            if start >= until:
+                return voices
+            voice = engine.NewVoice(self.Clip, gain=self.Gain)
+            voice.StartFrame = start
+            if self.Choke:
+                for playing in self.Playing:
+                    playing.StopAt(start, engine.StopFade)
+            voices.append(voice)
+            self._Started(voice)
+            self._Beat += 1
+            self.Hits += 1
+
+        # Done once the last hit has finished
+        if all(playing.Finished for playing in self.Playing):
+            self.Finished = True
+        return voices
+
+
+class Limiter:
+    """Keeps the mix of several loud voices under a ceiling instead of letting it clip.
+
+    Works a block at a time, the gain drops straight to whatever the block needs and then recovers gradually."""
+    def __init__ (self, ceiling=LIMITER_CEILING, release=LIMITER_RELEASE, blockFrames=BLOCK_FRAMES):
+        self.Ceiling = 10 ** (ceiling / 20)
+        self.Gain = 1.0  # The current gain reduction
+        self._Recovery = blockFrames / pcm.RATE / release  # Gain recovered each block
+
+    def Process(self, wide):
+        """Limit a block of widened audio, returns it in the native format"""
+        peak = pcm.PeakWide(wide)
+        needed = min(1.0, self.Ceiling / peak) if peak else 1.0
+        self.Gain = needed if needed < self.Gain else min(needed, self.Gain + self._Recovery)
+        return pcm.Narrow(wide, self.Gain)
+
+
+class NullSink:
+    """An output that throws the audio away, used when there is no audio device (and for testing)."""
+    Blocking = False  # Blocking sinks pace the mixer themselves, non-blocking sinks are paced by the engine's clock.
+    Latency = 0.0  # Seconds of audio buffered after Write returns
+
+    def Open(self, rate, channels, width):
+        """Prepare the sink for audio in the given format"""
+        pass
+
+    def Write(self, data):
+        """Output a block of audio"""
+        pass
+
+    def Close(self):
+        """Release anything the sink holds on to"""
+        pass
+
+
+class WaveFileSink (NullSink):
+    """Writes everything the engine outputs into a wave file."""
+    def __init__ (self, path):
+        self.Path = path
+        self._File = None
+
+    def Open(self, rate, channels, width):
+        self._File = wave.open(self.Path, "wb")
+        self._File.setnchannels(channels)
+        self._File.setsampwidth(width)
+        self._File.setframerate(rate)
+
+    def Write(self, data):
+        self._File.writeframesraw(data)
+
+    def Close(self):
+        if self._File is not None:
+            self._File.close()
+            self._File = None
+
+
+class DeviceSink (NullSink):
+    """Plays through the default sound card. Needs the optional sounddevice package."""
+    Blocking = True
+
+    def __init__ (self, device=None):
+        # Imported here so the rest of the engine works without it
+        import sounddevice
+        self._sounddevice = sounddevice
+        self.Device = device
+        self._Stream = None
+
+    def Open(self, rate, channels, width):
+        self._Stream = self._sounddevice.RawOutputStream(samplerate=rate, channels=channels, dtype="int16",
+                                                         blocksize=BLOCK_FRAMES, device=self.Device, latency="low")
+        self._Stream.start()
+        self.Latency = self._Stream.latency
+
+    def Write(self, data):
+        self._Stream.write(data)
+
+    def Close(self):
+        if self._Stream is not None:
+            self._Stream.stop()
+            self._Stream.close()
+            self._Stream = None
+
+
+def DefaultSink():
+    """Use the sound card if possible, otherwise fall back to a null sink."""
+    try:
+        return DeviceSink()
+    except (ImportError, OSError) as e:
+        print("No audio device available ({0}), sounds will not be heard.".format(e))
+        return NullSink()
+
+
+class AudioEngine:
+    """Mixes any number of voices together on a background thread and feeds them to a sink.
+
+    Voices can be started on an exact frame of the sample clock (FramesMixed) rather than the next block, and faded
+    in and out. Sequences such as playlists are run by the mixer too, so everything they start is sample accurate."""
+    def __init__ (self, sink=None, maxVoices=MAX_VOICES, blockFrames=BLOCK_FRAMES, stopFade=STOP_FADE):
+        self.Sink = sink if sink is not None else NullSink()
+        self.MaxVoices = maxVoices
+        self.BlockFrames = blockFrames
+        self.BlockSize = blockFrames * pcm.FRAME_BYTES
+        self.FramesMixed = 0  # The engine's sample clock
+        self.StopFade = int(stopFade * pcm.RATE)  # Frames stopped voices fade out over, unless told otherwise
+
+        self.Stolen = 0  # Count of voices that were cut off to make room for new ones
+        self.Late = 0  # Count of voices that were asked to start on a frame that had already been mixed
+        self.Limiter = None  # A Limiter when turned on by SetLimiter
+        self.Streamer = Streamer()  # Reads ahead for the voices of StreamClips
+        self._Offline = False  # Set while rendering, stream buffers are filled on the mixing thread instead
+        self._Latencies = deque(maxlen=512)  # Trigger to first sample times, in seconds
+        self._Errors = deque(maxlen=512)  # Frames between when scheduled voices were asked to start and did
+        self._Jitter = deque(maxlen=512)  # How far behind the sample clock each block was mixed, in seconds
+        self._Clock = (0, time.perf_counter())  # A frame of the sample clock and the time it was heard
+
+        self._Voices = []  # Oldest first, only touched by the mixer
+        self._Scheduled = []  # Heap of (start frame, count, voice) waiting for their block, only touched by the mixer
+        self._Sequences = []  # Only touched by the mixer
+        self._Added = 0  # Breaks ties in the heap
+        self._Commands = deque()  # Filled by any thread, emptied by the mixer. deque appends/pops are atomic.
+        self._Silence = bytes(self.BlockSize)
+
+        self._Thread = None
+        self._Running = False
+        self._Opened = False
+
+    def _Open(self):
+        if not self._Opened:
+            self.Sink.Open(pcm.RATE, pcm.CHANNELS, pcm.WIDTH)
+            self._Opened = True
+
+    def Start(self):
+        """Start the mixer thread, the sink is opened on it so a slow sound card doesn't hold up the caller."""
+        if self._Thread is not None:
+            return
+        self._Running = True
+        self._Thread = threading.Thread(target=self._Run, name="AudioEngine", daemon=True)
+        self._Thread.start()
+
+    def Close(self):
+        """Stop the mixer thread and close the sink"""
+        self._Running = False
+        if self._Thread is not None:
+            self._Thread.join()
+            self._Thread = None
+        self.Streamer.Close()
+        if self._Opened:
+            self.Sink.Close()
+            self._Opened = False
+
+    def NewVoice(self, clip, loop=False, triggered=None, gain=1.0):
+        """A voice for a clip, ready to be played"""
+        if isinstance(clip, StreamClip):
+            voice = StreamVoice(clip, self.Streamer, loop=loop, triggered=triggered, gain=gain)
+            # Start reading past the head straight away
+            self.Streamer.Start()
+            self.Streamer.Request(voice)
+            return voice
+        return Voice(clip, loop=loop, triggered=triggered, gain=gain)
+
+    def Play(self, clip, loop=False, triggered=None, gain=1.0, at=None, fadeIn=0.0):
+        """Queue a clip to start playing at the next block, or on the frame at if given. Returns the new voice.
+
+        triggered is the time.perf_counter() of whatever caused the play, it defaults to now."""
+        triggered = time.perf_counter() if triggered is None else triggered
+        voice = self.NewVoice(clip, loop=loop, triggered=triggered, gain=gain)
+        voice.StartFrame = at
+        voice.FadeIn = int(fadeIn * pcm.RATE)
+        self._Commands.append(("play", voice))
+        return voice
+
+    def PlaySequence(self, sequence):
+        """Start running a Playlist, Repeater or other Sequence. Returns it."""
+        self._Commands.append(("sequence", sequence))
+        return sequence
+
+    def StopAll(self, fade=None):
+        """Stop every voice and sequence at the next block, fading out over fade seconds (StopFade if not given)"""
+        self._Commands.append(("stopall", (None, fade)))
+
+    def Stop(self, voice, at=None, fade=None):
+        """Stop a single voice at the next block or on the frame at, fading out as for StopAll"""
+        self._Commands.append(("stop", (voice, at, fade)))
+
+    def StopSequence(self, sequence, fade=None):
+        """Stop a sequence and anything it has started, fading out as for StopAll"""
+        self._Commands.append(("stopsequence", (sequence, fade)))
+
+    def FrameAt(self, when=None):
+        """The frame of the sample clock that will be heard at a time.perf_counter(), now if not given. Used to start
+        voices at a particular time, it's only as accurate as the sink's reported latency."""
+        frame, heard = self._Clock
+        when = time.perf_counter() if when is None else when
+        return frame + round((when - heard) * pcm.RATE)
+
+    def SetLimiter(self, enabled):
+        """Turn the limiter on the mix on or off"""
+        self.Limiter = Limiter(blockFrames=self.BlockFrames) if enabled else None
+
+    def ActiveVoices(self):
+        """The number of voices currently being mixed"""
+        return len(self._Voices)
+
+    def LatencyBound(self):
+        """The worst case trigger to first sample latency in seconds"""
+        return 2 * self.BlockFrames / pcm.RATE + self.Sink.Latency
+
+    def SchedulingStats(self):
+        """How accurately scheduled voices started, in frames, and how far behind real time recent blocks were mixed,
+        in milliseconds. With an offline render or file sink every voice starts on its frame, so any error is a bug."""
+        errors = list(self._Errors)
+        jitter = list(self._Jitter)
+        stats = {"scheduled": len(errors), "late": self.Late}
+        if errors:
+            stats["max_error_frames"] = max(errors)
+        if jitter:
+            stats["jitter_mean"] = sum(jitter) / len(jitter) * 1000
+            stats["jitter_max"] = max(jitter) * 1000
+        return stats
+
+    def LatencyStats(self):
+        """Trigger to first sample latency of recent voices, in milliseconds"""
+        latencies = list(self._Latencies)
+        stats = {"count": len(latencies), "bound": self.LatencyBound() * 1000}
+        if latencies:
+            stats["last"] = latencies[-1] * 1000
+            stats["mean"] = sum(latencies) / len(latencies) * 1000
+            stats["max"] = max(latencies) * 1000
+        return stats
+
+    def _RunCommands(self):
+        """Apply every queued command, then start the voices due in this block. Returns the voices started."""
+        blockStart = self.FramesMixed
+        blockEnd = blockStart + self.BlockFrames
+        started = []
+        while True:
+            try:
+                command, argument = self._Commands.popleft()
+            except IndexError:
+                break
+
+            if command == "play":
+                self._Schedule(argument, blockStart, blockEnd, started)
+            elif command == "sequence":
+                self._Sequences.append(argument)
+            elif command == "stop":
+                voice, at, fade = argument
+                self._StopVoice(voice, blockStart if at is None else max(at, blockStart), fade)
+            elif command == "stopsequence":
+                sequence, fade = argument
+                if sequence in self._Sequences:
+                    self._Sequences.remove(sequence)
+                sequence.Finished = True
+                for voice in sequence.Playing:
+                    self._StopVoice(voice, blockStart, fade)
+            elif command == "stopall":
+                _at, fade = argument
+                for voice in self._Voices:
+                    self._StopVoice(voice, blockStart, fade)
+                for _start, _count, voice in self._Scheduled:
+                    voice.Finished = True
+                self._Scheduled = []
+                for sequence in self._Sequences:
+                    sequence.Finished = True
+                self._Sequences = []
+
+        # Sequences add what they start in this block, and anything they start sooner than that comes next
+        if self._Sequences:
+            for sequence in self._Sequences:
+                for voice in sequence.Due(self, blockStart, blockEnd):
+                    self._Schedule(voice, blockStart, blockEnd, started)
+            if any(sequence.Finished for sequence in self._Sequences):
+                self._Sequences = [sequence for sequence in self._Sequences if not sequence.Finished]
+
+        while self._Scheduled and self._Scheduled[0][0] < blockEnd:
+            _start, _count, voice = heapq.heappop(self._Scheduled)
+            if not voice.Finished:
+                self._Start(voice, blockStart, started)
+        return started
+
+    def _Schedule(self, voice, blockStart, blockEnd, started):
+        """Start a voice now if it starts in this block, otherwise keep it until its block comes round"""
+        if voice.StartFrame is not None and voice.StartFrame >= blockEnd:
+            self._Added += 1
+            heapq.heappush(self._Scheduled, (voice.StartFrame, self._Added, voice))
+        else:
+            self._Start(voice, blockStart, started)
+
+    def _Start(self, voice, blockStart, started):
+        """Add a voice to the mix, on its StartFrame or at the start of the block if that has already gone by"""
+        # Steal the oldest voices if the limit has been hit
+        while len(self._Voices) >= self.MaxVoices:
+            self._Voices.pop(0).Finished = True
+            self.Stolen += 1
+
+        if voice.StartFrame is None:
+            voice.StartFrame = blockStart
+        else:
+            if voice.StartFrame < blockStart:
+                self.Late += 1
+                self._Errors.append(blockStart - voice.StartFrame)
+                voice.StartFrame = blockStart
+            else:
+                self._Errors.append(0)
+            voice.Triggered = None  # Started when asked, so it has no latency to speak of
+        if voice.FadeIn and voice._Fade is None:
+            voice._Fade = (voice.StartFrame, voice.StartFrame + voice.FadeIn, 0.0, 1.0)
+        self._Voices.append(voice)
+        started.append(voice)
+
+    def _StopVoice(self, voice, frame, fade):
+        """Stop a voice on a frame, fading out over fade seconds (StopFade if None)"""
+        if voice.Finished:
+            return
+        if voice not in self._Voices:
+            # Not started yet, so it never will be
+            voice.Finished = True
+            return
+        voice.StopAt(max(frame, voice.StartFrame), self.StopFade if fade is None else int(fade * pcm.RATE))
+
+    def _MixBlock(self):
+        """Mix one block of every active voice together"""
+        limiter = self.Limiter
+        mix = None
+        blockStart = self.FramesMixed
+        blockEnd = blockStart + self.BlockFrames
+        for voice in self._Voices:
+            if self._Offline and isinstance(voice, StreamVoice):
+                voice.Fill(self.Streamer.ReadAhead)
+
+            if voice.StartFrame > blockStart or (voice.StopFrame is not None and voice.StopFrame < blockEnd):
+                # Starts or ends part way through the block, so only part of it is the voice
+                first = max(voice.StartFrame, blockStart)
+                last = max(first, min(voice.StopFrame if voice.StopFrame is not None else blockEnd, blockEnd))
+                chunk = voice.Read((last - first) * pcm.FRAME_BYTES)
+                if voice._Fade is not None:
+                    chunk = self._Faded(voice, chunk, first, last)
+                chunk = b"".join((bytes((first - blockStart) * pcm.FRAME_BYTES), chunk,
+                                  bytes((blockEnd - last) * pcm.FRAME_BYTES)))
+                if last < blockEnd:
+                    voice.Finished = True
+            else:
+                chunk = voice.Read(self.BlockSize)
+                fade = voice._Fade
+                if fade is not None:
+                    chunk = self._Faded(voice, chunk, blockStart, blockEnd)
+                    if fade[1] <= blockEnd and fade[3] == 1.0:
+                        voice._Fade = None  # Faded all the way in
+
+            if limiter is not None:
+                # Mixed at 32 bits so the limiter sees how far over the sum goes
+                chunk = pcm.Widen(chunk, voice.Gain)
+                mix = chunk if mix is None else pcm.MixWide(mix, chunk)
+            else:
+                if voice.Gain != 1.0:
+                    chunk = pcm.Scale(chunk, voice.Gain)
+                mix = chunk if mix is None else pcm.Mix(mix, chunk)
+        if limiter is not None and mix is not None:
+            mix = limiter.Process(mix)
+
+        # Drop voices that have played to the end
+        if any(voice.Finished for voice in self._Voices):
+            self._Voices = [voice for voice in self._Voices if not voice.Finished]
+
+        self.FramesMixed += self.BlockFrames
+        return self._Silence if mix is None else mix
+
+    @staticmethod
+    def _Faded(voice, chunk, first, last):
+        """Apply a voice's fade to the audio it has for the frames first to last, which the fade may start or end in
+        the middle of"""
+        fadeFirst, fadeEnd, _source, _target = voice._Fade
+        cuts = sorted({first, last, min(max(fadeFirst, first), last), min(max(fadeEnd, first), last)})
+        return b"".join(pcm.Ramp(chunk[(start - first) * pcm.FRAME_BYTES:(end - first) * pcm.FRAME_BYTES],
+                                 voice.LevelAt(start), voice.LevelAt(end)) for start, end in zip(cuts, cuts[1:]))
+
+    def _Step(self):
+        """Mix and output a single block"""
+        start = stats.Start()
+        started = self._RunCommands()
+        block = self._MixBlock()
+        stats.Stop("engine.mix", start)
+        if started:
+            mixed = time.perf_counter()
+            for voice in started:
+                voice.Mixed = mixed
+        self.Sink.Write(block)
+        now = time.perf_counter() + self.Sink.Latency
+        self._Clock = (self.FramesMixed - self.BlockFrames, now)
+
+        for voice in started:
+            voice.Started = now
+            if voice.Triggered is not None:
+                self._Latencies.append(now - voice.Triggered)
+                stats.Record("engine.first_sample", now - voice.Triggered)
+
+    def Render(self, frames):
+        """Mix at least the given number of frames on the calling thread, for offline rendering and tests."""
+        self._Open()
+        self._Offline = True
+        try:
+            for _ in range((frames + self.BlockFrames - 1) // self.BlockFrames):
+                self._Step()
+        finally:
+            self._Offline = False
+
+    def _Run(self):
+        """The mixer thread"""
+        try:
+            self._Open()
+        except Exception as e:  # Sound card libraries raise their own errors
+            print("Could not open the audio output ({0}), sounds will not be heard.".format(e))
+            self.Sink = NullSink()
+            self._Open()
+
+        blockTime = self.BlockFrames / pcm.RATE
+        nextTime = time.perf_counter()
+        while self._Running:
+            # How late this block is being mixed compared to where the clock says it should be
+            if not self.Sink.Blocking:
+                lateness = time.perf_counter() - nextTime
+                self._Jitter.append(lateness)
+                stats.Record("engine.jitter", lateness)
+
+            self._Step()
+
+            if not self.Sink.Blocking:
+                # Pace ourselves to real time as the sink will not do it for us
+                nextTime += blockTime
+                delay = nextTime - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -4 * blockTime:
+                    # Fallen too far behind, don't try to catch up
+                    nextTime = time.perf_counter()
@@ -0,0 +1,408 @@
+import os
+
+# Everything else the manager uses is imported where it is first needed, so scripts and the command line can import
+# this module without paying for the audio engine, sqlite and the process pool up front.
+
+CONTENT_FILE = "Files/content.csv"  # Only used to import and export the catalog
+CATALOG_FILE = "Files/content.db"
+SNAPSHOT_FILE = "Files/content.snapshot"  # Copy of the catalog that's quicker to load, redone whenever it changes
+BOARDS_FOLDER = "Files/Boards/"  # The catalogs of every board but the first, which keeps the files above
+AUDIO_FOLDER = "Files/Audio/"
+PEAKS_FILE = "Files/peaks.db"  # Cache of the waveforms shown on the buttons
+CONVERTED_FOLDER = "Files/Cache/"  # Copies of the clips that aren't in the engine's format, converted ready to play
+HASHES_FILE = "Files/hashes.db"  # Hash of the contents of each audio file, used by both caches and imports
+PAGE_LIMIT = 25
+QUEUE_CROSSFADE = 1.0  # Seconds each queued sound fades in over the end of the one before
+
+
+class AudioManager:
+    """This is the controller for the audio files, kept in the Files folder under root"""
+    def __init__ (self, root=".", sink=None, cacheBudget=None, background=False):
+        import audioengine
+        import boards
+        import clipcache
+        import contentindex
+        import convertcache
+        import executor
+        import folderwatch
+        import hashindex
+        import peaks
+        import prefetch
+
+        self.Root = root
+        self.AudioPath = self.Path(AUDIO_FOLDER)
+        os.makedirs(self.AudioPath, exist_ok=True)
+
+        # Each board has its own catalog, only the one being shown and a few recently used ones are open. The first
+        # board's catalog is created from the old content file the first time it is opened.
+        # With background set, only the start of it is loaded before carrying on (see Catalog.Loaded).
+        self.Boards = boards.Boards(self.Path(BOARDS_FOLDER), self.Path(CATALOG_FILE), self.Path(SNAPSHOT_FILE),
+                                    legacyCsv=self.Path(CONTENT_FILE))
+        self.Boards.OnClose = self._BoardClosing
+        self.Board = boards.DEFAULT_BOARD
+        self.Catalog = self.Boards.Show(self.Board, background=background)
+        self.Files = self.Catalog.Files  # Name | Filename, kept up to date by the catalog
+
+        # One hash of each file, for the converted copies, the waveforms and finding audio imported twice
+        self.Hashes = hashindex.HashIndex(self.Path(HASHES_FILE), self.AudioPath)
+
+        # Decoded audio, keyed by the filenames in Files. Clips in other formats are converted once and kept on disk.
+        self.Converted = convertcache.ConvertCache(self.Path(CONVERTED_FOLDER), self.AudioPath, self.Hashes)
+        self.Cache = clipcache.ClipCache(self.AudioPath, budget=cacheBudget or clipcache.CACHE_BUDGET,
+                                         converted=self.Converted)
+        # Counts the plays of each entry and loads the clips likely to be played next into the cache
+        self.Prefetcher = prefetch.Prefetcher(self)
+
+        # Files dropped into or taken out of the audio folder by other programs are noticed by Sync
+        self.AudioFolder = folderwatch.FolderWatch(self.AudioPath)
+        self.Imports = []  # ImportJobs that may still be running
+        # Imported audio that is already in the folder under another name plays that file, see _ForgetFiles for
+        # when it is deleted
+        self.Blobs = contentindex.ContentIndex(self.AudioPath, self.Hashes)
+
+        # Waveforms of the clips, worked out in the background as they're asked for
+        self.Peaks = peaks.PeakStore(self.Path(PEAKS_FILE), self.AudioPath, self.Hashes)
+
+        # Sounds queued to play one after another, see QueueSoundByTitle
+        self.Queue = None
+
+        # Measures the loudness of new clips so they can all be played at the same level
+        self.LoudnessJob = None
+        self._Cancelled = []  # Jobs stopped by switching board, which may still be saving their last results
+        self._Tidied = False
+
+        # Start the mixer, using the sound card unless told otherwise
+        self.Engine = audioengine.AudioEngine(sink if sink is not None else audioengine.DefaultSink())
+        self.Engine.Start()
+
+        # The window runs everything but playing sounds through here, see Executor
+        self.Worker = executor.Executor()
+
+    def Path (self, name):
+        """Where one of the files or folders above is kept under root"""
+        return os.path.join(self.Root, name)
+
+    def Close (self):
+        """Finish any operations still waiting, stop the audio engine and close the catalog"""
+        self.Worker.Close()
+        self.Engine.Close()
+        self.Peaks.Close()
+        for job in self._Cancelled + [self.LoudnessJob]:
+            if job is not None:
+                job.Cancel()
+                job.Wait()
+        for job in self.Imports:
+            job.Cancel()  # Files already moved are still added
+            job.Wait()
+        self.Prefetcher.Close()
+        self.Hashes.Close()
+        self.Boards.Close()
+
+    def SwitchBoard (self, name):
+        """Show a different board, returns its catalog. Raises KeyError if there is no such board."""
+        self.Catalog = self.Boards.Show(name, background=True)
+        self.Files = self.Catalog.Files
+        self.Board = name
+
+        # The old board's clips can be measured when it is shown again
+        if self.LoudnessJob is not None and self.LoudnessJob.Catalog is not self.Catalog:
+            self.LoudnessJob.Cancel()
+            self._Cancelled.append(self.LoudnessJob)
+            self.LoudnessJob = None
+        return self.Catalog
+
+    def _BoardClosing (self, closing):
+        """Let any measuring of a board that is about to be closed finish first, and save its play counts"""
+        self.Prefetcher.Record()
+        for job in self._Cancelled:
+            if job.Catalog is closing:
+                job.Wait()
+        self._Cancelled = [job for job in self._Cancelled if not job.Finished.is_set()]
+
+    def CreateBoard (self, name):
+        """Make a new empty board, raises ValueError if the name can't be used"""
+        self.Boards.Create(name)
+
+    def DeleteBoard (self, name):
+        """Remove a board that isn't being shown, along with any audio files no other board plays"""
+        board = self.Boards.Get(name)
+        filenames = set(board.Files.values())
+        self.Boards.Delete(name)
+        self._ForgetFiles(filenames)
+
+    def CopyToBoard (self, titles, name):
+        """Add entries to another board, playing the same files. Titles already there get a number added.
+        Returns the titles they were given."""
+        target = self.Boards.Get(name)
+        if target is self.Catalog:
+            return list(titles)
+
+        entries = []
+        copied = []
+        for title in titles:
+            newTitle = title
+            number = 1
+            while newTitle in target:
+                number += 1
+                newTitle = "{0} ({1})".format(title, number)
+            entries.append((newTitle, self.Files[title]))
+            copied.append((title, newTitle))
+        target.AddMany(entries)
+
+        # Same file, same loudness, so there's no need to measure it again
+        measured = {title: rest for title, *rest in self.Catalog.Measurements(titles)}
+        target.SetLoudness([(newTitle, *measured[title]) for title, newTitle in copied if title in measured])
+        return [newTitle for _title, newTitle in copied]
+
+    def LoadFiles (self):
+        """Re-read the catalog from disk."""
+        self.Catalog.Load()
+
+    def ImportCsv (self, path=None):
+        """Append the entries of a CSV content file to the catalog, the one under root if no path is given"""
+        self.Catalog.ImportCsv(path or self.Path(CONTENT_FILE))
+
+    def ExportCsv (self, path=None):
+        """Write the catalog out in the CSV content file format, to the one under root if no path is given"""
+        self.Catalog.ExportCsv(path or self.Path(CONTENT_FILE))
+
+    def PlaySound (self, filename, loop=False, gain=1.0):
+        """Play a sound, it is mixed with anything that is already playing"""
+        clip = self.Cache.Get(filename)
+        return self.Engine.Play(clip, loop=loop, gain=gain)
+
+    def PlaySoundByTitle (self, title, loop=False):
+        """Gets the filename when given a title and plays the file at its normalised level"""
+        # Get file name, then run the PlaySound Method
+        filename = self.Files[title]
+        voice = self.PlaySound(filename, loop=loop, gain=self.Catalog.Gains.get(title, 1.0))
+        self.Prefetcher.Played(self.Catalog, title)
+        return voice
+
+    def QueueSoundByTitle (self, title, crossfade=QUEUE_CROSSFADE):
+        """Play a title once everything queued before it has played, fading into it. Returns the queue's Playlist."""
+        import audioengine
+        clip = self.Cache.Get(self.Files[title])
+        gain = self.Catalog.Gains.get(title, 1.0)
+        self.Prefetcher.Played(self.Catalog, title)
+        if self.Queue is None or self.Queue.Finished:
+            # Held open so sounds queued after the last one ends still go through it
+            self.Queue = audioengine.Playlist(crossfade=crossfade, hold=True)
+            self.Queue.Add(clip, gain)
+            return self.Engine.PlaySequence(self.Queue)
+        self.Queue.Add(clip, gain)
+        return self.Queue
+
+    def RepeatSoundByTitle (self, title, bpm, beats=1.0, count=None):
+        """Retrigger a title in time with a tempo, every given number of beats, until stopped or count hits have
+        played. Returns the Repeater."""
+        import audioengine
+        clip = self.Cache.Get(self.Files[title])
+        repeater = audioengine.Repeater(clip, bpm, beats=beats, count=count, gain=self.Catalog.Gains.get(title, 1.0))
+        self.Engine.PlaySequence(repeater)
+        self.Prefetcher.Played(self.Catalog, title)
+        return repeater
+
+    def MeasureLoudness (self, titles=None):
+        """Measure the given titles, or the clips that haven't been measured yet, in the background.
+
+        Returns the running LoudnessJob, or None if every clip has been measured."""
+        import loudness
+        if self.LoudnessJob is not None and not self.LoudnessJob.Finished.is_set():
+            return self.LoudnessJob
+        self._Cancelled = [job for job in self._Cancelled if not job.Finished.is_set()]
+        if titles is None and len(self.Catalog.Gains) >= len(self.Catalog):
+            return None
+        # Without titles the job finds the unmeasured ones itself, as this runs every time a board is shown
+        self.LoudnessJob = loudness.LoudnessJob(self.Catalog, self.AudioPath, titles=titles).Start()
+        return self.LoudnessJob
+
+    def SetLimiter (self, enabled):
+        """Turn the limiter that stops loud sounds playing at once from clipping on or off"""
+        self.Engine.SetLimiter(enabled)
+
+    def StopSound (self, fade=None):
+        """Stop any sound that is currently playing and empty the queue, fading out over fade seconds (a short
+        fade to stop clicks if not given)"""
+        self.Queue = None
+        self.Engine.StopAll(fade)
+
+    def SoundGenerator (self, max=PAGE_LIMIT, skip=0):
+        """Yields up to max titles in order, starting after the first skip titles"""
+        # The page is sliced straight out of the title index so the cost doesn't depend on the page number
+        for title in self.Catalog.Page(skip, max):
+            yield title
+
+    def PrefetchAround (self, skip, count=PAGE_LIMIT, results=None):
+        """Load the clips of the page of count titles starting at skip, then of the pages either side and the most
+        played ones, in the background ahead of them being played. The pages are of results if it is given, e.g.
+        search results, rather than of the whole board."""
+        self.Prefetcher.Want(self.Catalog, skip, count, results)
+
+    def IndexPeaks (self):
+        """Work out the waveform of every clip in the background, for the ones that aren't cached yet"""
+        self.Peaks.Queue(list(self.Catalog.CopyFiles().values()))
+
+    def IndexOfTitle (self, title):
+        """The position of a title in the list"""
+        return self.Catalog.IndexOf(title)
+
+    def Snapshot (self):
+        """A copy of the Title | Filename map, safe to read off the worker thread"""
+        return self.Catalog.CopyFiles()
+
+    def OrderOfTitles (self, titles):
+        """Those of the titles still on the board, in list order"""
+        return self.Catalog.Ordered(titles)
+
+    def TitlesBetween (self, first, last):
+        """Every title from first to last inclusive, in list order"""
+        return self.Catalog.Between(first, last)
+
+    def Search (self, query):
+        """Titles matching the query, best first"""
+        return self.Catalog.Search(query)
+
+    def PrepareSearch (self):
+        """Build the search index on a background thread"""
+        import threading
+        if self.Catalog.SearchReady():
+            return
+        threading.Thread(target=self.Catalog.PrepareSearch, name="PrepareSearch", daemon=True).start()
+
+    def Sync (self):
+        """Pick up changes made to the catalog or audio folder by other programs. Returns True if anything changed."""
+        changed = self.Catalog.Sync()
+
+        # Imports put their files in the folder before adding the entries, so leave the folder until they're done
+        self.Imports = [job for job in self.Imports if not job.Finished.is_set()]
+        if not self.Imports:
+            changed = self.SyncAudioFolder() or changed
+        return changed
+
+    def SyncAudioFolder (self):
+        """Add entries for wave files that have appeared in the audio folder and drop those whose file has gone.
+
+        Every board plays files from the same folder, so this is the same whichever board is shown. A file that has
+        gone is dropped from every board that played it. A new file no board plays yet is added to the end of the
+        default board, one already played somewhere (e.g. just imported) is left where it is."""
+        import boards
+        import importer
+        change = self.AudioFolder.Poll()
+        if change is None:
+            return False
+        added, removed = change
+
+        changed = False
+        if removed:
+            for filename in removed:
+                self.Cache.Evict(filename)
+            self.Converted.Forget(removed)
+            self.Blobs.Forget(removed)
+            changed = self.Board in self.Boards.DropFiles(removed)
+
+        added = [filename for filename in added if filename.lower().endswith(importer.NATIVE_EXTENSIONS)]
+        used = self.Boards.InUse(added) if added else set()
+        added = sorted(filename for filename in added if filename not in used)
+        if added:
+            target = self.Boards.Get(boards.DEFAULT_BOARD)
+            titles = set(target.CopyFiles())
+            entries = []
+            for filename in added:
+                title = stem = os.path.splitext(filename)[0]
+                number = 1
+                while title in titles:
+                    number += 1
+                    title = "{0} ({1})".format(stem, number)
+                titles.add(title)
+                entries.append((title, filename))
+            target.AddMany(entries)
+            changed = changed or target is self.Catalog
+        return changed
+
+    def DeleteEntry (self, entryName, deleteAudioFile=False):
+        """Delete an entry from the catalog and optionally its audio file."""
+        filename = self.Catalog.Delete(entryName)
+        unused = self._ForgetFiles([filename]) if filename is not None else []
+
+        # Now delete the audio file if it is set too, unless another entry on any board still plays it or an import
+        # has just found it has the same audio.
+        if unused and deleteAudioFile:
+            self.Blobs.Remove(unused)
+
+    def DeleteEntries (self, titles, deleteAudioFiles=False):
+        """Delete a number of entries from the catalog at once and optionally their audio files."""
+        removed = self.Catalog.DeleteMany(titles)
+        unused = self._ForgetFiles(set(removed.values()))
+
+        if deleteAudioFiles:
+            self.Blobs.Remove(unused)
+
+    def _ForgetFiles (self, filenames):
+        """Drop the cached audio of files that no entry on any board plays any more, returns them. Each open catalog
+        counts the titles playing each file, so this only reads boards that aren't open."""
+        used = self.Boards.InUse(filenames)
+        unused = [filename for filename in filenames if filename not in used]
+        for filename in unused:
+            self.Cache.Evict(filename)
+        self.Converted.Forget(unused)
+        return unused
+
+    def TidyConverted (self):
+        """Remove converted copies left behind by files that have gone or by a different output format, once a run"""
+        if self._Tidied:
+            return
+        self._Tidied = True
+        # Other boards play files from the same folder, so anything still in it is kept
+        self.Converted.Collect(os.listdir(self.AudioPath))
+
+    def ImportFiles (self, files, workers=None):
+        """Start importing audio files in the background, returns the running ImportJob"""
+        import importer
+        job = importer.ImportJob(files, self.Catalog, self.AudioPath, workers=workers or importer.WORKERS,
+                                 blobs=self.Blobs).Start()
+        self.Imports.append(job)
+        return job
+
+    def AddEntry (self, files: tuple):
+        """Add audio entries to the catalog, moving (or converting) the files into the audio folder, and wait."""
+        job = self.ImportFiles(files)
+        job.Wait()
+        return job
+
+    def RenameEntry (self, curName, newName):
+        """Rename a current entry to a new name"""
+        self.Catalog.Rename(curName, newName)
+
+    def RenameEntries (self, titles, pattern):
+        """Rename a number of entries at once from a pattern, see PatternNames. Returns the new titles."""
+        names = PatternNames(titles, pattern)
+        self.Catalog.RenameMany(zip(titles, names))
+        return names
+
+    def DeleteAllEntries(self):
+        """Remove every entry from the catalog."""
+        filenames = set(self.Files.values())
+        self.Catalog.Clear()
+        self._ForgetFiles(filenames)
+
+    def MoveEntryUp (self, title):
+        """Moves the audio file entry with the given title up one slot"""
+        return self.Catalog.MoveUp(title)
+
+    def MoveEntryDown(self, title):
+        """Moves the audio file entry with the given title down one slot"""
+        return self.Catalog.MoveDown(title)
+
+    def MoveEntries (self, titles, index):
+        """Move a number of entries so they sit together, in their current order, starting at the given index"""
+        return self.Catalog.MoveMany(titles, index)
+
+
+def PatternNames (titles, pattern):
+    """New names for a number of titles. {title} in the pattern is replaced by the current title and {n} by a number
+    counting up from 1, padded so the names sort in order."""
+    width = len(str(len(titles)))
+    return [pattern.replace("{title}", title).replace("{n}", str(number).zfill(width))
+            for number, title in enumerate(titles, 1)]
+
@@ -0,0 +1,300 @@
+"""Times the AudioManager catalog operations and page rendering against synthetic catalogs of different sizes, and
+checks how accurately the audio engine starts scheduled clips.
+
+    python benchmark.py                        # 10, 1k, 10k and 100k entries, results in bench_results.json
+    python benchmark.py --sizes 10 1000 -o a.json
+    python benchmark.py --compare old.json     # show how the results changed since an earlier run
+
+GUI timings need a display (e.g. run under xvfb-run), without one they are skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+SIZES = (10, 1000, 10000, 100000)
+REPEAT = 20  # Times each quick operation is repeated, the median is reported
+CLIP_FRAMES = 441  # 10ms per synthetic clip
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+
+def WriteClip(path, frames=CLIP_FRAMES):
+    """Write a tiny native format wave file"""
+    out = wave.open(path, "wb")
+    out.setnchannels(2)
+    out.setsampwidth(2)
+    out.setframerate(44100)
+    out.writeframes(b"\x00\x10\x00\xf0" * frames)
+    out.close()
+
+
+def MakeBoard(root, size):
+    """Create a Files folder under root holding size clips and a content.csv listing them"""
+    audio = os.path.join(root, "Files", "Audio")
+    os.makedirs(audio)
+    with open(os.path.join(root, "Files", "content.csv"), "w") as content:
+        for i in range(size):
+            filename = "clip{0}.wav".format(i)
+            WriteClip(os.path.join(audio, filename))
+            content.write("Clip number {0},{1}\n".format(i, filename))
+
+
+def Time(function, repeat=REPEAT, setup=None):
+    """Run function repeat times and return the median and min duration in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "runs": repeat}
+
+
+def BenchCatalog(audiomanager, audioengine, root, size, repeat):
+    """Time the AudioManager operations on a catalog of the given size, kept in the board under root"""
+    results = {}
+
+    start = time.perf_counter()
+    manager = audiomanager.AudioManager(root=root, sink=audioengine.NullSink())
+    results["first_open_csv_import"] = {"median_ms": (time.perf_counter() - start) * 1000, "min_ms": None, "runs": 1}
+
+    results["LoadFiles"] = Time(manager.LoadFiles, repeat=max(1, repeat // 4))
+
+    lastSkip = max(0, size - audiomanager.PAGE_LIMIT)
+    results["SoundGenerator_first_page"] = Time(lambda: list(manager.SoundGenerator(skip=0)), repeat)
+    results["SoundGenerator_last_page"] = Time(lambda: list(manager.SoundGenerator(skip=lastSkip)), repeat)
+
+    middle = manager.Catalog.Index[size // 2]
+    results["MoveEntryUp"] = Time(lambda: manager.MoveEntryUp(middle), repeat)
+    results["MoveEntryDown"] = Time(lambda: manager.MoveEntryDown(middle), repeat)
+
+    names = iter(range(repeat * 2))
+    current = [middle]
+
+    def rename():
+        newName = "Renamed {0}".format(next(names))
+        manager.RenameEntry(current[0], newName)
+        current[0] = newName
+    results["RenameEntry"] = Time(rename, repeat)
+
+    victims = iter(manager.Catalog.Page(0, repeat))
+    results["DeleteEntry"] = Time(lambda: manager.DeleteEntry(next(victims)), min(repeat, size - 1))
+
+    # Import a batch of ten fresh clips each run
+    incoming = tempfile.mkdtemp(dir=root)
+    batches = iter(range(repeat))
+
+    def makeBatch():
+        batch = next(batches)
+        paths = []
+        for i in range(10):
+            path = os.path.join(incoming, "new{0}-{1}.wav".format(batch, i))
+            WriteClip(path)
+            paths.append(path)
+        makeBatch.paths = paths
+    results["AddEntry_10_files"] = Time(lambda: manager.AddEntry(makeBatch.paths), max(1, repeat // 4),
+                                        setup=makeBatch)
+
+    # Trigger to first sample through the null sink, once with a cold cache and once warm
+    title = manager.Catalog.Index[len(manager.Catalog) // 3]
+    manager.Cache.Clear()
+    start = time.perf_counter()
+    voice = manager.PlaySoundByTitle(title)
+    decoded = time.perf_counter()
+    while voice.Started is None:
+        time.sleep(0.0005)
+    results["trigger_cold"] = {"median_ms": (voice.Started - start) * 1000, "min_ms": None, "runs": 1,
+                               "decode_ms": (decoded - start) * 1000}
+
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        voice = manager.PlaySoundByTitle(title)
+        while voice.Started is None:
+            time.sleep(0.0005)
+        latencies.append((voice.Started - start) * 1000)
+    results["trigger_warm"] = {"median_ms": statistics.median(latencies), "min_ms": min(latencies), "runs": repeat}
+
+    manager.Close()
+
+    # Start up again, first from the snapshot written by Close and then without it
+    start = time.perf_counter()
+    manager = audiomanager.AudioManager(root=root, sink=audioengine.NullSink())
+    results["reopen_snapshot"] = {"median_ms": (time.perf_counter() - start) * 1000, "min_ms": None, "runs": 1}
+    manager.Close()
+
+    os.remove(manager.Path(audiomanager.SNAPSHOT_FILE))
+    start = time.perf_counter()
+    manager = audiomanager.AudioManager(root=root, sink=audioengine.NullSink(), background=True)
+    firstPage = time.perf_counter()
+    manager.Catalog.Loaded.wait()
+    results["reopen_background"] = {"median_ms": (firstPage - start) * 1000, "min_ms": None, "runs": 1,
+                                    "loaded_ms": (time.perf_counter() - start) * 1000}
+    manager.Close()
+    return results
+
+
+def BenchGui(audiomanager, audioengine, root, size, repeat):
+    """Time the page renders, returns None if there's no display to open a window on"""
+    import tkinter as tk
+    import main
+
+    manager = audiomanager.AudioManager(root=root, sink=audioengine.NullSink())
+    try:
+        window = main.Window(audioManager=manager)
+    except tk.TclError as e:
+        manager.Close()
+        print("  GUI skipped: " + str(e))
+        return None
+
+    results = {}
+    home = window.GetPage("home")
+    editor = window.GetPage("addremaudio")
+    lastHome = max(0, (size - 1) // audiomanager.PAGE_LIMIT)
+    lastEditor = max(0, (size - 1) // editor.maxPerPage)
+
+    def render(function):
+        function()
+        window.update_idletasks()
+
+    results["Home.loadNames_first_page"] = Time(lambda: render(lambda: home.loadNames(0)), repeat)
+    results["Home.loadNames_last_page"] = Time(lambda: render(lambda: home.loadNames(lastHome)), repeat)
+    results["AddRemoveAudio.loadButtons_first_page"] = Time(lambda: render(lambda: editor.loadButtons(0)), repeat)
+    results["AddRemoveAudio.loadButtons_last_page"] = Time(lambda: render(lambda: editor.loadButtons(lastEditor)),
+                                                            repeat)
+
+    window.Close()
+    return results
+
+
+def BenchScheduler(audioengine, repeat):
+    """Start clicks on chosen frames, render them to a wave file and find where they landed, then see how steadily the
+    mixer thread keeps time against the null sink"""
+    import pcm
+    from array import array
+
+    click = audioengine.Clip(b"\x10\x27\x10\x27" + bytes(99 * pcm.FRAME_BYTES))
+    frames = [1000 + i * 7919 for i in range(repeat * 10)]  # A prime apart, so they land all over the blocks
+    path = os.path.join(tempfile.mkdtemp(prefix="soundboard-bench-"), "schedule.wav")
+    try:
+        engine = audioengine.AudioEngine(audioengine.WaveFileSink(path))
+        for frame in frames:
+            engine.Play(click, at=frame)
+        engine.Render(frames[-1] + engine.BlockFrames)
+        engine.Close()
+
+        with wave.open(path, "rb") as rendered:
+            samples = array("h")
+            samples.frombytes(rendered.readframes(rendered.getnframes()))
+    finally:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    onsets = [index // pcm.CHANNELS for index in range(0, len(samples), pcm.CHANNELS) if samples[index]]
+    errors = [abs(onset - frame) for onset, frame in zip(onsets, frames)] if len(onsets) == len(frames) else [None]
+
+    # Real time, the first click is a block ahead of the clock so it is never late
+    engine = audioengine.AudioEngine(audioengine.NullSink())
+    engine.Start()
+    time.sleep(0.1)
+    start = engine.FrameAt() + engine.BlockFrames
+    repeater = engine.PlaySequence(audioengine.Repeater(click, bpm=600, count=repeat, startFrame=start))
+    while not repeater.Finished:
+        time.sleep(0.01)
+    scheduling = engine.SchedulingStats()
+    engine.Close()
+
+    # Not timings, so kept out of the per size results that --compare looks at
+    return {
+        "clicks": len(frames),
+        "offline_max_error_frames": max(errors) if None not in errors else None,
+        "realtime_jitter_mean_ms": scheduling.get("jitter_mean"),
+        "realtime_jitter_max_ms": scheduling.get("jitter_max"),
+        "realtime_late": scheduling["late"],
+        "realtime_max_error_frames": scheduling.get("max_error_frames"),
+    }
+
+
+def GitCommit():
+    """The commit being benchmarked, if this is a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def Run(sizes, repeat, gui=True):
+    """Benchmark every size, returns the results as a dictionary ready to be saved as JSON"""
+    import audiomanager
+    import audioengine
+
+    report = {
+        "commit": GitCommit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sizes": {},
+    }
+
+    for size in sizes:
+        print("Benchmarking {0} entries...".format(size))
+        root = tempfile.mkdtemp(prefix="soundboard-bench-")
+        try:
+            MakeBoard(root, size)
+            results = BenchCatalog(audiomanager, audioengine, root, size, repeat)
+            if gui:
+                guiResults = BenchGui(audiomanager, audioengine, root, size, repeat)
+                if guiResults is not None:
+                    results.update(guiResults)
+            report["sizes"][str(size)] = results
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print("Benchmarking the scheduler...")
+    report["scheduler"] = BenchScheduler(audioengine, repeat)
+    return report
+
+
+def Compare(old, new):
+    """Print how each timing changed between two reports"""
+    print("{0:<42}{1:>10}{2:>14}{3:>14}{4:>9}".format("operation", "entries", "old ms", "new ms", "ratio"))
+    for size, results in new["sizes"].items():
+        for name, result in results.items():
+            before = old.get("sizes", {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            print("{0:<42}{1:>10}{2:>14.3f}{3:>14.3f}{4:>9.2f}".format(name, size, before["median_ms"],
+                                                                     result["median_ms"], ratio))
+
+
+def Main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the soundboard's catalog operations.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="catalog sizes to test")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="runs of each quick operation")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results to compare against")
+    parser.add_argument("--no-gui", action="store_true", help="skip the page render timings")
+    args = parser.parse_args(argv)
+
+    report = Run(args.sizes, args.repeat, gui=not args.no_gui)
+    with open(args.output, "w") as out:
+        json.dump(report, out, indent=2)
+    print("Results written to " + args.output)
+
+    if args.compare:
+        with open(args.compare) as fle:
+            Compare(json.load(fle), report)
+
+
+if __name__ == "__main__":
+    Main()
@@ -0,0 +1,152 @@
+import os
+import re
+import sqlite3
+from collections import OrderedDict
+
+import catalog
+
+
+DEFAULT_BOARD = "Main"  # The board every older install already has
+WARM_BOARDS = 3  # Boards kept open, counting the one being shown, so switching back to them is instant
+
+_NAME = re.compile(r"^[\w][\w \-]{0,63}$")  # Letters, digits, spaces, dashes and underscores
+
+
+class Boards:
+    """The named boards, each with its own catalog stored in folder.
+
+    Only the boards that have been used recently are open, the least recently used one is closed once more than
+    warm are. Every board plays files from the same audio folder, so a clip on several boards is one file and one
+    entry in the clip cache."""
+    def __init__ (self, folder, defaultPath, defaultSnapshot=None, legacyCsv=None, warm=WARM_BOARDS):
+        self.Folder = folder
+        self.DefaultPath = defaultPath
+        self.DefaultSnapshot = defaultSnapshot
+        self.LegacyCsv = legacyCsv
+        self.Warm = warm
+
+        self.Active = DEFAULT_BOARD  # The board being shown, never closed to make room
+        self.OnClose = None  # Called with a catalog just before it is closed to make room for another
+        self._Open = OrderedDict()  # Name | Catalog, least recently used first
+
+        os.makedirs(folder, exist_ok=True)
+
+    def __contains__ (self, name):
+        return name == DEFAULT_BOARD or os.path.exists(self._Paths(name)[0])
+
+    def _Paths(self, name):
+        """The (database, snapshot) paths of a board"""
+        if name == DEFAULT_BOARD:
+            return self.DefaultPath, self.DefaultSnapshot
+        base = os.path.join(self.Folder, name)
+        return base + ".db", base + ".snapshot"
+
+    def Names(self):
+        """Every board, the default first and the rest in alphabetical order"""
+        names = sorted(entry[:-3] for entry in os.listdir(self.Folder) if entry.endswith(".db"))
+        return [DEFAULT_BOARD] + [name for name in names if name != DEFAULT_BOARD]
+
+    def Show(self, name, background=False):
+        """Make a board the active one and return its catalog. Raises KeyError if there is no such board."""
+        board = self.Get(name, background=background)
+        self.Active = name
+        return board
+
+    def Get(self, name, background=False):
+        """The catalog of a board, opened if it isn't already. Raises KeyError if there is no such board."""
+        board = self._Open.get(name)
+        if board is not None:
+            self._Open.move_to_end(name)
+            return board
+
+        if name not in self:
+            raise KeyError(name)
+        path, snapshot = self._Paths(name)
+        board = catalog.Open(path, legacyCsv=self.LegacyCsv if name == DEFAULT_BOARD else None, snapshot=snapshot,
+                             background=background)
+        self._Open[name] = board
+
+        for oldName in list(self._Open):
+            if len(self._Open) <= self.Warm:
+                break
+            if oldName not in (name, self.Active):
+                self._Close(oldName)
+        return board
+
+    def IsOpen(self, name):
+        """True if a board's catalog is in memory"""
+        return name in self._Open
+
+    def InUse(self, filenames):
+        """The filenames that an entry on any board plays, boards that aren't open are read straight from disk"""
+        filenames = set(filenames)
+        used = set()
+        for board in self._Open.values():
+            used.update(filename for filename in filenames if filename in board.Files.Uses)
+        for name in self.Names():
+            if name in self._Open or not filenames - used:
+                continue
+            used.update(self._Played(name) & filenames)
+        return used
+
+    def DropFiles(self, filenames):
+        """Remove the entries playing any of the filenames from every board, for files that have gone from the audio
+        folder. Boards that aren't open are only opened if they play one. Returns the names of the boards changed."""
+        filenames = set(filenames)
+        changed = []
+        for name in self.Names():
+            board = self._Open.get(name)
+            if board is None:
+                if not self._Played(name) & filenames:
+                    continue
+                board = catalog.Catalog(*self._Paths(name))
+                try:
+                    board.DeleteMany([title for title, filename in board.CopyFiles().items() if filename in filenames])
+                finally:
+                    board.Close()
+                changed.append(name)
+            elif board.DeleteMany([title for title, filename in board.CopyFiles().items() if filename in filenames]):
+                changed.append(name)
+        return changed
+
+    def _Played(self, name):
+        """The filenames the entries of a board that isn't open play, read straight from its database"""
+        db = sqlite3.connect(self._Paths(name)[0])
+        try:
+            return {filename for (filename,) in db.execute("SELECT DISTINCT filename FROM entries")}
+        finally:
+            db.close()
+
+    def Create(self, name):
+        """Make a new empty board, raises ValueError if the name can't be used"""
+        if not _NAME.match(name) or name.endswith(".db"):
+            raise ValueError("board names can only have letters, numbers, spaces, dashes and underscores")
+        if name in self:
+            raise ValueError("there is already a board called " + name)
+        catalog.Catalog(self._Paths(name)[0]).Close()
+
+    def Delete(self, name):
+        """Remove a board and its entries, the audio files are left for the other boards"""
+        if name == DEFAULT_BOARD:
+            raise ValueError("the {0} board can't be removed".format(DEFAULT_BOARD))
+        if name == self.Active:
+            raise ValueError("the board being shown can't be removed")
+        if name in self._Open:
+            self._Close(name)
+        path, snapshot = self._Paths(name)
+        for leftover in (path, path + "-wal", path + "-shm", path + catalog.JOURNAL_SUFFIX, snapshot):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    def _Close(self, name):
+        """Close a single open board"""
+        board = self._Open.pop(name)
+        if self.OnClose is not None:
+            self.OnClose(board)
+        board.Close()
+
+    def Close(self):
+        """Close every open board"""
+        while self._Open:
+            _name, board = self._Open.popitem()
+            board.Close()
@@ -0,0 +1,1122 @@
+import csv
+import marshal
+import os
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
+
+import stats
+from searchindex import SearchIndex
+from titleindex import TitleIndex
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    title TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    gain REAL,  -- Playback gain that brings the clip to the target loudness, NULL until measured
+    loudness REAL,  -- dB relative to full scale, NULL until measured or if the clip is silent
+    peak REAL,
+    plays INTEGER NOT NULL DEFAULT 0,  -- Times the entry has been triggered
+    played REAL  -- time.time() it was last triggered, NULL if it never has been
+);
+CREATE INDEX IF NOT EXISTS entries_position ON entries (position);
+CREATE TABLE IF NOT EXISTS hotkeys (
+    key TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    scope TEXT NOT NULL
+);
+-- Every write to entries logs the titles it touched, so other instances only need to re-read those. A NULL title
+-- means the key bindings changed.
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT
+);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    INSERT INTO changes (title) VALUES (new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE ON entries BEGIN
+    INSERT INTO changes (title) VALUES (old.title);
+    INSERT INTO changes (title) SELECT new.title WHERE new.title IS NOT old.title;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    INSERT INTO changes (title) VALUES (old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS hotkeys_insert AFTER INSERT ON hotkeys BEGIN
+    INSERT INTO changes (title) VALUES (NULL);
+END;
+CREATE TRIGGER IF NOT EXISTS hotkeys_update AFTER UPDATE ON hotkeys BEGIN
+    INSERT INTO changes (title) VALUES (NULL);
+END;
+CREATE TRIGGER IF NOT EXISTS hotkeys_delete AFTER DELETE ON hotkeys BEGIN
+    INSERT INTO changes (title) VALUES (NULL);
+END;
+-- The number of the last edit from the journal that has been written here
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# Columns added to tables since they were first made, (table, column, type)
+COLUMNS = (
+    ("entries", "gain", "REAL"),
+    ("entries", "loudness", "REAL"),
+    ("entries", "peak", "REAL"),
+    ("entries", "plays", "INTEGER NOT NULL DEFAULT 0"),
+    ("entries", "played", "REAL"),
+)
+
+SNAPSHOT_VERSION = 2  # Bumped whenever the layout of the snapshot file changes
+FIRST_LOAD = 100  # Entries read straight away when the rest of the catalog is loaded in the background
+SYNC_LIMIT = 2000  # Changed titles past which Sync re-reads the whole catalog rather than each title
+CHANGE_LOG_LIMIT = 20000  # Rows of the change log kept when closing, an instance further behind than this reloads
+FLUSH_INTERVAL = 0.5  # Seconds edits wait in the journal, so a burst of them goes into the database together
+JOURNAL_SUFFIX = ".edits"  # Added to the database path to give the journal's
+JOURNAL_LIMIT = 4 << 20  # Bytes, past which the journal is rewritten with only the edits still waiting
+
+SET_POSITION = "UPDATE entries SET position=? WHERE title=?"
+RECORD = struct.Struct("<I")  # The length of each marshalled edit in the journal
+
+
+def Signature(path):
+    """The size and modification time of a database and its write ahead log, changes whenever anything is written."""
+    signature = []
+    for name in (path, path + "-wal"):
+        try:
+            info = os.stat(name)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((info.st_size, info.st_mtime_ns))
+    return tuple(signature)
+
+
+def SyncData(fd):
+    """Make sure what has been written to a file is on disk, without waiting on its metadata where the OS allows"""
+    getattr(os, "fdatasync", os.fsync)(fd)
+
+
+def LockFile(fd):
+    """Take an exclusive lock on an open file without waiting, returns False if another program (or another open
+    of the same file) has it. The lock goes when the file is closed or the program ends."""
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def ReadJournal(data):
+    """The (sequence, statements) edits in the bytes of a journal, stopping at one that was only partly written"""
+    edits = []
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        size, = RECORD.unpack_from(data, offset)
+        end = offset + RECORD.size + size
+        if end > len(data):
+            break
+        try:
+            edits.append(marshal.loads(data[offset + RECORD.size:end]))
+        except (EOFError, ValueError, TypeError):
+            break
+        offset = end
+    return edits
+
+
+def Coalesce(edits):
+    """The statements of a number of (sequence, statements) edits as (sql, rows) to run with executemany.
+
+    Statements that follow one another are run together, and where a run moves the same entry more than once only
+    its last position is kept."""
+    runs = []
+    for _sequence, statements in edits:
+        for sql, rows in statements:
+            if runs and runs[-1][0] == sql:
+                runs[-1][1].extend(rows)
+            else:
+                runs.append((sql, list(rows)))
+    for sql, rows in runs:
+        if sql == SET_POSITION:
+            latest = {title: position for position, title in rows}
+            rows[:] = [(position, title) for title, position in latest.items()]
+    return runs
+
+
+class FileMap (dict):
+    """Title | Filename, which also keeps count of the titles playing each file, so finding whether anything still
+    plays a file doesn't mean going through every entry"""
+    def __init__ (self):
+        super().__init__()
+        self.Uses = Counter()  # Filename | Titles playing it, only files with at least one
+
+    def __setitem__(self, title, filename):
+        if title in self:
+            self._Release(dict.__getitem__(self, title))
+        dict.__setitem__(self, title, filename)
+        self.Uses[filename] += 1
+
+    def __delitem__(self, title):
+        self._Release(dict.pop(self, title))
+
+    def pop(self, title, *default):
+        if title not in self:
+            return dict.pop(self, title, *default)
+        filename = dict.pop(self, title)
+        self._Release(filename)
+        return filename
+
+    def update(self, other):
+        if not self:
+            dict.update(self, other)
+            self.Uses.update(other.values())
+            return
+        for title, filename in other.items():
+            self[title] = filename
+
+    def clear(self):
+        dict.clear(self)
+        self.Uses.clear()
+
+    def _Release(self, filename):
+        count = self.Uses[filename] - 1
+        if count:
+            self.Uses[filename] = count
+        else:
+            del self.Uses[filename]
+
+
+class Catalog:
+    """The ordered list of sounds. Held in memory and stored in a sqlite database so each edit only touches its own rows.
+
+    Positions are sparse, deleting an entry leaves a gap rather than renumbering everything after it and moving an
+    entry swaps the positions of two rows.
+
+    A marshalled copy of the catalog is written to snapshot on Close, and read back instead of querying the database
+    if nothing has written to the database since. With background set the first FIRST_LOAD entries are read before
+    returning and the rest on another thread, Loaded is set once they are all in memory.
+
+    Edits are made in memory and appended to a journal next to the database before returning, then written to the
+    database a moment later on a background thread, many at a time, so a slow disk or another program writing never
+    holds them up. A journal left by a run that ended early is written to the database the next time it is opened.
+    Only one instance at a time can have the journal, any other writes its edits straight to the database.
+
+    The lock is only held while what is in memory changes. Writing an edit to the journal or database, waiting for
+    it to reach the disk and reading the database are all done without it, so the readers below never wait on the
+    disk."""
+    def __init__ (self, path, snapshot=None, background=False):
+        self.Path = path
+        self.SnapshotPath = snapshot
+
+        self.Files = FileMap()  # Title | Filename
+        self.Gains = {}  # Title | Playback gain, only for the entries that have been measured
+        self.Index = TitleIndex()  # Titles in order
+        self.Hotkeys = {}  # Key | (Title, Scope)
+        self.HotkeyRevision = 0  # Goes up whenever a key binding or the file it plays changes
+        self._Search = None  # Built the first time something is searched for, or by PrepareSearch
+        self._SearchPending = None  # Edits made while the search index is being built
+        self._SearchBuild = threading.Lock()
+
+        self.Loaded = threading.Event()  # Set once every entry is in memory, edits wait for it
+        self._Snapshot = None  # Signature of the database when the snapshot was read or written
+        self._ChangeId = 0  # The last row of the change log reflected in memory
+        self._DataVersion = None  # Changes whenever another connection commits to the database
+
+        self._Statements = None  # Those of the edit being made, see _Writing
+        self._Depth = 0  # How many _Editing blocks the thread holding _Lock is in
+        self._Edits = 0  # Goes up with every edit, so a read made without the lock can tell if it is out of date
+        self._Unwritten = []  # Journal records, or (0, statements) edits without a journal, waiting for _Commit
+        self._Pending = []  # (sequence, statements) of the edits in the journal but not yet in the database
+        self._Sequence = 0  # The number of the last edit journalled
+        self._Synced = 0  # The number of the last edit known to be on disk
+        self._Syncing = threading.Lock()  # Held while waiting for the journal to reach the disk
+        self._Journal = None  # File descriptor of the journal, None if edits go straight to the database
+        self._Journalled = threading.Condition()  # Held while touching the journal or _Pending
+        self._Closing = False
+        self._Flusher = None
+
+        # Taken before connecting, as opening the database can tidy up a left over write ahead log
+        signature = Signature(path)
+
+        self._Lock = threading.RLock()  # Held while changing what is in memory, never while waiting on the disk
+        self._DbLock = threading.Lock()  # Held while using the connection
+        self._Db = sqlite3.connect(path, check_same_thread=False)
+        self._Db.execute("PRAGMA journal_mode=WAL")
+        self._Db.execute("PRAGMA synchronous=NORMAL")
+        self._Db.executescript(SCHEMA)
+        self._AddColumns()
+        replayed = self._OpenJournal()
+
+        if not replayed and self._LoadSnapshot(signature):
+            with self._DbLock:
+                self._ChangeId, self._DataVersion = self._Marks()
+            self.Loaded.set()
+        elif background:
+            self._LoadInBackground()
+        else:
+            self.Loaded.set()
+            self.Load()
+
+    def __len__ (self):
+        return len(self.Index)
+
+    def __contains__ (self, title):
+        return title in self.Files
+
+    def Close(self):
+        """Write any edits still in the journal, close the database and write the snapshot"""
+        self.Loaded.wait()
+        with self._Journalled:
+            self._Closing = True
+            self._Journalled.notify()
+        if self._Flusher is not None:
+            self._Flusher.join()
+        self._Commit()
+        self.Flush()  # Waits on the disk, so not under the lock
+        with self._Lock:
+            with self._DbLock:
+                # Trim the change log, nothing else is likely to be that far behind
+                with self._Db:
+                    self._Db.execute("DELETE FROM changes WHERE id <= ?", (self._ChangeId - CHANGE_LOG_LIMIT,))
+                self._Db.close()
+            if self._Journal is not None:
+                with self._Journalled:
+                    os.close(self._Journal)
+                    self._Journal = None
+                    self._Unwritten = []  # Edits that hadn't been committed yet, Flush has put them in the database
+                if not self._Pending:
+                    os.remove(self.Path + JOURNAL_SUFFIX)
+            if self.SnapshotPath is not None:
+                self._SaveSnapshot()
+
+    def _OpenJournal(self):
+        """Take the journal, writing any edits left in it by an earlier run to the database, and start the flusher.
+
+        Returns True if there were any."""
+        fd = os.open(self.Path + JOURNAL_SUFFIX, os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0),
+                     0o644)
+        if not LockFile(fd):
+            os.close(fd)
+            return False
+        self._Journal = fd
+        # The journal is emptied as soon as its edits are committed, so those commits have to be on disk by then.
+        # In WAL mode NORMAL only syncs at checkpoints. Only the flusher commits here, so this costs a sync per batch.
+        self._Db.execute("PRAGMA synchronous=FULL")
+
+        with open(fd, "rb", closefd=False) as fle:
+            edits = ReadJournal(fle.read())
+        row = self._Db.execute("SELECT value FROM meta WHERE key='journal'").fetchone()
+        written = row[0] if row is not None else 0
+        # A record can be in the journal twice if it was compacted before it was appended, either copy will do
+        edits = list({edit[0]: edit for edit in edits if edit[0] > written}.values())
+        self._Sequence = max([written] + [sequence for sequence, _statements in edits])
+        if edits:
+            with self._DbLock:
+                self._Store(edits)
+        os.ftruncate(fd, 0)
+
+        self._Flusher = threading.Thread(target=self._FlushInBackground, name="CatalogFlush", daemon=True)
+        self._Flusher.start()
+        return bool(edits)
+
+    def _AddColumns(self):
+        """Bring a database made by an older version up to date"""
+        for table, column, kind in COLUMNS:
+            existing = [row[1] for row in self._Db.execute("PRAGMA table_info({0})".format(table))]
+            if column not in existing:
+                with self._Db:
+                    self._Db.execute("ALTER TABLE {0} ADD COLUMN {1} {2}".format(table, column, kind))
+
+    def Flush(self):
+        """Write every edit waiting in the journal to the database now. Returns False if it couldn't be."""
+        if self._Journal is None:
+            self._Commit()
+            return True
+        with self._DbLock:
+            with self._Journalled:
+                edits, self._Pending = self._Pending, []
+            if not edits:
+                return True
+            try:
+                self._Store(edits)
+            except sqlite3.Error as e:
+                # Still safe in the journal, try again with the next lot
+                print("Could not save the catalog, trying again shortly: {0}".format(e))
+                with self._Journalled:
+                    self._Pending[:0] = edits
+                return False
+
+        with self._Journalled:
+            if not self._Pending:
+                os.ftruncate(self._Journal, 0)
+            elif os.fstat(self._Journal).st_size > JOURNAL_LIMIT:
+                self._CompactJournal()
+        return True
+
+    def _CompactJournal(self):
+        """Replace the journal with one holding only the edits still waiting, call holding _Journalled"""
+        path = self.Path + JOURNAL_SUFFIX
+        fd = os.open(path + ".tmp", os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND | getattr(os, "O_BINARY", 0),
+                     0o644)
+        try:
+            for edit in self._Pending:
+                record = marshal.dumps(edit)
+                os.write(fd, RECORD.pack(len(record)) + record)
+            SyncData(fd)
+            LockFile(fd)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            # Windows can't replace a file that is open, it is emptied once the edits have caught up instead
+            os.close(fd)
+            return
+        os.close(self._Journal)
+        self._Journal = fd
+
+    @stats.Timed("catalog.flush")
+    def _Store(self, edits):
+        """Write (sequence, statements) edits to the database in a single transaction, call holding _DbLock"""
+        with self._Db:
+            for sql, rows in Coalesce(edits):
+                self._Db.executemany(sql, rows)
+            if self._Journal is not None:
+                self._Db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('journal', ?)", (edits[-1][0],))
+            # If nothing else has written since the last look, the change log mark is moved past this so Sync
+            # doesn't read our own edits back
+            if self._Db.execute("PRAGMA data_version").fetchone()[0] == self._DataVersion:
+                self._ChangeId = self._Db.execute("SELECT COALESCE(MAX(id), 0) FROM changes").fetchone()[0]
+
+    def _FlushInBackground(self):
+        """The flusher thread, writes the journal to the database a moment after each edit"""
+        while True:
+            with self._Journalled:
+                while not self._Pending and not self._Closing:
+                    self._Journalled.wait()
+                # Let the rest of a burst of edits join in
+                deadline = time.monotonic() + FLUSH_INTERVAL
+                while not self._Closing and time.monotonic() < deadline:
+                    self._Journalled.wait(deadline - time.monotonic())
+                if self._Closing:
+                    return
+            self.Flush()
+
+    @contextmanager
+    def _Editing(self):
+        """Hold the lock for an edit, once the whole catalog is in memory. The edit is committed once the outermost
+        one has let go of the lock."""
+        self.Loaded.wait()
+        with self._Lock:
+            self._Depth += 1
+            try:
+                yield
+            finally:
+                self._Depth -= 1
+                outermost = not self._Depth
+        if outermost:
+            self._Commit()
+
+    @stats.Timed("catalog.load")
+    def Load(self):
+        """Re-read the whole catalog from the database"""
+        self.Loaded.wait()
+        while True:
+            edits = self._Edits
+            self.Flush()
+            read, marks = self._Read()
+            with self._Lock:
+                # Read again if an edit was made in the mean time, it may not be in what was read
+                if self._Edits == edits:
+                    self._Fill(*read)
+                    self._ChangeId, self._DataVersion = marks
+                    return
+
+    @contextmanager
+    def _Reading(self):
+        """A read transaction, so a number of queries all see the database as it was at the same moment"""
+        with self._DbLock:
+            self._Db.execute("BEGIN")
+            try:
+                yield
+            finally:
+                self._Db.commit()
+
+    @contextmanager
+    def _Writing(self):
+        """Gather the statements an edit makes with _Execute, call holding _Lock. They are queued as one edit at the
+        end, to be appended to the journal by _Commit, or written to the database in a single transaction if this
+        instance has no journal."""
+        self._Statements = statements = []
+        try:
+            yield
+        finally:
+            self._Statements = None
+        if not statements:
+            return
+        self._Edits += 1
+        with self._Journalled:
+            if self._Journal is None:
+                self._Unwritten.append((0, statements))
+                return
+            self._Sequence += 1
+            record = marshal.dumps((self._Sequence, statements))
+            self._Unwritten.append(RECORD.pack(len(record)) + record)
+            self._Pending.append((self._Sequence, statements))
+            self._Journalled.notify()
+
+    def _Commit(self):
+        """Append the edits queued by _Writing to the journal and wait for them to reach the disk, or write them to
+        the database if there is no journal. Call without holding _Lock."""
+        if self._Journal is None:
+            with self._DbLock:
+                with self._Journalled:
+                    edits, self._Unwritten = self._Unwritten, []
+                if edits:
+                    self._Store(edits)
+            return
+
+        # Records are written in the order they were queued, whichever thread gets here first
+        with self._Syncing:
+            with self._Journalled:
+                records, self._Unwritten = self._Unwritten, []
+                if self._Journal is None or self._Synced >= self._Sequence:
+                    return  # Closed, or another thread has already synced them
+                if records:
+                    os.write(self._Journal, b"".join(records))
+                sequence = self._Sequence
+                # The flusher may replace the journal while this waits, compacting syncs the records it copies
+                fd = os.dup(self._Journal)
+            try:
+                # An edit only counts as made once its record would survive losing power
+                SyncData(fd)
+            finally:
+                os.close(fd)
+            self._Synced = sequence
+
+    def _Execute(self, sql, *rows):
+        """Add a statement to the edit being made, once for each row of parameters"""
+        if not rows:
+            return
+        statements = self._Statements
+        if statements and statements[-1][0] == sql:
+            statements[-1][1].extend(rows)
+        else:
+            statements.append((sql, list(rows)))
+
+    def _ExecuteMany(self, sql, rows):
+        self._Execute(sql, *(tuple(row) for row in rows))
+
+    def _Marks(self):
+        """How far through the change log the database is and its data version, to keep as _ChangeId and
+        _DataVersion once what was read with them is in memory. Call within a read transaction."""
+        return (self._Db.execute("SELECT COALESCE(MAX(id), 0) FROM changes").fetchone()[0],
+                self._Db.execute("PRAGMA data_version").fetchone()[0])
+
+    def _Read(self, limit=-1):
+        """The titles, filenames, positions and gains of the first limit entries (all of them if -1) and the key
+        bindings, and the marks to keep once they are in memory"""
+        with self._Reading():
+            rows = self._Db.execute("SELECT title, filename, position, gain FROM entries ORDER BY position LIMIT ?",
+                                    (limit,)).fetchall()
+            hotkeys = self._Db.execute("SELECT key, title, scope FROM hotkeys").fetchall()
+            marks = self._Marks()
+        titles, filenames, positions, gains = zip(*rows) if rows else ((), (), (), ())
+        return (titles, filenames, positions, gains, hotkeys), marks
+
+    @stats.Timed("catalog.sync")
+    def Sync(self):
+        """Pick up edits made to the database by other programs, or other instances of this one.
+
+        Only the titles named in the change log since the last look are re-read. Returns True if anything changed."""
+        if not self.Loaded.is_set():
+            return False
+        # Cheap check first, data_version only changes when some other connection commits. If the flusher is in the
+        # middle of writing, look again next time rather than wait for the disk.
+        if not self._DbLock.acquire(blocking=False):
+            return False
+        try:
+            if self._Db.execute("PRAGMA data_version").fetchone()[0] == self._DataVersion:
+                return False
+        finally:
+            self._DbLock.release()
+
+        # Our own edits go in first, so the rows read back for them match what is in memory
+        edits = self._Edits
+        self.Flush()
+
+        with self._Reading():
+            first = self._Db.execute("SELECT MIN(id) FROM changes").fetchone()[0]
+            changes = self._Db.execute("SELECT id, title FROM changes WHERE id > ? ORDER BY id",
+                                       (self._ChangeId,)).fetchall()
+            changed = {title for _id, title in changes}
+            if not changes or first > self._ChangeId + 1 or len(changed) > SYNC_LIMIT:
+                rows = None
+            else:
+                rows = {}
+                for title in changed:
+                    row = self._Db.execute("SELECT filename, position, gain FROM entries WHERE title=?",
+                                           (title,)).fetchone()
+                    if row is not None:
+                        rows[title] = row
+                hotkeys = self._Db.execute("SELECT key, title, scope FROM hotkeys").fetchall()
+            marks = self._Marks()
+        if changes and rows is None:
+            # Too much to go through one at a time, or the log was trimmed past where we were
+            read, marks = self._Read()
+
+        with self._Lock:
+            if self._Edits != edits:
+                return False  # Edited while reading, what was read may not have it yet so look again next time
+            self._ChangeId, self._DataVersion = marks
+            if not changes:
+                return False
+            if rows is None:
+                self._Fill(*read)
+            else:
+                self._Apply(changed, rows, hotkeys)
+        self._Commit()  # Any entries given a new place by _Apply
+        return True
+
+    def _Apply(self, changed, rows, hotkeys):
+        """Update the changed titles in memory to match their (title | (filename, position, gain)) rows"""
+        bound = {title for title, _scope in self.Hotkeys.values()}
+
+        # Take every changed title out of the order first, so positions swapped between them are free to re-use
+        for title in changed:
+            if title in self.Index:
+                self.Index.Remove(title)
+            if title not in rows and title in self.Files:
+                del self.Files[title]
+                self.Gains.pop(title, None)
+                self._UpdateSearch("Remove", title)
+
+        for title, (filename, position, gain) in sorted(rows.items(), key=lambda item: item[1][1]):
+            try:
+                self.Index.Insert(title, position)
+            except ValueError:
+                # Two writers gave different entries the same place, move this one to the end
+                position = self.Index.NextPosition()
+                with self._Writing():
+                    self._Execute(SET_POSITION, (position, title))
+                self.Index.Insert(title, position)
+            if title not in self.Files:
+                self._UpdateSearch("Add", title)
+            self.Files[title] = filename
+            if gain is None:
+                self.Gains.pop(title, None)
+            else:
+                self.Gains[title] = gain
+
+        hotkeys = {key: (title, scope) for key, title, scope in hotkeys}
+        if hotkeys != self.Hotkeys or bound & changed:
+            self.Hotkeys = hotkeys
+            self.HotkeyRevision += 1
+
+    def _Fill(self, titles, filenames, positions, gains, hotkeys):
+        """Replace everything in memory"""
+        files = dict(zip(titles, filenames))
+        # Update in place rather than clearing first, so titles being looked up elsewhere don't vanish for a moment
+        self.Files.update(files)
+        for title in [title for title in self.Files if title not in files]:
+            del self.Files[title]
+        self.Gains = {title: gain for title, gain in zip(titles, gains) if gain is not None}
+        self.Index.Load(titles, positions)
+        self._Search = None
+
+        self.Hotkeys = {key: (title, scope) for key, title, scope in hotkeys}
+        self.HotkeyRevision += 1
+
+        if self._SearchPending is not None:
+            # An index is being built from the old titles, have it start again from these ones
+            self._SearchPending = [("Clear", ())] + [("Add", (title,)) for title in self.Index]
+
+    def _LoadInBackground(self):
+        """Read the first few entries now and the rest on another thread"""
+        read, marks = self._Read(FIRST_LOAD)
+        with self._Lock:
+            self._Fill(*read)
+            self._ChangeId, self._DataVersion = marks
+
+        def loadRest():
+            # Edits wait for Loaded, so nothing can change between reading and filling
+            read, marks = self._Read()
+            with self._Lock:
+                self._Fill(*read)
+                self._ChangeId, self._DataVersion = marks
+            self.Loaded.set()
+        threading.Thread(target=loadRest, name="CatalogLoad", daemon=True).start()
+
+    def _LoadSnapshot(self, signature):
+        """Fill the catalog from the snapshot if the database hasn't changed since it was taken.
+
+        Returns False if there is no usable snapshot."""
+        if self.SnapshotPath is None:
+            return False
+        try:
+            with open(self.SnapshotPath, "rb") as fle:
+                # Much quicker than marshal.load, which reads the file a few bytes at a time
+                snapshot = marshal.loads(fle.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return False
+        if not isinstance(snapshot, tuple) or len(snapshot) != 7 or snapshot[:2] != (SNAPSHOT_VERSION, signature):
+            return False
+
+        with self._Lock:
+            self._Fill(*snapshot[2:])
+        self._Snapshot = signature
+        return True
+
+    def _SaveSnapshot(self):
+        """Write the catalog to the snapshot file, tagged with the signature of the closed database"""
+        signature = Signature(self.Path)
+        if signature == self._Snapshot:
+            return  # Nothing has changed since the snapshot was read
+
+        titles = list(self.Index)
+        snapshot = (SNAPSHOT_VERSION, signature, titles, [self.Files[title] for title in titles], self.Index.Keys(),
+                    [self.Gains.get(title) for title in titles],
+                    [(key, title, scope) for key, (title, scope) in self.Hotkeys.items()])
+        try:
+            with open(self.SnapshotPath + ".tmp", "wb") as fle:
+                marshal.dump(snapshot, fle)
+            os.replace(self.SnapshotPath + ".tmp", self.SnapshotPath)
+            self._Snapshot = signature
+        except OSError as e:
+            # Only costs a slower start next time
+            print("Could not write the catalog snapshot: {0}".format(e))
+
+    def Titles(self):
+        """Iterate over the titles in order"""
+        return iter(self.Index)
+
+    def Page(self, start, count):
+        """The titles of count entries starting at index start"""
+        if start + count > len(self.Index):
+            # Might not have been loaded yet
+            self.Loaded.wait()
+        return self.Index.Slice(start, start + count)
+
+    def IndexOf(self, title):
+        """The index of a title in the ordered list"""
+        self.Loaded.wait()
+        return self.Index.IndexOf(title)
+
+    # These copy under the lock, for threads other than the one making edits that need more than one look to agree.
+    # The lock is never held while waiting on the disk, so they are safe to call from the Tk thread.
+
+    def CopyFiles(self):
+        """A copy of the Title | Filename map"""
+        with self._Editing():
+            return dict(self.Files)
+
+    def FilenameOf(self, title):
+        """The filename a title plays, or None if it has gone"""
+        with self._Editing():
+            return self.Files.get(title)
+
+    def Ordered(self, titles):
+        """Those of the titles still in the catalog, in list order"""
+        with self._Editing():
+            return sorted((title for title in titles if title in self.Files), key=self.Index.IndexOf)
+
+    def Between(self, first, last):
+        """The titles from first to last inclusive, whichever way round they are in the list, or [] if either has
+        gone"""
+        with self._Editing():
+            if first not in self.Files or last not in self.Files:
+                return []
+            start, end = sorted((self.Index.IndexOf(first), self.Index.IndexOf(last)))
+            return self.Index.Slice(start, end + 1)
+
+    def PrepareSearch(self):
+        """Build the search index if it hasn't been built yet.
+
+        The catalog isn't locked while the index is built, edits made in the mean time are replayed onto it after."""
+        with self._SearchBuild:
+            with self._Editing():
+                if self._Search is not None:
+                    return
+                titles = list(self.Index)
+                self._SearchPending = []
+
+            search = SearchIndex(titles)
+
+            with self._Lock:
+                for method, args in self._SearchPending:
+                    getattr(search, method)(*args)
+                self._SearchPending = None
+                self._Search = search
+
+    def SearchReady(self):
+        """True once the search index has been built"""
+        return self._Search is not None
+
+    def _UpdateSearch(self, method, *args):
+        """Keep the search index in step with an edit"""
+        if self._Search is not None:
+            getattr(self._Search, method)(*args)
+        elif self._SearchPending is not None:
+            self._SearchPending.append((method, args))
+
+    def Search(self, query, limit=None):
+        """Titles matching query, best matches first"""
+        if self._Search is None:
+            self.PrepareSearch()
+        with self._Lock:
+            if limit is None:
+                return self._Search.Search(query)
+            return self._Search.Search(query, limit)
+
+    def Add(self, title, filename):
+        """Add an entry to the end of the list, or point an existing entry at a new file."""
+        self.AddMany(((title, filename),))
+
+    @stats.Timed("catalog.add")
+    def AddMany(self, entries):
+        """Add a number of (title, filename) entries in a single transaction"""
+        with self._Editing(), self._Writing():
+            for title, filename in entries:
+                if title in self.Files:
+                    # Same title again, keep the position and just update the file, which will need measuring again
+                    self._Execute("UPDATE entries SET filename=?, gain=NULL, loudness=NULL, peak=NULL WHERE title=?",
+                                     (filename, title))
+                    self.Files[title] = filename
+                    self.Gains.pop(title, None)
+                    self.HotkeyRevision += 1
+                    continue
+
+                position = self.Index.NextPosition()
+                self._Execute("INSERT INTO entries (title, filename, position) VALUES (?, ?, ?)",
+                                 (title, filename, position))
+                self.Files[title] = filename
+                self.Index.Append(title, position)
+                self._UpdateSearch("Add", title)
+
+    @stats.Timed("catalog.delete")
+    def Delete(self, title):
+        """Remove an entry and return its filename, or None if there was no such entry."""
+        with self._Editing():
+            if title not in self.Files:
+                return None
+            with self._Writing():
+                self._Execute("DELETE FROM entries WHERE title=?", (title,))
+                self._Execute("DELETE FROM hotkeys WHERE title=?", (title,))
+            self._DropHotkeys(title)
+            self.Index.Remove(title)
+            self._UpdateSearch("Remove", title)
+            self.Gains.pop(title, None)
+            return self.Files.pop(title)
+
+    @stats.Timed("catalog.delete")
+    def DeleteMany(self, titles):
+        """Remove a number of entries in a single transaction, returns the (title | filename) of those removed"""
+        with self._Editing():
+            titles = [title for title in titles if title in self.Files]
+            if not titles:
+                return {}
+            removed = set(titles)
+            bound = {title for title, _scope in self.Hotkeys.values()} & removed
+            with self._Writing():
+                self._ExecuteMany("DELETE FROM entries WHERE title=?", ((title,) for title in titles))
+                self._ExecuteMany("DELETE FROM hotkeys WHERE title=?", ((title,) for title in bound))
+
+            hotkeys = {key: binding for key, binding in self.Hotkeys.items() if binding[0] not in removed}
+            if len(hotkeys) != len(self.Hotkeys):
+                self.Hotkeys = hotkeys
+                self.HotkeyRevision += 1
+            self.Index.RemoveMany(removed)
+            for title in titles:
+                self._UpdateSearch("Remove", title)
+                self.Gains.pop(title, None)
+            return {title: self.Files.pop(title) for title in titles}
+
+    @stats.Timed("catalog.rename")
+    def Rename(self, curName, newName):
+        """Change the title of an entry, keeping its place in the list"""
+        with self._Editing():
+            if curName not in self.Files or curName == newName:
+                return
+            if newName in self.Files:
+                raise ValueError("there is already an entry called " + newName)
+            with self._Writing():
+                self._Execute("UPDATE entries SET title=? WHERE title=?", (newName, curName))
+                self._Execute("UPDATE hotkeys SET title=? WHERE title=?", (newName, curName))
+            for key, (title, scope) in list(self.Hotkeys.items()):
+                if title == curName:
+                    self.Hotkeys[key] = (newName, scope)
+            self.Index.Rename(curName, newName)
+            self._UpdateSearch("Rename", curName, newName)
+            self.Files[newName] = self.Files.pop(curName)
+            if curName in self.Gains:
+                self.Gains[newName] = self.Gains.pop(curName)
+
+    @stats.Timed("catalog.rename")
+    def RenameMany(self, names):
+        """Give a number of entries new titles in a single transaction, from (current title, new title) pairs.
+
+        Nothing is renamed if any new title is taken or given twice, a ValueError says which."""
+        with self._Editing():
+            names = [(curName, newName) for curName, newName in names if curName in self.Files and curName != newName]
+            seen = set()
+            for _curName, newName in names:
+                if newName in self.Files or newName in seen:
+                    raise ValueError("there is already an entry called " + newName)
+                seen.add(newName)
+            if not names:
+                return
+
+            with self._Writing():
+                self._ExecuteMany("UPDATE entries SET title=? WHERE title=?",
+                                     ((newName, curName) for curName, newName in names))
+                self._ExecuteMany("UPDATE hotkeys SET title=? WHERE title=?",
+                                     ((newName, curName) for curName, newName in names))
+
+            renamed = dict(names)
+            for key, (title, scope) in list(self.Hotkeys.items()):
+                if title in renamed:
+                    self.Hotkeys[key] = (renamed[title], scope)
+            for curName, newName in names:
+                self.Index.Rename(curName, newName)
+                self._UpdateSearch("Rename", curName, newName)
+                self.Files[newName] = self.Files.pop(curName)
+                if curName in self.Gains:
+                    self.Gains[newName] = self.Gains.pop(curName)
+
+    def Swap(self, index, otherIndex):
+        """Swap the entries at two indexes"""
+        with self._Editing():
+            title = self.Index[index]
+            other = self.Index[otherIndex]
+            with self._Writing():
+                self._Execute(SET_POSITION,
+                                 (self.Index.PositionOf(other), title))
+                self._Execute(SET_POSITION,
+                                 (self.Index.PositionOf(title), other))
+            self.Index.Swap(index, otherIndex)
+
+    @stats.Timed("catalog.move")
+    def MoveUp(self, title):
+        """Move an entry one place towards the start, returns False if it was already first."""
+        with self._Editing():
+            index = self.IndexOf(title)
+            if index == 0:
+                return False
+            self.Swap(index, index - 1)
+            return True
+
+    @stats.Timed("catalog.move")
+    def MoveDown(self, title):
+        """Move an entry one place towards the end, returns False if it was already last."""
+        with self._Editing():
+            index = self.IndexOf(title)
+            if index >= len(self.Index) - 1:
+                return False
+            self.Swap(index, index + 1)
+            return True
+
+    @stats.Timed("catalog.move")
+    def MoveMany(self, titles, index):
+        """Move a number of entries, keeping their order, so they sit together with the first at the given index.
+
+        If there is room between the keys either side of where they end up (always the case at either end of the
+        list) only the moved entries get new keys, otherwise every entry between where they were and where they end
+        up is rewritten. Returns False if nothing moved."""
+        with self._Editing():
+            moving = sorted({title for title in titles if title in self.Files}, key=self.Index.IndexOf)
+            if not moving:
+                return False
+            count = len(moving)
+            index = max(0, min(index, len(self.Index) - count))
+            indexes = [self.Index.IndexOf(title) for title in moving]
+            if indexes == list(range(index, index + count)):
+                return False  # Already there
+
+            def restAt(rank):
+                """The title that will be at rank among those not moving"""
+                for moved in indexes:
+                    if moved > rank:
+                        break
+                    rank += 1
+                return self.Index[rank]
+
+            # The keys of the entries either side of the block once it has moved
+            low = self.Index.PositionOf(restAt(index - 1)) if index > 0 else None
+            high = self.Index.PositionOf(restAt(index)) if index + count < len(self.Index) else None
+            if low is None:
+                low = high - count - 1
+            if high is None:
+                high = low + count + 1
+
+            if high - low > count:
+                keys = list(range(low + 1, low + 1 + count))
+                with self._Writing():
+                    self._ExecuteMany(SET_POSITION, zip(keys, moving))
+                self.Index.RemoveMany(moving)
+                self.Index.InsertMany(index, moving, keys)
+                return True
+
+            # Everything from the first index touched to the last keeps its keys, the titles are just dealt out again
+            start = min(indexes[0], index)
+            stop = max(indexes[-1], index + count - 1) + 1
+            span = self.Index.Slice(start, stop)
+            movingSet = set(moving)
+            rest = [title for title in span if title not in movingSet]
+            order = rest[:index - start] + moving + rest[index - start:]
+
+            keys = [self.Index.PositionOf(title) for title in span]
+            moved = [(key, title) for key, title, old in zip(keys, order, span) if title != old]
+            with self._Writing():
+                self._ExecuteMany(SET_POSITION, moved)
+            self.Index.Reorder(start, order)
+            return True
+
+    @stats.Timed("catalog.move")
+    def SetOrder(self, titles):
+        """Put the given titles first, in the order given, with every other entry after them in its current order.
+
+        The keys stay where they are and are dealt out again, only the entries whose place changes are written.
+        Returns how many moved."""
+        with self._Editing():
+            first = list(dict.fromkeys(title for title in titles if title in self.Files))
+            placed = set(first)
+            span = self.Index.Slice(0, len(self.Index))
+            order = first + [title for title in span if title not in placed]
+
+            keys = [self.Index.PositionOf(title) for title in span]
+            moved = [(key, title) for key, title, old in zip(keys, order, span) if title != old]
+            if moved:
+                with self._Writing():
+                    self._ExecuteMany(SET_POSITION, moved)
+                self.Index.Reorder(0, order)
+            return len(moved)
+
+    @stats.Timed("catalog.clear")
+    def Clear(self):
+        """Remove every entry"""
+        with self._Editing(), self._Writing():
+            self._Execute("DELETE FROM entries", ())
+            self._Execute("DELETE FROM hotkeys", ())
+            self.Hotkeys.clear()
+            self.HotkeyRevision += 1
+            self.Files.clear()
+            self.Gains.clear()
+            self.Index.Clear()
+            self._UpdateSearch("Clear")
+
+    def Unmeasured(self):
+        """Titles whose loudness hasn't been measured yet, in order"""
+        gains = self.Gains
+        return [title for title in self.Index if title not in gains]
+
+    def Measurements(self, titles):
+        """The saved (title, filename, loudness, peak, gain) of those of the titles that have been measured, in the
+        form SetLoudness takes"""
+        self.Loaded.wait()
+        self.Flush()
+        with self._Lock:
+            measured = [(title, self.Files[title]) for title in titles if title in self.Gains]
+        with self._Reading():
+            return [entry + tuple(row) for entry in measured
+                    for row in self._Db.execute("SELECT loudness, peak, gain FROM entries WHERE title=?",
+                                                (entry[0],))]
+
+    def SetLoudness(self, results):
+        """Save a number of (title, filename, loudness, peak, gain) measurements in a single transaction.
+
+        Results for entries that have since been deleted or pointed at a different file are ignored."""
+        with self._Editing(), self._Writing():
+            bound = {title for title, _scope in self.Hotkeys.values()}
+            for title, filename, loudness, peak, gain in results:
+                if self.Files.get(title) != filename:
+                    continue
+                self._Execute("UPDATE entries SET gain=?, loudness=?, peak=? WHERE title=?",
+                                 (gain, loudness, peak, title))
+                self.Gains[title] = gain
+                if title in bound:
+                    # The compiled key triggers hold their gain
+                    self.HotkeyRevision += 1
+
+    def RecordPlays(self, plays):
+        """Add to the play counts of entries from (title, times played, time.time() last played) tuples. Entries that
+        have since been renamed or deleted are left out, as is everything once the catalog is closing."""
+        with self._Editing():
+            if self._Closing:
+                return
+            with self._Writing():
+                for title, count, played in plays:
+                    if title in self.Files:
+                        self._Execute("UPDATE entries SET plays=plays+?, played=? WHERE title=?",
+                                      (count, played, title))
+
+    def Usage(self, limit):
+        """The (title, times played, time.time() last played) of up to limit of the most played entries, most played
+        first. Plays recorded in the last FLUSH_INTERVAL may not be counted yet."""
+        self.Loaded.wait()
+        with self._Reading():
+            return self._Db.execute("SELECT title, plays, played FROM entries WHERE plays > 0 ORDER BY plays DESC "
+                                    "LIMIT ?", (limit,)).fetchall()
+
+    def SetHotkey(self, key, title, scope):
+        """Bind a key to play the given title, replacing whatever the key did before"""
+        with self._Editing(), self._Writing():
+            if title not in self.Files:
+                raise KeyError(title)
+            self._Execute("INSERT OR REPLACE INTO hotkeys (key, title, scope) VALUES (?, ?, ?)", (key, title, scope))
+            self.Hotkeys[key] = (title, scope)
+            self.HotkeyRevision += 1
+
+    def RemoveHotkey(self, key):
+        """Unbind a key"""
+        with self._Editing(), self._Writing():
+            self._Execute("DELETE FROM hotkeys WHERE key=?", (key,))
+            if self.Hotkeys.pop(key, None) is not None:
+                self.HotkeyRevision += 1
+
+    def HotkeysFor(self, title):
+        """The keys bound to a title"""
+        return [key for key, (boundTitle, _scope) in self.Hotkeys.items() if boundTitle == title]
+
+    def _DropHotkeys(self, title):
+        """Forget the in memory bindings of a title that has been deleted"""
+        for key in self.HotkeysFor(title):
+            del self.Hotkeys[key]
+            self.HotkeyRevision += 1
+
+    def ImportCsv(self, path):
+        """Append the rows of a title,filename CSV file (the old content file format) to the catalog"""
+        with open(path, newline="") as csvFile:
+            reader = csv.reader(csvFile, delimiter=",")
+            self.AddMany((row[0], row[1]) for row in reader if len(row) >= 2)
+
+    def ExportCsv(self, path):
+        """Write the catalog out as a title,filename CSV file, replacing path only once it is complete."""
+        directory = os.path.dirname(os.path.abspath(path))
+        tempfile = NamedTemporaryFile(mode="w", delete=False, newline="", dir=directory)
+        with self._Editing():
+            rows = [(title, self.Files[title]) for title in self.Index]
+        writer = csv.writer(tempfile, delimiter=",", lineterminator="\n")
+        writer.writerows(rows)
+        tempfile.close()
+        shutil.move(tempfile.name, path)
+
+
+def Open(path, legacyCsv=None, snapshot=None, background=False):
+    """Open the catalog at path. If it doesn't exist yet it is created and filled from legacyCsv."""
+    isNew = not os.path.exists(path)
+    catalog = Catalog(path, snapshot=snapshot, background=background and not isNew)
+    if isNew and legacyCsv is not None and os.path.exists(legacyCsv):
+        catalog.ImportCsv(legacyCsv)
+    return catalog
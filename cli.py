@@ -0,0 +1,320 @@
+"""Works on a soundboard's catalog and audio without opening the window.
+
+    python cli.py import ~/Sounds                  # move every audio file under a folder onto the board
+    python cli.py import --csv old.csv             # append the entries of a title,filename content file
+    python cli.py export -                         # write the board out as CSV, to stdout here
+    python cli.py reorder --by title               # sort the board, or --from a file with one title per line
+    python cli.py verify --fix                     # report (and drop) entries whose audio is missing or unreadable
+    python cli.py analyze --peaks                  # measure loudness and work out waveforms for every clip
+    python cli.py play Airhorn Drumroll --crossfade 0.5 --backend wav:out.wav
+
+Every command takes --root, the folder holding Files (the current one by default), and --board. Problems and
+results are printed one line at a time as they are found, progress goes to stderr.
+"""
+import argparse
+import os
+import sys
+import time
+
+import audiomanager
+
+
+BATCH = 500  # Files handed to each import job, so progress shows and a huge folder isn't listed all at once
+PROGRESS_INTERVAL = 0.25  # Seconds between progress updates
+
+
+class CliError (Exception):
+    """Raised when a command can't be carried out, the message is shown to the user."""
+
+
+def Sink(backend):
+    """The audio engine sink named by a --backend value: device, null or wav:PATH"""
+    import audioengine
+    if backend == "null":
+        return audioengine.NullSink()
+    if backend.startswith("wav:"):
+        return audioengine.WaveFileSink(backend[4:])
+    if backend == "device":
+        try:
+            return audioengine.DeviceSink()
+        except (ImportError, OSError) as e:
+            raise CliError("no audio device available ({0})".format(e))
+    raise CliError("unknown backend {0}, use device, null or wav:PATH".format(backend))
+
+
+class LateSink:
+    """Throws the audio away until Use hands it the sink to play through, which is then opened on the mixer thread
+    like any other. The engine starts with the AudioManager, so this lets play check its titles before a wave file
+    is created or the sound card taken."""
+    def __init__ (self):
+        self._Format = None
+        self._Next = None  # Set by Use, picked up by the mixer thread at its next Write
+        self._Sink = None
+
+    @property
+    def Blocking(self):
+        return self._Sink is not None and self._Sink.Blocking
+
+    @property
+    def Latency(self):
+        return self._Sink.Latency if self._Sink is not None else 0.0
+
+    def Use(self, sink):
+        self._Next = sink
+
+    def Open(self, rate, channels, width):
+        self._Format = (rate, channels, width)
+
+    def Write(self, data):
+        if self._Sink is None and self._Next is not None:
+            self._Sink, self._Next = self._Next, None
+            try:
+                self._Sink.Open(*self._Format)
+            except Exception as e:  # Sound card libraries raise their own errors
+                print("Could not open the audio output ({0}), sounds will not be heard.".format(e), file=sys.stderr)
+                import audioengine
+                self._Sink = audioengine.NullSink()
+        if self._Sink is not None:
+            self._Sink.Write(data)
+
+    def Close(self):
+        if self._Sink is not None:
+            self._Sink.Close()
+            self._Sink = None
+
+
+def Progress(text):
+    """Overwrite the progress line on stderr"""
+    sys.stderr.write("\r" + text)
+    sys.stderr.flush()
+
+
+def AudioFiles(paths):
+    """Yield the audio files among paths, going through folders (and the folders in them) a directory at a time"""
+    import importer
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        folders = [path]
+        while folders:
+            with os.scandir(folders.pop()) as entries:
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    if entry.is_dir():
+                        folders.append(entry.path)
+                    elif importer.CanDecode(entry.path):
+                        yield entry.path
+
+
+def Batches(items, size):
+    """Yield lists of up to size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def Import(manager, args):
+    if args.csv:
+        before = len(manager.Catalog)
+        manager.ImportCsv(args.csv)
+        print("{0} entries added from {1}".format(len(manager.Catalog) - before, args.csv))
+        return 0
+    if not args.paths:
+        raise CliError("give the files or folders to import, or --csv")
+
+    added = failed = shared = 0
+    for batch in Batches(AudioFiles(args.paths), BATCH):
+        job = manager.ImportFiles(batch, workers=args.workers)
+        while not job.Wait(PROGRESS_INTERVAL):
+            Progress("Importing {0} files...".format(added + failed + job.Done))
+        for title in job.Added:
+            print(title)
+        for path, reason in job.Errors:
+            print("{0}: {1}".format(path, reason), file=sys.stderr)
+        added += len(job.Added)
+        failed += len(job.Errors)
+        shared += job.Shared
+    Progress("{0} imported ({1} already held under another name), {2} failed\n".format(added, shared, failed))
+    return 1 if failed else 0
+
+
+def Export(manager, args):
+    if args.path != "-":
+        manager.ExportCsv(args.path)
+        return 0
+    import csv
+    writer = csv.writer(sys.stdout, delimiter=",", lineterminator="\n")
+    files = manager.Files
+    for title in manager.Catalog.Titles():
+        writer.writerow((title, files[title]))
+    return 0
+
+
+def Reorder(manager, args):
+    catalog = manager.Catalog
+    if args.source:
+        with open(args.source) as fle:
+            titles = [line.rstrip("\n") for line in fle if line.strip()]
+        missing = [title for title in titles if title not in catalog]
+        for title in missing:
+            print("no such title: {0}".format(title), file=sys.stderr)
+    else:
+        key = {"title": lambda title: title.casefold(),
+               "filename": lambda title: manager.Files[title].casefold()}[args.by]
+        titles = sorted(catalog.Titles(), key=key, reverse=args.reverse)
+    print("{0} entries moved".format(catalog.SetOrder(titles)))
+    return 0
+
+
+def Verify(manager, args):
+    import importer
+    problems = []
+    folder = manager.AudioPath
+    for title in manager.Catalog.Titles():
+        filename = manager.Files.get(title)
+        if filename is None:
+            continue  # Deleted by another program since the list was taken
+        path = folder + filename
+        try:
+            if not os.path.isfile(path):
+                raise importer.ImportFailed("missing")
+            if filename.lower().endswith(importer.NATIVE_EXTENSIONS):
+                importer.ProbeWave(path)
+            elif not importer.CanDecode(path):
+                raise importer.ImportFailed("can't be decoded")
+        except (importer.ImportFailed, ValueError, OSError) as e:
+            print("{0}\t{1}\t{2}".format(title, filename, e), flush=True)
+            problems.append(title)
+
+    if args.orphans:
+        names = [entry.name for entry in os.scandir(folder) if entry.is_file()]
+        used = manager.Boards.InUse(names)
+        for name in sorted(set(names) - used):
+            print("\t{0}\tnot on any board".format(name), flush=True)
+
+    if problems and args.fix:
+        manager.DeleteEntries(problems)
+        print("{0} entries removed".format(len(problems)), file=sys.stderr)
+        return 0
+    return 1 if problems else 0
+
+
+def Analyze(manager, args):
+    titles = list(manager.Catalog.Titles()) if args.all else None
+    job = manager.MeasureLoudness(titles)
+    if job is not None:
+        while not job.Wait(PROGRESS_INTERVAL):
+            Progress("Measured {0}/{1}".format(job.Done, job.Total if job.Total is not None else "?"))
+        Progress("Measured {0}/{1}\n".format(job.Done, job.Total))
+        for title, reason in job.Errors:
+            print("{0}: {1}".format(title, reason))
+
+    if args.peaks:
+        peaks = manager.Peaks
+        filenames = list(dict.fromkeys(manager.Files.values()))
+        peaks.Queue(filenames)
+        while peaks.Pending():
+            Progress("Waveforms {0}/{1}".format(len(filenames) - peaks.Pending(), len(filenames)))
+            time.sleep(PROGRESS_INTERVAL)
+        peaks.Close()  # Waits for the last batch
+        Progress("Waveforms {0}/{0}\n".format(len(filenames)))
+    return 1 if job is not None and job.Errors else 0
+
+
+def Play(manager, args):
+    import audioengine
+    missing = [title for title in args.titles if title not in manager.Catalog]
+    if missing:
+        raise CliError("no such title: {0}".format(", ".join(missing)))
+    manager.Engine.Sink.Use(Sink(args.backend))
+
+    gains = manager.Catalog.Gains
+    playlist = audioengine.Playlist([manager.Cache.Get(manager.Files[title]) for title in args.titles],
+                                    [gains.get(title, 1.0) for title in args.titles], crossfade=args.crossfade)
+    manager.Engine.PlaySequence(playlist)
+    try:
+        while not playlist.Finished or manager.Engine.ActiveVoices():
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        manager.StopSound()
+        time.sleep(2 * manager.Engine.LatencyBound())
+    return 0
+
+
+COMMANDS = {"import": Import, "export": Export, "reorder": Reorder, "verify": Verify, "analyze": Analyze,
+            "play": Play}
+
+
+def Parser():
+    parser = argparse.ArgumentParser(description="Work on the soundboard without opening the window.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--root", default=".", help="the folder holding Files, the current one by default")
+    common.add_argument("--board", help="the board to work on, the first one by default")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("import", parents=[common], help="add audio files or a CSV content file")
+    command.add_argument("paths", nargs="*", help="files or folders, which are moved into the audio folder")
+    command.add_argument("--csv", help="a title,filename content file to append instead")
+    command.add_argument("--workers", type=int, help="files imported at once")
+
+    command = commands.add_parser("export", parents=[common], help="write the board out as a CSV content file")
+    command.add_argument("path", help="where to write it, - for stdout")
+
+    command = commands.add_parser("reorder", parents=[common], help="change the order of the board")
+    command.add_argument("--by", choices=("title", "filename"), default="title", help="what to sort by")
+    command.add_argument("--reverse", action="store_true", help="sort backwards")
+    command.add_argument("--from", dest="source",
+                         help="a file with one title per line, which go first in that order")
+
+    command = commands.add_parser("verify", parents=[common], help="check every entry's audio can be played")
+    command.add_argument("--fix", action="store_true", help="remove the entries that can't be played")
+    command.add_argument("--orphans", action="store_true", help="also list audio files that are on no board")
+
+    command = commands.add_parser("analyze", parents=[common],
+                                  help="measure loudness of the clips, and their waveforms with --peaks")
+    command.add_argument("--all", action="store_true", help="measure every clip again, not just new ones")
+    command.add_argument("--peaks", action="store_true", help="work out the waveforms shown on the buttons too")
+
+    command = commands.add_parser("play", parents=[common], help="play titles one after another")
+    command.add_argument("titles", nargs="+")
+    command.add_argument("--crossfade", type=float, default=0.0, help="seconds each title fades in over the last")
+    command.add_argument("--backend", default="device", help="device, null or wav:PATH")
+    return parser
+
+
+def Main(argv=None):
+    args = Parser().parse_args(argv)
+    manager = None
+    try:
+        if not os.path.isdir(args.root):
+            raise CliError("no such folder: {0}".format(args.root))
+        import audioengine
+        # Play hands over the real sink once it knows the titles are there
+        sink = LateSink() if args.command == "play" else audioengine.NullSink()
+        manager = audiomanager.AudioManager(root=args.root, sink=sink)
+        if args.board is not None:
+            try:
+                manager.SwitchBoard(args.board)
+            except KeyError:
+                raise CliError("no such board: {0}".format(args.board))
+        manager.Catalog.Loaded.wait()
+        return COMMANDS[args.command](manager, args)
+    except CliError as e:
+        print("{0}: {1}".format(args.command, e), file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # Piped into something like head that stopped reading, send whatever is left of the output nowhere
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if manager is not None:
+            manager.Close()
+
+
+if __name__ == "__main__":
+    sys.exit(Main())
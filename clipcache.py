@@ -0,0 +1,128 @@
+import mmap
+import threading
+from collections import OrderedDict
+
+import audioengine
+import stats
+
+
+CACHE_BUDGET = 256 * 1024 * 1024  # Bytes of decoded audio to keep around
+
+
+def Warm(clip):
+    """Have the OS start reading a memory mapped clip's audio from disk, so the mixer doesn't wait on it the first
+    time it's played. Does nothing for clips that aren't mapped or where it isn't supported."""
+    mapped = getattr(getattr(clip, "Data", None), "obj", None)
+    if isinstance(mapped, mmap.mmap) and hasattr(mmap, "MADV_WILLNEED"):
+        try:
+            mapped.madvise(mmap.MADV_WILLNEED)
+        except (OSError, ValueError):
+            pass  # Only a hint
+
+
+class ClipCache:
+    """Keeps decoded clips in memory keyed by filename, dropping the least recently played once over budget.
+
+    Clips that would decode to more than streamThreshold bytes are kept as StreamClips, which only hold their start.
+    Given a ConvertCache, files that aren't in the native format are played from their converted copies."""
+    def __init__ (self, folder, budget=CACHE_BUDGET, streamThreshold=audioengine.STREAM_THRESHOLD, converted=None):
+        self.Folder = folder
+        self.Budget = budget
+        self.StreamThreshold = streamThreshold
+        self.Converted = converted
+        self.Size = 0  # Bytes currently held
+
+        self.Hits = 0
+        self.Misses = 0
+        self.Prefetched = 0  # Clips loaded by Prefetch
+
+        self._Clips = OrderedDict()  # Filename | Clip, least recently used first
+        self._Lock = threading.Lock()
+
+    def __contains__ (self, filename):
+        return filename in self._Clips
+
+    def __len__ (self):
+        return len(self._Clips)
+
+    def Get(self, filename):
+        """Return the clip for filename, loading it if it isn't already held."""
+        start = stats.Start()
+        with self._Lock:
+            clip = self._Clips.get(filename)
+            if clip is not None:
+                self._Clips.move_to_end(filename)
+                self.Hits += 1
+                stats.Stop("cache.hit", start)
+                return clip
+            self.Misses += 1
+
+        # Load outside of the lock so other clips can still be played while this one is decoded
+        clip = self._Load(filename)
+        self.Put(filename, clip)
+        stats.Stop("cache.load", start)
+        return clip
+
+    def _Load(self, filename):
+        """Map or decode a clip, from its converted copy if it isn't in the native format"""
+        if self.Converted is not None:
+            return self.Converted.Load(filename, streamThreshold=self.StreamThreshold)
+        return audioengine.LoadClip(self.Folder + filename, streamThreshold=self.StreamThreshold)
+
+    def Prefetch(self, filename):
+        """Load a clip ahead of it being played, if it fits in what is left of the budget. Returns False if it didn't.
+
+        A prefetched clip is the first to go when room is needed, so a guess never pushes out a clip that has been
+        played, and it never counts as a hit or a miss."""
+        with self._Lock:
+            clip = self._Clips.get(filename)
+            if clip is None and self.Size >= self.Budget:
+                return False
+
+        if clip is None:
+            clip = self._Load(filename)
+            with self._Lock:
+                held = self._Clips.get(filename)
+                if held is not None:
+                    clip = held  # Played while it was loading
+                elif self.Size + len(clip) > self.Budget:
+                    return False
+                else:
+                    self._Clips[filename] = clip
+                    self._Clips.move_to_end(filename, last=False)
+                    self.Size += len(clip)
+                    self.Prefetched += 1
+        Warm(clip)
+        return True
+
+    def Put(self, filename, clip):
+        """Store a clip and evict the oldest ones until the cache fits in the budget again."""
+        size = len(clip)
+        if size > self.Budget:
+            # Would push everything else out and still not fit, so just don't keep it.
+            return
+
+        with self._Lock:
+            old = self._Clips.pop(filename, None)
+            if old is not None:
+                self.Size -= len(old)
+
+            self._Clips[filename] = clip
+            self.Size += size
+
+            while self.Size > self.Budget:
+                _name, evicted = self._Clips.popitem(last=False)
+                self.Size -= len(evicted)
+
+    def Evict(self, filename):
+        """Forget a clip, e.g. because its file is about to be deleted or replaced."""
+        with self._Lock:
+            clip = self._Clips.pop(filename, None)
+            if clip is not None:
+                self.Size -= len(clip)
+
+    def Clear(self):
+        """Forget every clip"""
+        with self._Lock:
+            self._Clips.clear()
+            self.Size = 0
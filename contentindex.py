@@ -0,0 +1,141 @@
+import os
+import threading
+from collections import Counter
+
+
+class ContentIndex:
+    """Finds files in the audio folder with the same contents, so audio imported again under another name can play
+    the copy already there rather than keeping a second one.
+
+    The hashes come from hashes (a hashindex.HashIndex of the folder), shared with the peak and conversion caches,
+    so an unchanged file is only read once. Files that were in the folder before are only hashed when a file of
+    exactly the same size is imported, as nothing else can match them.
+
+    Store only ever matches files that were in the folder already or have been through Store themselves. An import
+    calls Expect before moving a file in, and until that file has been stored it is left out, so a copy that may yet
+    be matched and removed by its own import is never handed out. A file matched by Store is held until the import
+    that matched it has added its entries and calls Release, and Remove leaves held files alone, so a delete running
+    at the same time can't take away a file an entry is about to play."""
+    def __init__ (self, folder, hashes):
+        self.Folder = folder
+        self.Hashes = hashes
+
+        self._Lock = threading.Lock()
+        self._Sizes = None  # Size | Filenames of that size in the folder, listed by the first Store after Rescan
+        self._Held = Counter()  # Filename | Imports that matched it and haven't added their entries yet
+        self._Arriving = set()  # Filenames being moved in by imports, left out of _Sizes until they are stored
+
+    def Rescan(self):
+        """Have the next Store list the folder again, to pick up files added or removed by other programs"""
+        with self._Lock:
+            self._Sizes = None
+
+    def Expect(self, filename):
+        """Note that an import is about to move filename into the folder, so nothing is matched against it until it has
+        been passed to Store, or to Abandon if the import fails"""
+        with self._Lock:
+            self._Arriving.add(filename)
+
+    def Abandon(self, filename):
+        """Stop expecting a file that was never stored"""
+        with self._Lock:
+            self._Arriving.discard(filename)
+
+    def Store(self, filename):
+        """Hash a file that has just been put in the folder. Returns the filename of a file already there with the
+        same contents, which the caller can play instead and remove its own copy, otherwise filename. A file already
+        there is held until the caller passes it to Release."""
+        path = self.Folder + filename
+        try:
+            info = os.stat(path)
+            fileHash = self.Hashes.Hash(filename, info)
+        except OSError:
+            self.Abandon(filename)
+            return filename  # Kept as it is, it will be hashed again if anything the same size turns up
+
+        # The files the same size are hashed outside the lock. Checking them and adding this one happen under it,
+        # going round again for any stored in between, so two copies imported at once can't both miss each other.
+        hashes = {}
+        gone = set()
+        while True:
+            with self._Lock:
+                same = self._FolderSizes().setdefault(info.st_size, set())
+                same -= gone
+                unknown = sorted(same - hashes.keys() - {filename})
+                if not unknown:
+                    self._Arriving.discard(filename)
+                    for other in sorted(same):
+                        if other != filename and hashes[other] == fileHash:
+                            self._Held[other] += 1
+                            # The caller removes its copy, so another file imported at the same time mustn't match it
+                            same.discard(filename)
+                            return other
+                    same.add(filename)
+                    return filename
+            gone = self._HashAll(unknown, info.st_size, hashes)
+
+    def Release(self, filenames):
+        """Let go of files returned by Store once the entries playing them have been added, or have failed to be"""
+        with self._Lock:
+            self._Held.subtract(filenames)
+            self._Held += Counter()  # Drop the ones that are down to nothing
+
+    def Remove(self, filenames):
+        """Delete files that no entry plays any more from the folder and forget them, except any an import has just
+        matched. Returns the filenames removed."""
+        removed = []
+        try:
+            with self._Lock:
+                try:
+                    for filename in filenames:
+                        if self._Held[filename]:
+                            continue
+                        os.remove(self.Folder + filename)
+                        removed.append(filename)
+                finally:
+                    # Before the lock is let go, so a Store can't match a file that has just been removed
+                    self._Discard(removed)
+        finally:
+            self.Hashes.Forget(removed)
+        return removed
+
+    def Forget(self, filenames):
+        """Drop files that have been removed from the folder"""
+        self.Hashes.Forget(filenames)
+        with self._Lock:
+            self._Discard(filenames)
+
+    def _Discard(self, filenames):
+        """Take files out of the sizes listed, call with the lock held"""
+        if self._Sizes is not None:
+            for names in self._Sizes.values():
+                names.difference_update(filenames)
+
+    def _FolderSizes(self):
+        """The files in the folder by size, call with the lock held"""
+        if self._Sizes is None:
+            self._Sizes = {}
+            with os.scandir(self.Folder) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.startswith(".") and entry.name not in self._Arriving:
+                        self._Sizes.setdefault(entry.stat().st_size, set()).add(entry.name)
+        return self._Sizes
+
+    def _HashAll(self, filenames, size, hashes):
+        """Put the hashes of files listed in the folder at the given size into hashes (filename | hash), worked out
+        again if they have changed, or None if they are no longer that size or can't be read. Returns the set of those
+        that have gone. Call without the lock, as it may read the files."""
+        gone = set()
+        for filename in filenames:
+            hashes[filename] = None
+            try:
+                info = os.stat(self.Folder + filename)
+            except OSError:
+                gone.add(filename)
+                continue
+            if info.st_size == size:
+                try:
+                    hashes[filename] = self.Hashes.Hash(filename, info)
+                except OSError:
+                    pass
+        return gone
@@ -0,0 +1,108 @@
+import os
+import threading
+from tempfile import NamedTemporaryFile
+
+import audioengine
+import importer
+import pcm
+
+
+def FormatKey():
+    """Names the output format, part of the name of every converted copy"""
+    return "{0}x{1}x{2}".format(pcm.RATE, pcm.CHANNELS, pcm.WIDTH * 8)
+
+
+def ConvertRaw(src, dest, fmt):
+    """Write the samples of the wave file src into dest as raw native audio, a piece at a time"""
+    step = importer.CONVERT_FRAMES * fmt.Channels * fmt.Width
+    state = None
+    with open(src, "rb") as fle, open(dest, "wb") as out:
+        fle.seek(fmt.DataStart)
+        for start in range(fmt.DataStart, fmt.DataEnd, step):
+            data, state = pcm.ToNative(fle.read(min(step, fmt.DataEnd - start)), fmt, state)
+            out.write(data)
+
+
+class ConvertCache:
+    """Copies of the clips that aren't in the engine's format, converted once and kept in folder as raw audio.
+
+    A copy is named after the hash of the file it came from and the format it was converted to, so it is never used
+    for a file that has changed or for a different output format, and playing it is a plain memory map. The hashes
+    come from hashes (a hashindex.HashIndex of the audio folder), so an unchanged file is only hashed once."""
+    def __init__ (self, folder, audioFolder, hashes):
+        self.Folder = folder
+        self.AudioFolder = audioFolder
+        self.Hashes = hashes
+
+        self.Converted = 0  # Files converted this run
+
+        os.makedirs(folder, exist_ok=True)
+        self._Lock = threading.Lock()
+        self._Writing = set()  # Names of the copies being written right now
+
+    def _Path(self, fileHash):
+        """Where the converted copy of a file with the given hash goes"""
+        return "{0}{1}-{2}.raw".format(self.Folder, fileHash, FormatKey())
+
+    def Load(self, filename, streamThreshold=None):
+        """Load a clip from the audio folder, converting it first if it isn't in the native format and hasn't been
+        converted already. See audioengine.LoadClip for streamThreshold."""
+        path = self.AudioFolder + filename
+        info = os.stat(path)
+
+        fileHash = self.Hashes.Known(filename, info)
+        if fileHash is not None:
+            copy = self._Path(fileHash)
+            if os.path.exists(copy):
+                return audioengine.LoadRaw(copy, streamThreshold)
+
+        fmt = importer.ProbeWave(path)
+        if fmt.IsNative():
+            return audioengine.LoadClip(path, streamThreshold)
+
+        fileHash = self.Hashes.Hash(filename, info)
+        copy = self._Path(fileHash)
+        if not os.path.exists(copy):
+            # Written under another name first, so a half written copy is never played
+            temp = NamedTemporaryFile(dir=self.Folder, suffix=".tmp", delete=False)
+            temp.close()
+            name = os.path.basename(temp.name)
+            with self._Lock:
+                self._Writing.add(name)
+            try:
+                ConvertRaw(path, temp.name, fmt)
+                os.replace(temp.name, copy)
+            except BaseException:
+                os.remove(temp.name)
+                raise
+            finally:
+                with self._Lock:
+                    self._Writing.discard(name)
+            self.Converted += 1
+        return audioengine.LoadRaw(copy, streamThreshold)
+
+    def Forget(self, filenames):
+        """Drop the converted copies of files that are no longer in the catalog, unless another file shares them.
+        Call before the files are taken out of the hash index."""
+        gone = set(self.Hashes.Lookup(filenames).values())
+        for fileHash in gone - self.Hashes.Shared(gone, filenames):
+            self._Remove(self._Path(fileHash))
+
+    def Collect(self, filenames):
+        """Keep only the copies of the given files, removing any others along with those made for a different output
+        format or left half written"""
+        keep = {os.path.basename(self._Path(fileHash)) for fileHash in self.Hashes.Lookup(filenames).values()}
+        with self._Lock:
+            keep |= self._Writing
+            for name in os.listdir(self.Folder):
+                if name.endswith((".raw", ".tmp")) and name not in keep:
+                    self._Remove(self.Folder + name)
+
+    def _Remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Probably still mapped by a clip that is playing on Windows, Collect will get it next time
+            print("Could not remove {0}: {1}".format(path, e))
@@ -0,0 +1,65 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import stats
+
+
+class Executor:
+    """Runs AudioManager operations on a worker thread, so moving, deleting and reading files never holds up Tk.
+
+    Operations run one at a time in the order they were submitted, so two that touch the same entries, files or board
+    can never overlap or overtake each other. Submit returns a concurrent.futures.Future, and the callback given with
+    it is run on the Tk thread once it has finished, along with anything sent with Post, each time Drain is called
+    from the window's after() loop. Operations submitted without a callback post nothing, so a manager with no window
+    draining it doesn't pile them up. Sounds played from the window never go through here, they are always started
+    straight away."""
+    def __init__ (self):
+        self.Waiting = 0  # Operations submitted that haven't finished yet, changed under _Lock
+
+        self._Pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AudioManagerWorker")
+        self._Posted = deque()  # (callback, args) waiting for the Tk thread, appends and pops are atomic
+        self._Lock = threading.Lock()
+
+    def Submit(self, function, *args, then=None, **kwargs):
+        """Run function(*args, **kwargs) once everything submitted before it has finished, returns its Future.
+
+        then(future) is run on the Tk thread by the next Drain after it has finished."""
+        queued = stats.Start()
+
+        def run():
+            stats.Stop("worker.wait", queued)
+            return function(*args, **kwargs)
+
+        with self._Lock:
+            self.Waiting += 1
+        try:
+            future = self._Pool.submit(run)
+        except RuntimeError:
+            self._Finished(None)  # Already closed
+            raise
+        future.add_done_callback(self._Finished)
+        if then is not None:
+            future.add_done_callback(lambda done: self.Post(then, done))
+        return future
+
+    def Post(self, callback, *args):
+        """Have callback(*args) run on the Tk thread by the next Drain, safe from any thread"""
+        self._Posted.append((callback, args))
+
+    def Drain(self):
+        """Run every callback waiting for the Tk thread, call from the Tk thread"""
+        while True:
+            try:
+                callback, args = self._Posted.popleft()
+            except IndexError:
+                return
+            callback(*args)
+
+    def _Finished(self, _future):
+        with self._Lock:
+            self.Waiting -= 1
+
+    def Close(self):
+        """Wait for the operations already submitted to finish, then stop the worker"""
+        self._Pool.shutdown(wait=True)
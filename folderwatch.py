@@ -0,0 +1,39 @@
+import os
+import time
+
+
+SETTLE_TIME = 2.0  # Seconds after a change during which the folder is listed on every poll
+
+
+class FolderWatch:
+    """Notices files being added to or removed from a folder.
+
+    Each poll only checks the folder's modification time, the folder is only listed again when that has changed."""
+    def __init__ (self, folder):
+        self.Folder = folder
+        self._Mtime = None  # Modification time of the folder when it was last listed
+        self._Names = None  # Filenames in the folder when it was last listed
+
+    def Poll(self):
+        """The (added, removed) filenames since the last poll, or None if nothing has changed.
+
+        The first poll only takes stock of what is there."""
+        try:
+            mtime = os.stat(self.Folder).st_mtime_ns
+        except FileNotFoundError:
+            mtime = -1
+        if mtime == self._Mtime:
+            return None
+
+        names = set()
+        if mtime != -1:
+            names = {entry.name for entry in os.scandir(self.Folder) if entry.is_file()}
+
+        # A file added in the same clock tick as the listing wouldn't change the time again, so keep listing until the
+        # folder has been left alone for a while
+        self._Mtime = mtime if time.time_ns() - mtime > SETTLE_TIME * 1e9 else None
+
+        old, self._Names = self._Names, names
+        if old is None or old == names:
+            return None
+        return names - old, old - names
@@ -0,0 +1,95 @@
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_hash ON files (hash);
+"""
+
+
+def FileHash(path):
+    """A hash of the contents of a file"""
+    with open(path, "rb") as fle:
+        if os.fstat(fle.fileno()).st_size == 0:
+            return hashlib.blake2b(digest_size=16).hexdigest()
+        with mmap.mmap(fle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # hashlib lets go of the GIL while it works, so several threads can hash at once
+            return hashlib.blake2b(mapped, digest_size=16).hexdigest()
+
+
+class HashIndex:
+    """The hash of the contents of each file in the audio folder, shared by the waveform cache, the converted copies
+    and the content index.
+
+    Each filename remembers its hash along with the size and modification time it had when hashed, so an unchanged
+    file is only ever read once whichever of them asks first. Safe to use from any thread, files are hashed outside
+    the lock."""
+    def __init__ (self, path, folder):
+        self.Path = path
+        self.Folder = folder
+
+        self._Lock = threading.Lock()
+        self._Db = sqlite3.connect(path, check_same_thread=False)
+        # Only a cache, every row is checked against the file before it is used, so commits needn't wait for the disk
+        self._Db.execute("PRAGMA journal_mode=WAL")
+        self._Db.execute("PRAGMA synchronous=NORMAL")
+        self._Db.executescript(SCHEMA)
+
+    def Close(self):
+        with self._Lock:
+            self._Db.close()
+
+    def Known(self, filename, info):
+        """The hash of a file if it is already known for the size and modification time in info (an os.stat_result),
+        otherwise None"""
+        with self._Lock:
+            row = self._Db.execute("SELECT size, mtime, hash FROM files WHERE filename=?", (filename,)).fetchone()
+        if row is not None and row[:2] == (info.st_size, info.st_mtime_ns):
+            return row[2]
+        return None
+
+    def Hash(self, filename, info=None):
+        """The hash of a file in the folder, only read again if it has changed since. info is its os.stat_result if
+        the caller already has it. Raises OSError if the file can't be read."""
+        path = self.Folder + filename
+        if info is None:
+            info = os.stat(path)
+        fileHash = self.Known(filename, info)
+        if fileHash is None:
+            fileHash = FileHash(path)
+            with self._Lock, self._Db:
+                self._Db.execute("INSERT OR REPLACE INTO files (filename, size, mtime, hash) VALUES (?, ?, ?, ?)",
+                                 (filename, info.st_size, info.st_mtime_ns, fileHash))
+        return fileHash
+
+    def Lookup(self, filenames):
+        """Filename | Hash of those of the filenames that have been hashed, as of when they last were"""
+        filenames = set(filenames)
+        with self._Lock:
+            rows = self._Db.execute("SELECT filename, hash FROM files").fetchall()
+        return {filename: fileHash for filename, fileHash in rows if filename in filenames}
+
+    def Shared(self, hashes, excluding):
+        """Those of the hashes that some file other than the ones in excluding also has"""
+        excluding = set(excluding)
+        shared = set()
+        with self._Lock:
+            for fileHash in set(hashes):
+                rows = self._Db.execute("SELECT filename FROM files WHERE hash=?", (fileHash,))
+                if any(filename not in excluding for filename, in rows):
+                    shared.add(fileHash)
+        return shared
+
+    def Forget(self, filenames):
+        """Drop files that have been removed from the folder"""
+        with self._Lock, self._Db:
+            self._Db.executemany("DELETE FROM files WHERE filename=?", ((filename,) for filename in filenames))
@@ -0,0 +1,164 @@
+import time
+from collections import deque
+
+pynputKeyboard = False  # Optional, without it global keys only work while the app has focus. Imported when needed.
+
+
+SCOPE_WINDOW = "window"  # Only while the sound board page has focus
+SCOPE_GLOBAL = "global"  # Anywhere in the app, or system wide through pynput if it is installed
+
+# Tk modifier state bits
+_MODIFIERS = (("Control", 0x0004), ("Alt", 0x0008), ("Alt", 0x20000), ("Shift", 0x0001))
+_IGNORED_KEYS = ("Shift_L", "Shift_R", "Control_L", "Control_R", "Alt_L", "Alt_R", "Meta_L", "Meta_R")
+
+
+def KeyFromEvent(event):
+    """Turn a Tk key press event into a key name such as "F1" or "Control-a". None for bare modifier keys."""
+    if event.keysym in _IGNORED_KEYS:
+        return None
+
+    modifiers = []
+    for name, bit in _MODIFIERS:
+        if event.state & bit and name not in modifiers:
+            # Shift is already part of the keysym of printable characters (a vs A)
+            if name == "Shift" and len(event.keysym) == 1:
+                continue
+            modifiers.append(name)
+    return "-".join(modifiers + [event.keysym])
+
+
+def Pynput():
+    """pynput's keyboard module, or None if it isn't installed"""
+    global pynputKeyboard
+    if pynputKeyboard is False:
+        try:
+            from pynput import keyboard as module
+        except ImportError:
+            module = None
+        pynputKeyboard = module
+    return pynputKeyboard
+
+
+def TkSequence(key):
+    """The Tk event sequence for a key name, e.g. Control-a -> <Control-KeyPress-a>"""
+    parts = key.split("-")
+    return "<" + "-".join(parts[:-1] + ["KeyPress", parts[-1]]) + ">"
+
+
+def PynputHotkey(key):
+    """The pynput hot key string for a key name, e.g. Control-F1 -> <ctrl>+<f1>"""
+    parts = key.split("-")
+    names = {"Control": "<ctrl>", "Alt": "<alt>", "Shift": "<shift>"}
+    keysym = parts[-1]
+    keysym = keysym.lower() if len(keysym) == 1 else "<" + keysym.lower() + ">"
+    return "+".join([names[part] for part in parts[:-1]] + [keysym])
+
+
+class HotkeyTable:
+    """Compiles the catalog's key bindings into handlers that hold their decoded clip.
+
+    Pressing a key goes straight from Tk (or pynput) to the engine, with no lookups, path building or file access.
+    The clips of bound keys are loaded on the AudioManager's worker and held by the table, so they stay in memory
+    even if the cache drops them."""
+    def __init__ (self, manager, loopState):
+        self.Manager = manager
+        self.LoopState = loopState  # A one item list holding whether sounds should loop
+        self.Triggers = {}  # Key | (Scope, Trigger function)
+        self.Catalog = None  # The catalog the table was compiled from, changes when the board does
+        self.Revision = None  # The catalog's HotkeyRevision when the table was compiled
+
+        self.Probes = deque(maxlen=256)  # Voices started by keys, used to measure their latency
+
+        self._Installed = []  # (widget, sequence, bound to all)
+        self._Listener = None
+
+    def Compile(self, catalog):
+        """A trigger function for every key bound on catalog, loads their clips so run it on the worker"""
+        triggers = {}
+        for key, (title, scope) in list(catalog.Hotkeys.items()):
+            filename = catalog.Files.get(title)
+            if filename is None:
+                continue
+            try:
+                clip = self.Manager.Cache.Get(filename)
+            except (OSError, ValueError) as e:
+                print("Could not bind {0} to {1}: {2}".format(key, title, e))
+                continue
+            triggers[key] = (scope, self._MakeTrigger(catalog, clip, catalog.Gains.get(title, 1.0), title))
+        return triggers
+
+    def _MakeTrigger(self, catalog, clip, gain=1.0, title=None):
+        """A function that plays clip at the given gain, everything it needs is bound in advance. The play is counted
+        against title once it has started."""
+        play = self.Manager.Engine.Play
+        loop = self.LoopState
+        probe = self.Probes.append
+        now = time.perf_counter
+        played = self.Manager.Prefetcher.Played
+
+        def trigger(event=None):
+            probe(play(clip, loop[0], now(), gain))
+            played(catalog, title)
+            return "break"
+        return trigger
+
+    def Install(self, window, root, triggers=None):
+        """Bind the compiled keys, window scoped keys to window and global ones to the whole app. Global keys go
+        through pynput alone if it is installed, as it sees them while the app has focus too."""
+        self.Uninstall()
+        if triggers is not None:
+            self.Triggers = triggers
+
+        listen = Pynput() is not None
+        globalKeys = {}
+        for key, (scope, trigger) in self.Triggers.items():
+            sequence = TkSequence(key)
+            if scope == SCOPE_GLOBAL and listen:
+                globalKeys[PynputHotkey(key)] = trigger
+            elif scope == SCOPE_GLOBAL:
+                root.bind_all(sequence, trigger)
+                self._Installed.append((root, sequence, True))
+            else:
+                window.bind(sequence, trigger)
+                self._Installed.append((window, sequence, False))
+
+        # Let global keys work while other programs have focus too
+        if globalKeys:
+            self._Listener = pynputKeyboard.GlobalHotKeys(globalKeys)
+            self._Listener.daemon = True
+            self._Listener.start()
+
+    def Uninstall(self):
+        """Remove every binding made by Install"""
+        for widget, sequence, boundToAll in self._Installed:
+            if boundToAll:
+                widget.unbind_all(sequence)
+            else:
+                widget.unbind(sequence)
+        self._Installed = []
+
+        if self._Listener is not None:
+            self._Listener.stop()
+            self._Listener = None
+
+    def Update(self, window, root):
+        """Recompile on the worker and reinstall if the bindings have changed since last time. Returns the compile's
+        Future, or None if nothing had changed."""
+        catalog = self.Manager.Catalog
+        if catalog is self.Catalog and self.Revision == catalog.HotkeyRevision:
+            return None
+        self.Catalog = catalog
+        self.Revision = catalog.HotkeyRevision
+        return self.Manager.Worker.Submit(self.Compile, catalog,
+                                          then=lambda future: self.Install(window, root, future.result()))
+
+    def LatencyStats(self):
+        """Key press to first mixed sample times of recent key presses, in milliseconds"""
+        latencies = [voice.Mixed - voice.Triggered for voice in list(self.Probes)
+                     if voice.Mixed is not None and voice.Triggered is not None]
+        stats = {"count": len(latencies)}
+        if latencies:
+            stats["last"] = latencies[-1] * 1000
+            stats["mean"] = sum(latencies) / len(latencies) * 1000
+            stats["max"] = max(latencies) * 1000
+        return stats
@@ -0,0 +1,216 @@
+import mmap
+import os
+import shutil
+import subprocess
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import pcm
+
+
+WORKERS = 4  # Files imported at once
+CONVERT_FRAMES = 1 << 16  # Frames converted at a time, keeps memory use flat for long files
+
+# Formats that can be imported without any help. Everything else needs ffmpeg to decode it.
+NATIVE_EXTENSIONS = (".wav",)
+FFMPEG_EXTENSIONS = (".mp3", ".flac", ".ogg", ".m4a", ".aac", ".opus")
+
+
+class ImportFailed (Exception):
+    """Raised when a file can't be imported, the message says why."""
+
+
+def CanDecode(path):
+    """True if the file has an extension the importer knows how to handle"""
+    ext = os.path.splitext(path)[1].lower()
+    return ext in NATIVE_EXTENSIONS or (ext in FFMPEG_EXTENSIONS and shutil.which("ffmpeg") is not None)
+
+
+def ProbeWave(path):
+    """Read the header of a wave file and check it can be played. Returns its pcm.WaveFormat"""
+    with open(path, "rb") as fle:
+        mapped = mmap.mmap(fle.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        fmt = pcm.ReadWaveFormat(mapped)
+    finally:
+        mapped.close()
+
+    if fmt.FormatTag not in (pcm.WAVE_FORMAT_PCM, pcm.WAVE_FORMAT_IEEE_FLOAT):
+        raise ImportFailed("unsupported wave format " + hex(fmt.FormatTag))
+    if fmt.Channels not in (1, 2):
+        raise ImportFailed("unsupported channel count " + str(fmt.Channels))
+    if fmt.FormatTag == pcm.WAVE_FORMAT_IEEE_FLOAT and fmt.Width not in (4, 8):
+        raise ImportFailed("unsupported float width " + str(fmt.Width))
+    return fmt
+
+
+def ConvertWave(src, dest, fmt):
+    """Write a copy of the wave file src into dest in the engine's native format, a piece at a time"""
+    with open(src, "rb") as fle:
+        mapped = mmap.mmap(fle.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        out = wave.open(dest, "wb")
+        out.setnchannels(pcm.CHANNELS)
+        out.setsampwidth(pcm.WIDTH)
+        out.setframerate(pcm.RATE)
+
+        step = CONVERT_FRAMES * fmt.Channels * fmt.Width
+        state = None
+        with memoryview(mapped) as view:
+            for start in range(fmt.DataStart, fmt.DataEnd, step):
+                chunk = view[start:min(start + step, fmt.DataEnd)]
+                data, state = pcm.ToNative(chunk, fmt, state)
+                chunk.release()
+                out.writeframesraw(data)
+        out.close()
+    finally:
+        mapped.close()
+
+
+def Transcode(src, dest):
+    """Decode any format ffmpeg understands into a native format wave file"""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise ImportFailed("ffmpeg is needed to import " + os.path.splitext(src)[1] + " files")
+
+    result = subprocess.run([ffmpeg, "-v", "error", "-y", "-i", src, "-f", "wav", "-acodec", "pcm_s16le",
+                             "-ac", str(pcm.CHANNELS), "-ar", str(pcm.RATE), dest],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        if os.path.exists(dest):
+            os.remove(dest)
+        raise ImportFailed(result.stderr.decode(errors="replace").strip() or "ffmpeg failed")
+
+
+class ImportJob:
+    """Imports a batch of audio files on a pool of worker threads.
+
+    Each file is probed, given a title and filename that don't clash with anything already in the catalog, then
+    moved (or converted) into the audio folder. If blobs (a contentindex.ContentIndex) is given, a file whose audio
+    is already in the folder is removed again and its entry plays the one already there, which is held until the entry
+    has been added so it can't be deleted in the mean time. Once every file is done the
+    new entries are all added to the catalog in a single commit. The UI polls Done / Total / Finished to show
+    progress."""
+    def __init__ (self, files, catalog, folder, workers=WORKERS, blobs=None):
+        self.Files = list(files)
+        self.Catalog = catalog
+        self.Folder = folder
+        self.Workers = workers
+        self.Blobs = blobs
+
+        self.Total = len(self.Files)
+        self.Done = 0  # Files finished, successfully or not
+        self.Added = []  # Titles that were added
+        self.Errors = []  # (path, reason) of the files that failed
+        self.Shared = 0  # Files added that play audio that was already in the folder
+        self.Cancelled = False
+        self.Finished = threading.Event()
+
+        self._Lock = threading.Lock()
+        self._Titles = set()  # Titles and filenames claimed by this job so far
+        self._Filenames = set()
+        self._Results = [None] * self.Total  # (title, filename) for each file, kept in the order they were given
+        self._Held = []  # Files already in the folder that entries play, see ContentIndex.Store
+
+        self._Thread = None
+
+    def Start(self):
+        """Start importing in the background"""
+        self._Thread = threading.Thread(target=self._Run, name="ImportJob", daemon=True)
+        self._Thread.start()
+        return self
+
+    def Wait(self, timeout=None):
+        """Block until the job has finished"""
+        return self.Finished.wait(timeout)
+
+    def Cancel(self):
+        """Stop importing files that haven't been started yet. Files already moved are still added."""
+        self.Cancelled = True
+
+    def _Claim(self, title, filename):
+        """Reserve a title and filename, adding a number to them if they are already used"""
+        stem, ext = os.path.splitext(filename)
+        with self._Lock:
+            number = 1
+            newTitle, newFilename = title, filename
+            while (newTitle in self.Catalog or newTitle in self._Titles or newFilename in self._Filenames
+                   or os.path.exists(self.Folder + newFilename)):
+                number += 1
+                newTitle = "{0} ({1})".format(title, number)
+                newFilename = "{0} ({1}){2}".format(stem, number, ext)
+            self._Titles.add(newTitle)
+            self._Filenames.add(newFilename)
+        return newTitle, newFilename
+
+    def _ImportOne(self, index, path):
+        """Probe, name and move a single file into the audio folder"""
+        if self.Cancelled:
+            return
+
+        dest = None
+        try:
+            name, ext = os.path.splitext(os.path.basename(path))
+            ext = ext.lower()
+            # Every imported file ends up as a wave file
+            title, filename = self._Claim(name, name + ".wav")
+            dest = self.Folder + filename
+            if self.Blobs is not None:
+                self.Blobs.Expect(filename)  # Nothing can match it until it has been stored below
+
+            if ext in NATIVE_EXTENSIONS:
+                fmt = ProbeWave(path)
+                if fmt.IsNative():
+                    shutil.move(path, dest)
+                else:
+                    ConvertWave(path, dest, fmt)
+                    os.remove(path)
+            elif ext in FFMPEG_EXTENSIONS:
+                Transcode(path, dest)
+                os.remove(path)
+            else:
+                raise ImportFailed("unsupported file type " + ext)
+
+            self._Results[index] = (title, filename)
+            if self.Blobs is not None:
+                # Hashed here, so the workers hash in parallel
+                stored = self.Blobs.Store(filename)
+                if stored != filename:
+                    with self._Lock:
+                        self._Held.append(stored)
+                    os.remove(dest)
+                    self._Results[index] = (title, stored)
+                    with self._Lock:
+                        self.Shared += 1
+
+        except (ImportFailed, ValueError, OSError) as e:
+            # Don't leave a half written file behind, the name was free when it was claimed so it's ours to remove
+            if dest is not None and self._Results[index] is None and os.path.exists(dest) and os.path.exists(path):
+                os.remove(dest)
+            if dest is not None and self.Blobs is not None:
+                self.Blobs.Abandon(filename)
+            with self._Lock:
+                self.Errors.append((path, str(e)))
+
+        finally:
+            with self._Lock:
+                self.Done += 1
+
+    def _Run(self):
+        """Farm the files out to the workers then add everything that worked to the catalog in one go"""
+        try:
+            if self.Blobs is not None:
+                self.Blobs.Rescan()
+            with ThreadPoolExecutor(max_workers=self.Workers) as pool:
+                for index, path in enumerate(self.Files):
+                    pool.submit(self._ImportOne, index, path)
+
+            entries = [result for result in self._Results if result is not None]
+            self.Catalog.AddMany(entries)
+            self.Added = [title for title, _filename in entries]
+        finally:
+            if self._Held:
+                self.Blobs.Release(self._Held)
+            self.Finished.set()
@@ -0,0 +1,123 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import audioengine
+import pcm
+
+
+TARGET_LOUDNESS = -20.0  # dB relative to full scale that every clip is brought to
+PEAK_CEILING = -1.0  # dB, a clip's gain never pushes its true peak past this
+MAX_BOOST = 12.0  # dB, quiet clips aren't turned up more than this
+
+CHUNK = 8  # Files measured per task handed to a worker process
+POOL_THRESHOLD = 16  # Fewer files than this are measured on the job's own thread rather than starting processes
+WORKERS = max(1, (os.cpu_count() or 2) - 1)  # Leave a core for the UI and the mixer
+
+
+def Gain(loudness, peak):
+    """The playback gain that brings a clip to TARGET_LOUDNESS without its peak going over PEAK_CEILING"""
+    if loudness is None:
+        return 1.0  # Silent
+    change = min(TARGET_LOUDNESS - loudness, MAX_BOOST)
+    if peak is not None:
+        change = min(change, PEAK_CEILING - peak)
+    return 10 ** (change / 20)
+
+
+def Measure(path):
+    """The (loudness, peak) of an audio file, in dB"""
+    clip = audioengine.LoadClip(path)
+    return pcm.Loudness(clip.Data)
+
+
+def MeasureMany(paths):
+    """Measure a number of files, the result for a file that can't be read is the reason why as a string"""
+    results = []
+    for path in paths:
+        try:
+            results.append(Measure(path))
+        except (OSError, ValueError) as e:
+            results.append(str(e))
+    return results
+
+
+class LoudnessJob:
+    """Measures the loudness of a number of entries in the background and saves their gains to the catalog.
+
+    Large batches are spread over a pool of worker processes so every core can be used, results are saved as each
+    chunk comes back so the gains start applying straight away. Without titles, every entry that hasn't been
+    measured yet is, worked out once the job has started."""
+    def __init__ (self, catalog, folder, titles=None, workers=WORKERS):
+        self.Catalog = catalog
+        self.Folder = folder
+        self.Workers = workers
+
+        self.Titles = titles
+        self.Total = len(titles) if titles is not None else None  # Filled in once started if not given
+        self.Done = 0
+        self.Errors = []  # (title, reason) of the clips that couldn't be measured
+        self.Cancelled = False
+        self.Finished = threading.Event()
+
+        self._Thread = None
+
+    def Start(self):
+        """Start measuring in the background"""
+        self._Thread = threading.Thread(target=self._Run, name="LoudnessJob", daemon=True)
+        self._Thread.start()
+        return self
+
+    def Wait(self, timeout=None):
+        """Block until the job has finished"""
+        return self.Finished.wait(timeout)
+
+    def Cancel(self):
+        """Stop measuring, chunks already being measured are still saved"""
+        self.Cancelled = True
+
+    def _Save(self, entries, results):
+        """Store the gains of a chunk of entries"""
+        saved = []
+        for (title, filename), result in zip(entries, results):
+            if isinstance(result, str):
+                # Unreadable, give it unity gain so it isn't tried again until its file changes
+                self.Errors.append((title, result))
+                result = (None, None)
+            loudness, peak = result
+            saved.append((title, filename, loudness, peak, Gain(loudness, peak)))
+        self.Catalog.SetLoudness(saved)
+        self.Done += len(entries)
+
+    def _Run(self):
+        try:
+            if self.Titles is None:
+                self.Titles = self.Catalog.Unmeasured()
+                self.Total = len(self.Titles)
+
+            # Filenames are taken now, a result is only saved if the entry still points at the same file
+            files = self.Catalog.Files
+            entries = [(title, files[title]) for title in self.Titles if title in files]
+            chunks = [entries[i:i+CHUNK] for i in range(0, len(entries), CHUNK)]
+            paths = [[self.Folder + filename for _title, filename in chunk] for chunk in chunks]
+
+            if self.Total < POOL_THRESHOLD or self.Workers <= 1:
+                for chunk, chunkPaths in zip(chunks, paths):
+                    if self.Cancelled:
+                        break
+                    self._Save(chunk, MeasureMany(chunkPaths))
+                return
+
+            # Spawned rather than forked, forking a process with Tk and the mixer running isn't safe
+            pool = ProcessPoolExecutor(max_workers=self.Workers, mp_context=multiprocessing.get_context("spawn"))
+            try:
+                futures = {pool.submit(MeasureMany, chunkPaths): chunk for chunk, chunkPaths in zip(chunks, paths)}
+                for future in as_completed(futures):
+                    if self.Cancelled:
+                        break
+                    self._Save(futures[future], future.result())
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+        finally:
+            self.Finished.set()
@@ -1,298 +1,237 @@
 from tkinter import filedialog as tkFileDialog
 import tkinter as tk
+import tkinter.font as tkFont
 from tkinter.messagebox import askyesno as tkAskYesNo
 from tkinter.messagebox import showinfo as tkShowInfo
 
 import widgets
+import boards
+import hotkeys
+import importer
+import remote
+import stats
+# The paths and limits are still available from here for the scripts that used them before the split
+from audiomanager import (AudioManager, PatternNames, CONTENT_FILE, CATALOG_FILE, SNAPSHOT_FILE, BOARDS_FOLDER,
+                          AUDIO_FOLDER, PEAKS_FILE, CONVERTED_FOLDER, PAGE_LIMIT, QUEUE_CROSSFADE)
 
-import winsound as wsnd
-import csv
+from collections import OrderedDict
+from os import environ
 
-from tempfile import NamedTemporaryFile
-import shutil
-from os import remove as osRem
 
-
-CONTENT_FILE = "Files/content.csv"
-PAGE_LIMIT = 25
+SYNC_INTERVAL = 1000  # Milliseconds between checks for changes made by other programs
+REMOTE_INTERVAL = 50  # Milliseconds between runs of the window commands sent by remote controls
+WORKER_INTERVAL = 20  # Milliseconds between runs of the callbacks of operations the worker has finished
 
 FONT_FAMILY = "sans-serif"
 FONTS = {"xl":(FONT_FAMILY, 24), "l":(FONT_FAMILY, 20), "m":(FONT_FAMILY, 16), "s":(FONT_FAMILY, 12)}
 
 
-class AudioManager:
-    """This is the controller for the audio files"""
-    def __init__ (self):
-        self.Files = {}  # Name | Filename
-        self.LoadFiles()
-
-    def LoadFiles (self):
-        """Clear the files list and then read from the file to repopulate it."""
-        self.Files = {}
-        # Open file
-        with open(CONTENT_FILE) as csv_file:
-            # Initialise the CSV file reader
-            csv_reader = csv.reader(csv_file, delimiter=",")
-
-            # Loop through and save the contents to the Files attribute
-            for row in csv_reader:
-                self.Files[row[0]] = row[1]
-
-    def PlaySound (self, filename, loop=False):
-        """Play a sound"""
-        if loop: # Loop the sound if specified.
-            wsnd.PlaySound("Files/Audio/" + filename, wsnd.SND_ASYNC | wsnd.SND_LOOP | wsnd.SND_FILENAME)
-        else: #  Dont loop the sound.
-            wsnd.PlaySound("Files/Audio/" + filename, wsnd.SND_ASYNC | wsnd.SND_FILENAME)
-
-    def PlaySoundByTitle (self, title, loop=False):
-        """Gets the filename when given a title and plays the file"""
-        # Get file name, then run the PlaySound Method
-        filename = self.Files[title]
-        self.PlaySound(filename, loop=loop)
-
-    def StopSound (self):
-        """Stop any sound that is currently playing"""
-        wsnd.PlaySound(None, wsnd.SND_ASYNC)
-
-    def SoundGenerator (self, max=PAGE_LIMIT, skip=0):
-        """Yields filenames that are stored in Files"""
-        if max > len(self.Files)-skip:  # If there are less files to loop than the max amount loop through all the files
-            # Iters is used to skip the given amount of iterations
-            iters = 0
-            for title, value in self.Files.items():
-                if iters < skip:  # Skip if we haven't passed the skip amount.
-                    iters += 1
-                    continue
-                yield title
-                iters += 1
-
-        else: # Only loop through until there are the max amount displayed.
-            # Iters is used to see if we have gone over the max amount.
-            iters = 0
-            for title, value in self.Files.items():
-                if iters < skip:
-                    iters += 1
-                    continue
-                yield title
-                iters += 1
-                # Exit if we have gone over the max amount.
-                if iters >= max+skip:
-                    break
-
-    def DeleteEntry (self, entryName, deleteAudioFile=False):
-        """Delete an entry from the CONTENT_FILE file and then reload the list."""
-
-        # to do this, we create a temporary file and copy every row into it from the current file unless that row
-        # has the same name as the given name.
-
-        tempfile = NamedTemporaryFile(delete=False, mode="w")
-
-        # Open csv file and initialise the reader
-        with open(CONTENT_FILE) as csvFile:
-            reader = csv.reader(csvFile, delimiter=",")
-
-            # loop through each element in the current file, checking if the name matches the given name
-            # write the row to the temp file if it does match, otherwise ignore that line
-            for row in reader:
-                if row[0] == entryName:
-                    # The name matches, we can delete the file if needed, if not it just dont write to the new file.
-                    if deleteAudioFile:
-                        # Now delete the audio file if it is set too.
-                        osRem("Files/Audio/" + str(row[1]))
-                else:
-                    # Write the data to the temporary file
-                    tempfile.write(",".join(row) + "\n")
-
-        # Close the temp file and then move it
-        tempfile.close()
-        shutil.move(tempfile.name, CONTENT_FILE)
-
-        # Re-load the files
-        self.LoadFiles()
-
-    def AddEntry (self, files: tuple):
-        """Add a audio entry to the file and also move the file to the audio folder, then reload"""
-        for file in files:
-            # split the filename from the path
-            filename = file.split("/")[-1]
-
-            # Move the file to the audio folder
-            shutil.move(file, "Files/Audio/" + str(filename))
-
-            # Write the new entry to the content file setting the title as the filename without the extension
-            with open(CONTENT_FILE, "a") as content:
-                content.write(filename.replace(".wav", "") + "," + filename + "\n")
-
-        # Reload the files list
-        self.LoadFiles()
-
-    def RenameEntry (self, curName, newName):
-        """Rename a current entry to a new name"""
-
-        # to do this, a temp file is created, then copy every row from the current file into it, changing the value if
-        # the title matches
-
-        tempfile = NamedTemporaryFile(delete=False, mode="w")
-
-        # Open csv file and initialise the reader
-        with open(CONTENT_FILE) as csvFile:
-            reader = csv.reader(csvFile, delimiter=",")
-
-            # loop through each element, add if it does not match the curName and switch if it does match
-            for row in reader:
-                if row[0] == curName:
-                    # The names match so switch the values
-                    row[0] = newName
-                # Write to the temporary file
-                tempfile.write(",".join(row) + "\n")
-
-        # Close the temp file and then over right the CONTENT FILE with it
-        tempfile.close()
-        shutil.move(tempfile.name, CONTENT_FILE)
-
-        # Re-load the files
-        self.LoadFiles()
-
-    def DeleteAllEntries(self):
-        """Creates an empty file and replaces the current one with it."""
-
-        # Create a temp file that is empty
-        tempfile = NamedTemporaryFile(mode="w", delete=False)
-        tempfile.close()
-
-        # Over write the current file with the empty file
-        shutil.move(tempfile.name, CONTENT_FILE)
-
-        # Re-load the files
-        self.LoadFiles()
-
-    def MoveEntryUp (self, title):
-        """Moves the audio file entry with the given title up one slot"""
-
-        # Loop through the file until we find an element with the given title
-        with open(CONTENT_FILE) as csvFile:
-            reader = csv.reader(csvFile, delimiter=",")
-
-            # Save the line that the element was on and the data of that line
-            line = 0
-            rowData = []
-            for row in reader:
-                if row[0] == title:
-                    rowData = row
-                    break
-
-                line += 1
-
-        # If the file isn't the first element, then do the swapping
-        if line > 0:
-            # Create a temp file to write too.
-            tempfile = NamedTemporaryFile(mode="w", delete=False)
-
-            with open(CONTENT_FILE) as csvFile:
-                reader = csv.reader(csvFile, delimiter=",")
-
-                # Deduct 1 from the swapline as this is the line we need to swap with.
-                swapLine = line - 1
-                line = - 1  # Line starts at -1 as we update the line before running
-                # IDK why but it wasn't working when line += 1 was at the end of the loop
-
-                for row in reader:
-                    line += 1
-                    # If we are on the swap line, then right the saved data, then the data that it is swapped with
-                    if line == swapLine:
-                        tempfile.write(",".join(rowData) + "\n")
-                        tempfile.write(",".join(row) + "\n")
-                    elif line == swapLine + 1:
-                        # Skip the line the data was originally on
-                        continue
-                    else:
-                        # Just right the data as this didn't need to be swapped out.
-                        tempfile.write(",".join(row) + "\n")
-
-            # Close file and then overwrite the CONTENT_FILE
-            tempfile.close()
-            shutil.move(tempfile.name, CONTENT_FILE)
-
-        # Re-load the files
-        self.LoadFiles()
-
-    def MoveEntryDown(self, title):
-        """Moves the audio file entry with the given title up one slot"""
-
-        with open(CONTENT_FILE) as csvFile:
-            reader = csv.reader(csvFile, delimiter=",")
-
-            iters = 0
-            rowData = []
-
-            for row in reader:
-                if row[0] == title:
-                    rowData = row
-                    break
-                iters += 1
-
-        with open(CONTENT_FILE) as fle: rows = sum(1 for _ in fle)
-
-        # If the item found isn't the last element then run
-        if iters < rows - 1:  # -1 as the rows needs to become the index value
-            tempfile = NamedTemporaryFile(mode="w", delete=False)
-            with  open(CONTENT_FILE)  as csvFile:
-                reader = csv.reader(csvFile, delimiter=",")
-
-                # -1 because it didn't work for move up so i ain't risking the hassle this time
-                line = -1
-
-                for row in reader:
-                    line += 1
-                    if line == iters:
-                        continue
-                    elif line == iters + 1:
-                        tempfile.write(",".join(row) + "\n")
-                        tempfile.write(",".join(rowData) + "\n")
-                    else:
-                        tempfile.write(",".join(row) + "\n")
-
-            tempfile.close()
-            shutil.move(tempfile.name, CONTENT_FILE)
-
-        # Re-load the files
-        self.LoadFiles()
-
-
 class Window (tk.Tk):
     """This is the main window handler."""
-    def __init__ (self, *args, **kwargs):
-        tk.Tk.__init__(self, *args, *kwargs)
+    def __init__ (self, *args, audioManager=None, **kwargs):
+        tk.Tk.__init__(self, *args, **kwargs)
 
         # Configure window
         self.title("Soundboard")
         self.geometry("1475x735")
         self.minsize(1475, 735)
 
-        # Create the audio manager object
-        self.AudioManager = AudioManager()
+        # Create the audio manager object, unless one was given. The first page can be shown before it has loaded
+        # the whole catalog.
+        self.AudioManager = audioManager if audioManager is not None else AudioManager(background=True)
 
         # Create the page container
-        container = tk.Frame(self)
-        container.pack(side="top", fill="both", expand=True)
-        container.grid_rowconfigure(0, weight=1)
-        container.grid_columnconfigure(0, weight=1)
+        self.container = tk.Frame(self)
+        self.container.pack(side="top", fill="both", expand=True)
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
 
-        # Create the pages holder and setup pages
+        # The pages are only built the first time they are shown
+        self.PageClasses = {page.pageName: page for page in (Home, AddRemoveAudio)}
         self.Pages = {}
-        for page in (Home, AddRemoveAudio):
-            p = page(container, self)
-            self.Pages[page.pageName] = p
+        self.CurrentPage = None
 
-            p.grid(row=0, column=0, sticky="nsew")
+        # Edits, file moves and board switches run on the AudioManager's worker, their results come back here
+        self.after(WORKER_INTERVAL, self.workerResults)
 
         # Display the home page
         self.showPage("home")
+        self.catalogLoaded()
+
+        # Keep up with changes made by other programs
+        self.after(SYNC_INTERVAL, self.syncCatalog)
+
+        # Shut the audio engine down with the window
+        self.protocol("WM_DELETE_WINDOW", self.Close)
+
+        # F12 shows the timing stats
+        self.statsWindow = None
+        self.bind_all("<F12>", lambda event: self.ToggleStats())
+
+        # Remote control, if SOUNDBOARD_REMOTE gives a port or host:port to listen on
+        self.Remote = None
+        if environ.get("SOUNDBOARD_REMOTE"):
+            host, port = remote.Address(environ["SOUNDBOARD_REMOTE"])
+            self.StartRemote(host, port, token=environ.get("SOUNDBOARD_REMOTE_TOKEN") or None)
+
+    def StartRemote(self, host=remote.HOST, port=remote.PORT, token=None):
+        """Start the remote control server, returns it or None if the address couldn't be used"""
+        server = remote.RemoteServer(self.AudioManager, host, port, token, loopState=self.GetPage("home").loopState)
+        try:
+            self.Remote = server.Start()
+        except OSError as e:
+            print("Could not start the remote control on {0}:{1}: {2}".format(host, port, e))
+            return None
+        self.after(REMOTE_INTERVAL, self.remoteCommands)
+        return self.Remote
+
+    def remoteCommands(self):
+        """Run the commands remote controls have sent that change the window"""
+        if self.Remote is None:
+            return
+        self.Remote.Drain(self.remoteCommand)
+        self.after(REMOTE_INTERVAL, self.remoteCommands)
+
+    def remoteCommand(self, name, command):
+        """Run a single remote command that changes the window"""
+        home = self.GetPage("home")
+        try:
+            if name == "loop":
+                on = remote.Flag(command["on"]) if "on" in command else not home.doLoop
+                if on != home.doLoop:
+                    home.LoopClick()
+            elif name == "board":
+                self.SwitchBoard(command["name"])
+            elif name == "page":
+                if self.CurrentPage != "home":
+                    self.showPage("home")
+                if "delta" in command:
+                    home.GoToPage(home.PageNumber + int(command["delta"]))
+                else:
+                    home.GoToPage(int(command.get("page", 1)) - 1)
+        except (KeyError, ValueError):
+            pass  # Not a number or not a board, nothing to do
+
+    def SwitchBoard(self, name):
+        """Show a different board on every page once it has been opened on the worker, returns the switch's Future"""
+        return self.AudioManager.Worker.Submit(self.AudioManager.SwitchBoard, name, then=self.boardSwitched)
+
+    def boardSwitched(self, future):
+        """Show the board that has just been switched to, or stay on the last one if there was no such board"""
+        try:
+            future.result()
+        except KeyError:
+            self.GetPage("home").boardVar.set(self.AudioManager.Board)  # The menu already ticked the missing one
+            return
+
+        for page in self.Pages.values():
+            page.BoardChanged()
+        # Catch up once the rest of it has loaded, if it wasn't open already
+        self.catalogLoaded()
+
+    def RunOnWorker(self, function, *args, then=None, failed=None):
+        """Run an AudioManager operation on its worker after those already waiting, returns its Future.
+
+        Once it has finished then(result) is called on the Tk thread, or failed(error) if it raised OSError, KeyError
+        or ValueError, which are shown in a message box if there's no failed."""
+        def finished(future):
+            try:
+                result = future.result()
+            except (OSError, KeyError, ValueError) as e:
+                if failed is not None:
+                    failed(e)
+                else:
+                    tkShowInfo("Update!", "That could not be done, {0}.".format(e))
+                return
+            if then is not None:
+                then(result)
+
+        return self.AudioManager.Worker.Submit(function, *args, then=finished)
+
+    def workerResults(self):
+        """Run the callbacks of the operations the worker has finished"""
+        self.AudioManager.Worker.Drain()
+        self.after(WORKER_INTERVAL, self.workerResults)
+
+    def ToggleStats(self):
+        """Show or hide the stats overlay, turning stats collection on the first time it is shown"""
+        if self.statsWindow is not None and self.statsWindow.top.winfo_exists():
+            self.statsWindow.KillSelf()
+            self.statsWindow = None
+            return
+
+        stats.Enable()
+        self.statsWindow = widgets.StatsWindow(self, extra=self.EngineStats, font=("Courier", 11))
+
+    def EngineStats(self):
+        """Figures from the audio engine and cache to show alongside the timings"""
+        manager = self.AudioManager
+        figures = {
+            "voices": manager.Engine.ActiveVoices(),
+            "voices stolen": manager.Engine.Stolen,
+            "late starts": manager.Engine.Late,
+            "stream underruns": manager.Engine.Streamer.Underruns,
+            "cache hits": manager.Cache.Hits,
+            "cache misses": manager.Cache.Misses,
+            "cache MB": round(manager.Cache.Size / 1048576, 1),
+            "cache prefetched": manager.Cache.Prefetched,
+            "catalog entries": len(manager.Catalog),
+            "board": manager.Board,
+        }
+        home = self.Pages.get("home")
+        if home is not None:
+            # Key press to first mixed sample, in milliseconds
+            for name, value in home.Hotkeys.LatencyStats().items():
+                figures["hotkey " + name if name == "count" else "hotkey ms " + name] = round(value, 2)
+        return figures
+
+    def Close(self):
+        """Stop the audio and destroy the window"""
+        if self.Remote is not None:
+            self.Remote.Close()
+            self.Remote = None
+        self.AudioManager.Close()
+        self.destroy()
+
+    def GetPage(self, pageName):
+        """The page with the given name, built if this is the first time it's been asked for"""
+        page = self.Pages.get(pageName)
+        if page is None:
+            page = self.PageClasses[pageName](self.container, self)
+            page.grid(row=0, column=0, sticky="nsew")
+            self.Pages[pageName] = page
+        return page
+
+    def catalogLoaded(self):
+        """Wait for the catalog to finish loading, then catch the pages up with the entries that weren't there before"""
+        if not self.AudioManager.Catalog.Loaded.is_set():
+            self.after(50, self.catalogLoaded)
+            return
+
+        # Get the waveforms of the whole board ready, the visible ones are always done first
+        self.AudioManager.IndexPeaks()
+        self.AudioManager.MeasureLoudness()
+        self.AudioManager.Worker.Submit(self.AudioManager.TidyConverted)
+
+        for page in self.Pages.values():
+            page.CatalogChanged()
+
+    def syncCatalog(self):
+        """Check for changes made outside the app on the worker, the pages are updated in place if there were any"""
+        self.AudioManager.Worker.Submit(self.AudioManager.Sync, then=self.catalogSynced)
+
+    def catalogSynced(self, future):
+        """Catch the pages up with a sync that has just finished, then wait for the next one"""
+        self.after(SYNC_INTERVAL, self.syncCatalog)
+        if future.result():
+            for page in self.Pages.values():
+                page.CatalogChanged()
+            self.AudioManager.MeasureLoudness()
 
     def showPage(self, pageName):
         """This function brings the chosen page to the top."""
-        page = self.Pages[pageName]
+        page = self.GetPage(pageName)
+        self.CurrentPage = pageName
         page.tkraise()
         page.PageUpdate()
         page.focus_set()
@@ -308,13 +247,28 @@ class Home (tk.Frame):
     ROWS = 5
     COLS = 5
 
+    # Waveform images kept around for pages that have been shown
+    THUMBNAIL_LIMIT = 200
+
     def __init__ (self, parent, controller):
         tk.Frame.__init__(self, parent)
 
         self.controller = controller
 
+        # Buttons with an image are sized in pixels rather than characters, so work out the size of a 15 character
+        # by 3 line button. The waveform goes under the title and takes up a line.
+        font = tkFont.Font(font=FONTS["xl"])
+        lineHeight = font.metrics("linespace")
+        buttonWidth = font.measure("0") * 15
+        self.thumbnailSize = (buttonWidth - 20, lineHeight)
+        self.blankImage = tk.PhotoImage(width=1, height=1)  # For buttons without a waveform (yet)
+        self.Thumbnails = OrderedDict()  # Filename | Waveform image, the most recently shown last
+        self.peaksRevision = None
+
         # Setup the button container and then the buttons
         self.Buttons = [] # Stored as an attribute of page so that it can be changed on the fly.
+        self.buttonFiles = []  # The filename of the waveform each button should show
+        self.buttonTitles = []  # The title each button plays
         buttonContainer = tk.Frame(self)
         buttonContainer.pack(side="top", fill="both")
         buttonContainer.grid_propagate(True)
@@ -322,14 +276,22 @@ class Home (tk.Frame):
             this_row = []
             for _col in range(self.COLS):
                 # Create the button and store it in the row placeholder
-                btn = tk.Button(buttonContainer, text="*****", width=15, height=3, font=FONTS["xl"])
+                btn = tk.Button(buttonContainer, text="*****", image=self.blankImage, compound="bottom",
+                                width=buttonWidth, height=lineHeight * 3, font=FONTS["xl"])
                 btn.grid(row=_row, column=_col, sticky="nsew")
+                # Shift-click queues the sound to play after whatever is queued rather than straight away
+                btn.bind("<Shift-Button-1>", lambda event, r=_row, c=_col: self.queueButton(r, c))
                 this_row.append(btn)
             # Add the row to the column in the buttons holder.
             self.Buttons.append(this_row)
+            self.buttonFiles.append([None] * self.COLS)
+            self.buttonTitles.append([None] * self.COLS)
 
-        # Load the titles of the sounds onto the buttons and connect the buttons to the SoundManager when clicked.
-        self.loadNames()
+        # Titles matching the search box, None when nothing is being searched for
+        self.Results = None
+        self.searchPending = None
+
+        # The titles are put on the buttons by PageUpdate when the page is shown
 
         # The control panel at the bottom.
         controlPanel = tk.Frame(self, bg="#757575")
@@ -342,16 +304,42 @@ class Home (tk.Frame):
 
         # Loops the sound.
         self.doLoop = False
+        self.loopState = [self.doLoop]  # Shared with the hot key triggers
         self.loopBtn = tk.Button(controlPanel, text="Loop", font=FONTS["xl"],
                                  command=lambda:self.LoopClick())
         # Made an attribute of the class so that we can access it it and change the visuals later to show it is selected
         self.loopBtn.pack(side="left")
 
+        # Limits the mix so several loud sounds at once don't clip.
+        self.doLimit = False
+        self.limitBtn = tk.Button(controlPanel, text="Limit", font=FONTS["xl"],
+                                  command=lambda: self.LimitClick())
+        self.limitBtn.pack(side="left")
+
         # Edit Audio Files Page
         edit = tk.Button(controlPanel, text="Edit Audio Files", font=FONTS["xl"],
                          command=lambda: self.controller.showPage("addremaudio"))
         edit.pack(side="left")
 
+        # Board picker, the menu is filled in each time it is opened so new boards show up
+        self.boardVar = tk.StringVar(self, value=self.controller.AudioManager.Board)
+        self.boardBtn = tk.Menubutton(controlPanel, textvariable=self.boardVar, font=FONTS["xl"], relief="raised")
+        self.boardMenu = tk.Menu(self.boardBtn, tearoff=False, font=FONTS["m"], postcommand=self.fillBoardMenu)
+        self.boardBtn.configure(menu=self.boardMenu)
+        self.boardBtn.pack(side="left")
+
+        # Search box, the buttons are filled with the matching titles as the user types
+        tk.Label(controlPanel, text="Search:", bg="#757575", font=FONTS["l"]).pack(side="left", padx=(20, 0))
+        self.SearchText = tk.StringVar(self)
+        self.SearchText.trace_add("write", lambda *args: self.SearchChanged())
+        searchBox = tk.Entry(controlPanel, textvariable=self.SearchText, width=20, font=FONTS["l"])
+        searchBox.pack(side="left")
+        searchBox.bind("<Escape>", lambda event: self.SearchText.set(""))
+        searchBox.bind("<Return>", lambda event: self.__playFirstResultBind(event))
+
+        # Build the search index in the background so the first key press doesn't have to wait for it
+        self.controller.AudioManager.PrepareSearch()
+
         # Page Navigation Buttons
         self.PageNumber = 0
 
@@ -369,26 +357,107 @@ class Home (tk.Frame):
         self.bind("<Left>", lambda event: self.__prevPageBind(event))
         self.bind("<Right>", lambda event: self.__nextPageBind(event))
 
+        # Key bindings, compiled into handlers that go straight to the audio engine
+        self.Hotkeys = hotkeys.HotkeyTable(self.controller.AudioManager, self.loopState)
+        self.Hotkeys.Update(self, self.controller)
+
+        # Fill in waveforms as they're worked out
+        self.checkPeaks()
+
     def PageUpdate(self):
         """Run an entire page update, mostly used by the controller when changing pages."""
 
         self.PageNumber = 0
         self.loadNames(self.PageNumber)
 
+        # Pick up any key bindings that were changed on the edit page
+        self.Hotkeys.Update(self, self.controller)
+
+    def CatalogChanged(self):
+        """Show changes made to the catalog from somewhere else, staying on the same page"""
+        self.Hotkeys.Update(self, self.controller)
+
+        if self.Results is not None:
+            # Results may have been renamed or deleted
+            self.Results = self.controller.AudioManager.Search(self.SearchText.get())
+        if not self.loadNames(self.PageNumber) and self.PageNumber > 0:
+            # This page has gone, so go back to the first one
+            self.PageNumber = 0
+            self.PageText.configure(text="Page: 1")
+            self.loadNames(self.PageNumber)
+
+    def BoardChanged(self):
+        """Show the first page of a board that has just been switched to"""
+        self.Hotkeys.Update(self, self.controller)
+        self.controller.AudioManager.PrepareSearch()
+
+        self.boardVar.set(self.controller.AudioManager.Board)
+        if self.SearchText.get():
+            self.SearchText.set("")  # Runs the search, which shows the first page
+        else:
+            self.PageNumber = 0
+            self.PageText.configure(text="Page: 1")
+            self.loadNames(self.PageNumber)
+
+    def fillBoardMenu(self):
+        """List the boards in the board menu, along with adding and removing them"""
+        audioManager = self.controller.AudioManager
+        self.boardMenu.delete(0, "end")
+        for name in audioManager.Boards.Names():
+            self.boardMenu.add_radiobutton(label=name, value=name, variable=self.boardVar,
+                                           command=lambda n=name: self.controller.SwitchBoard(n))
+        self.boardMenu.add_separator()
+        self.boardMenu.add_command(label="New Board...", command=lambda: self.newBoard())
+        self.boardMenu.add_command(label="Remove This Board", command=lambda: self.removeBoard(),
+                                   state="disabled" if audioManager.Board == boards.DEFAULT_BOARD else "normal")
+
+    def newBoard(self):
+        """Ask for a name then make a new empty board and show it"""
+        self.controller.update()
+        inp = widgets.GetInput(self.controller, question="Name of the new board: ", font=FONTS["l"])
+        self.controller.wait_window(inp.top)
+        if not inp.Data:
+            return
+
+        name = inp.Data
+        self.controller.RunOnWorker(self.controller.AudioManager.CreateBoard, name,
+                                    then=lambda _: self.controller.SwitchBoard(name),
+                                    failed=lambda e: tkShowInfo("Update!",
+                                                                "The board could not be made, {0}.".format(e)))
+
+    def removeBoard(self):
+        """Remove the board being shown after confirming, then go back to the first board"""
+        name = self.controller.AudioManager.Board
+        result = tkAskYesNo("Remove " + name,
+                            "Are you sure you want to remove the {0} board?\nThis can not be undone.".format(name),
+                            icon="warning")
+        if not result:
+            return
+
+        # The worker runs them in order, so the board has been left by the time it is deleted
+        self.controller.SwitchBoard(boards.DEFAULT_BOARD)
+        self.controller.RunOnWorker(self.controller.AudioManager.DeleteBoard, name)
+
+    @stats.Timed("render.loadNames")
     def loadNames (self, pageNumber=0):
         """Loads the names into the buttons"""
         row = 0
         col = 0
 
+        files = self.controller.AudioManager.Files
+
         # Loop through all the titles and then update the button to reflect the title.
-        for title in self.controller.AudioManager.SoundGenerator(skip=pageNumber*PAGE_LIMIT):
+        for title in self.pageTitles(pageNumber):
             if len(title) > 19:
                 dispTitle = title[0:17] + "..."
             else:
                 dispTitle = title
 
-            self.Buttons[row][col].configure(text=dispTitle)
-            self.Buttons[row][col].configure(command=lambda t=title: self.playSoundName(t))
+            filename = files.get(title)
+            self.buttonFiles[row][col] = filename
+            self.buttonTitles[row][col] = title
+            self.Buttons[row][col].configure(text=dispTitle, command=lambda t=title: self.playSoundName(t),
+                                             image=self.thumbnail(filename))
             # Increase the column
             col += 1
             # If the column num is greater than the columns for this page, then reset to zero and increase the row.
@@ -400,8 +469,9 @@ class Home (tk.Frame):
                     break
         else:
             # Check if it never looped or if the rows have been completed. return False if so
-            # return False shows that this page had no elements
-            if row >= self.ROWS or (col == 0 and row == 0):
+            # return False shows that this page had no elements. The first page is still cleared, as it may be showing
+            # another board or search.
+            if row >= self.ROWS or (col == 0 and row == 0 and pageNumber > 0):
                 return False
 
         # Fill in the rest of the buttons with a placeholder text and clear the command
@@ -411,13 +481,75 @@ class Home (tk.Frame):
                 row += 1
                 if row >= self.ROWS:
                     break
-            self.Buttons[row][col].configure(text="*****")
-            self.Buttons[row][col].configure(command=lambda: None)
+            self.Buttons[row][col].configure(text="*****", command=lambda: None, image=self.blankImage)
+            self.buttonFiles[row][col] = None
+            self.buttonTitles[row][col] = None
             col += 1
 
+        # Get the clips of this page and the ones either side ready to play, paging with the arrow keys included
+        self.controller.AudioManager.PrefetchAround(pageNumber * PAGE_LIMIT, results=self.Results)
+
         # Return true to show that this page has elements
         return True
 
+    def thumbnail(self, filename):
+        """The waveform image of a file, blank if it isn't ready yet"""
+        image = self.Thumbnails.get(filename)
+        if image is not None:
+            self.Thumbnails.move_to_end(filename)
+            return image
+
+        envelope = self.controller.AudioManager.Peaks.Get(filename) if filename is not None else None
+        if envelope is None:
+            return self.blankImage
+
+        image = widgets.WaveformImage(envelope, *self.thumbnailSize)
+        self.Thumbnails[filename] = image
+        if len(self.Thumbnails) > self.THUMBNAIL_LIMIT:
+            self.Thumbnails.popitem(last=False)
+        return image
+
+    def checkPeaks(self):
+        """Put the waveforms on buttons that were shown before theirs was ready"""
+        revision = self.controller.AudioManager.Peaks.Revision
+        if revision != self.peaksRevision:
+            self.peaksRevision = revision
+            for buttonRow, fileRow in zip(self.Buttons, self.buttonFiles):
+                for button, filename in zip(buttonRow, fileRow):
+                    if filename is not None and filename not in self.Thumbnails:
+                        button.configure(image=self.thumbnail(filename))
+        self.after(250, self.checkPeaks)
+
+    def pageTitles(self, pageNumber):
+        """The titles on the given page, either of the whole catalog or of the search results"""
+        if self.Results is None:
+            return self.controller.AudioManager.SoundGenerator(skip=pageNumber*PAGE_LIMIT)
+        return self.Results[pageNumber*PAGE_LIMIT:(pageNumber+1)*PAGE_LIMIT]
+
+    def SearchChanged(self):
+        """Run the search once Tk is idle, so a burst of typing only searches once"""
+        if self.searchPending is None:
+            self.searchPending = self.after_idle(self.RunSearch)
+
+    def RunSearch(self):
+        """Fill the buttons with the titles matching the search box"""
+        self.searchPending = None
+        query = self.SearchText.get()
+        if query.strip():
+            self.Results = self.controller.AudioManager.Search(query)
+        else:
+            self.Results = None
+
+        # Show the first page of results
+        self.PageNumber = 0
+        self.PageText.configure(text="Page: 1")
+        self.loadNames(self.PageNumber)
+
+    def __playFirstResultBind(self, event):
+        """function for the keybind, plays the best match"""
+        if self.Results:
+            self.playSoundName(self.Results[0])
+
     def __nextPageBind(self, event):
         """function for the keybind"""
         self.nextPage()
@@ -426,6 +558,14 @@ class Home (tk.Frame):
         """function for the keybind"""
         self.prevPage()
 
+    def GoToPage(self, pageNumber):
+        """Show the given page if it has any titles on it, returns False if it doesn't"""
+        if pageNumber < 0 or not self.loadNames(pageNumber=pageNumber):
+            return False
+        self.PageNumber = pageNumber
+        self.PageText.configure(text="Page: " + str(self.PageNumber + 1))
+        return True
+
     def nextPage(self):
         """Try to change page, if it works page number increases"""
         if self.loadNames(pageNumber=self.PageNumber+1):
@@ -444,6 +584,7 @@ class Home (tk.Frame):
         """Change the loop variable so that the sounds been looped"""
         # Switch the loop variable to the inverse of its  current state.
         self.doLoop = not self.doLoop
+        self.loopState[0] = self.doLoop
 
         # Update the button colour so that the user knows the state.
         if self.doLoop:
@@ -451,9 +592,29 @@ class Home (tk.Frame):
         else:
             self.loopBtn.configure(bg="#eeeeee")
 
+    def LimitClick(self):
+        """Turn the limiter on or off"""
+        self.doLimit = not self.doLimit
+        self.controller.AudioManager.SetLimiter(self.doLimit)
+
+        # Update the button colour so that the user knows the state.
+        if self.doLimit:
+            self.limitBtn.configure(bg="#ee0000")
+        else:
+            self.limitBtn.configure(bg="#eeeeee")
+
+    def queueButton(self, row, col):
+        """Queue the sound on a button, instead of the button playing it"""
+        title = self.buttonTitles[row][col]
+        if title is not None:
+            self.controller.AudioManager.QueueSoundByTitle(title)
+        return "break"
+
     def playSoundName (self, name):
         """Runs the audio managers play sound function with the name of the audio"""
+        start = stats.Start()
         self.controller.AudioManager.PlaySoundByTitle(name, loop=self.doLoop)
+        stats.Stop("trigger.button", start)
 
 
 class AddRemoveAudio (tk.Frame):
@@ -482,6 +643,7 @@ class AddRemoveAudio (tk.Frame):
         pageBack.pack(side="left")
 
         self.PageNumber = 0
+        self.Offset = 0  # Index of the title shown on the first row
 
         self.PageText = tk.Label(navigationPanel, text="Page: " + str(self.PageNumber + 1), font=FONTS["xl"])
         self.PageText.pack(side="left")
@@ -490,21 +652,103 @@ class AddRemoveAudio (tk.Frame):
                                 command=lambda: self.nextPage())
         pageForward.pack(side="right")
 
+        # The list of titles and the scroll bar next to it
+        listFrame = tk.Frame(contentFrame)
+        listFrame.pack(side="top", pady=10)
+
+        self.scrollBar = tk.Scrollbar(listFrame, orient="vertical", command=self.onScroll)
+        self.scrollBar.pack(side="right", fill="y")
+
         # Control Buttons
-        self.buttonsPanel = tk.Frame(contentFrame)
-        self.buttonsPanel.pack(side="top", pady=10)
+        self.buttonsPanel = tk.Frame(listFrame)
+        self.buttonsPanel.pack(side="left")
+
+        # The rows are only built once, scrolling and editing re-bind them to different titles.
+        self.Rows = []  # The widgets of each row
+        self.RowTitles = [None] * self.maxPerPage  # The title each row is currently showing
+        self.rowOf = {}  # Title label | Row, to find the row something is dropped on
+        for row in range(self.maxPerPage):
+            # Audio title text, click to select, shift-click for a range, ctrl-click to add or drop one and drag the
+            # selection to move it
+            label = tk.Label(self.buttonsPanel, font=FONTS["l"])
+            label.bind("<Button-1>", lambda event, r=row: self.pressRow(r))
+            label.bind("<Shift-Button-1>", lambda event, r=row: self.selectRange(r))
+            label.bind("<Control-Button-1>", lambda event, r=row: self.toggleRow(r))
+            label.bind("<ButtonRelease-1>", lambda event, r=row: self.releaseRow(r, event))
+            self.rowOf[label] = row
+
+            # The buttons look their title up when pressed, so they never need re-binding
+            # Remove Button
+            remove = tk.Button(self.buttonsPanel, text="Remove", font=FONTS["m"],
+                               command=lambda r=row: self.DeleteElement(self.RowTitles[r]))
+            # Rename Button
+            rename = tk.Button(self.buttonsPanel, text="Rename", font=FONTS["m"],
+                               command=lambda r=row: self.renameElement(self.RowTitles[r]))
+            # Move up button
+            moveUp = tk.Button(self.buttonsPanel, text="Move Up", font=FONTS["m"],
+                               command=lambda r=row: self.MoveElementUp(self.RowTitles[r]))
+            # Move down button
+            moveDown = tk.Button(self.buttonsPanel, text="Move Down", font=FONTS["m"],
+                                 command=lambda r=row: self.MoveElementDown(self.RowTitles[r]))
+            # Hot key button, shows the bound key
+            hotkey = tk.Button(self.buttonsPanel, text="Set Key", width=10, font=FONTS["m"],
+                               command=lambda r=row: self.setHotkey(r))
+
+            rowWidgets = (label, remove, rename, moveUp, moveDown, hotkey)
+            for col, widget in enumerate(rowWidgets):
+                widget.grid(row=row, column=col, sticky="nsew")
+                widget.grid_remove()  # Hidden until there is a title to show
+            self.Rows.append(rowWidgets)
+
+        self.labelColour = self.Rows[0][0].cget("bg")
+        self.Selected = set()  # Titles selected for the bulk actions
+        self.Anchor = None  # The title shift-click selects a range from
+        self.pressed = None  # (Row, Title) the mouse button went down on, and whether it was selected already
+
+        # Edits run on the AudioManager's worker, until they finish the rows show what they will leave behind
+        self.Removing = set()  # Titles being deleted, which are hidden
+        self.Renamed = {}  # Old title | New title, shown under the new one
 
-        self.loadButtons()
+        # Tell the user than there is no audio files if none have been found!
+        txt = "No audio files are available.\nAdd one now by pressing the 'Add new audio' button below."
+        self.emptyText = tk.Label(self.buttonsPanel, text=txt)
+
+        # Scroll a row at a time with the mouse wheel
+        for widget in (self.buttonsPanel,) + tuple(w for row in self.Rows for w in row):
+            widget.bind("<MouseWheel>", self.__wheelBind)
+            widget.bind("<Button-4>", lambda event: self.scrollTo(self.Offset - 1))
+            widget.bind("<Button-5>", lambda event: self.scrollTo(self.Offset + 1))
 
         # The bottom control panel
         controlPanel = tk.Frame(self, bg="#757575")
         controlPanel.pack(side="bottom", fill="x")
 
+        # Actions on every selected title, only shown while something is selected
+        self.selectionPanel = tk.Frame(self, bg="#9e9e9e")
+        self.selectionText = tk.Label(self.selectionPanel, bg="#9e9e9e", font=FONTS["m"])
+        self.selectionText.pack(side="left")
+        tk.Button(self.selectionPanel, text="Remove Selected", font=FONTS["m"],
+                  command=lambda: self.DeleteSelected()).pack(side="left")
+        tk.Button(self.selectionPanel, text="Rename Selected", font=FONTS["m"],
+                  command=lambda: self.renameSelected()).pack(side="left")
+        tk.Button(self.selectionPanel, text="Move Selected To", font=FONTS["m"],
+                  command=lambda: self.moveSelected()).pack(side="left")
+        tk.Button(self.selectionPanel, text="Copy Selected To Board", font=FONTS["m"],
+                  command=lambda: self.copySelected()).pack(side="left")
+        tk.Button(self.selectionPanel, text="Select None", font=FONTS["m"],
+                  command=lambda: self.setSelection(set())).pack(side="right")
+
         # Add button to add a new audio
         add = tk.Button(controlPanel, text="Add New Audio", font=FONTS["xl"],
                         command=lambda: self.AddElement())
         add.pack(side="left")
 
+        # Import progress and cancel button, only shown while files are being imported
+        self.importJob = None
+        self.importText = tk.Label(controlPanel, bg="#757575", font=FONTS["m"])
+        self.cancelImport = tk.Button(controlPanel, text="Cancel", font=FONTS["m"],
+                                      command=lambda: self.importJob.Cancel())
+
         # Delete all button
         delAll = tk.Button(controlPanel, text="Clear List", bg="#ff2222", font=FONTS["xl"],
                            command=lambda: self.DeleteAllElements())
@@ -522,58 +766,336 @@ class AddRemoveAudio (tk.Frame):
         self.loadButtons(self.PageNumber)
 
     def loadButtons(self, pageNumber=0):
-        """load the names of the buttons"""
+        """Show the given page, returns False if it has no titles on it"""
+        total = self.total()
+        if pageNumber > 0 and pageNumber * self.maxPerPage >= total:
+            return False
 
-        # Clear all the current elements
-        for widget in self.buttonsPanel.winfo_children():
-            widget.destroy()
+        self.scrollTo(pageNumber * self.maxPerPage)
+        return total > 0
+
+    def Refresh(self):
+        """Re-show the current rows after an edit, staying in the same place"""
+        self.scrollTo(self.Offset)
+
+        # Forget anything selected that has gone, titles still being renamed to are not gone yet
+        files = self.controller.AudioManager.Files
+        renamed = set(self.Renamed.values())
+        def present(title):
+            return (title in files or title in renamed) and title not in self.Removing
+        if not all(present(title) for title in self.Selected):
+            self.setSelection({title for title in self.Selected if present(title)})
+
+    def BoardChanged(self):
+        """Show the start of a board that has just been switched to"""
+        self.setSelection(set())
+        self.scrollTo(0)
+        self.showHotkeys()
+
+    def CatalogChanged(self):
+        """Show changes made to the catalog from somewhere else"""
+        self.Refresh()
+
+        # Key bindings may have changed without the titles changing
+        self.showHotkeys()
+
+    def total(self):
+        """The number of titles in the list, leaving out those being deleted"""
+        return max(0, len(self.controller.AudioManager.Files) - len(self.Removing))
+
+    def shownTitles(self, offset):
+        """The titles of the rows from the given index, as they will be once the edits on the worker are done"""
+        catalog = self.controller.AudioManager.Catalog
+        if not self.Removing and not self.Renamed:
+            return catalog.Page(offset, self.maxPerPage)
+        page = catalog.Page(offset, self.maxPerPage + len(self.Removing))
+        titles = (self.Renamed.get(title, title) for title in page)
+        return [title for title in titles if title not in self.Removing][:self.maxPerPage]
+
+    def edit(self, function, *args, removing=(), renaming=None, then=None, failed=None):
+        """Run an AudioManager edit on its worker, the rows are re-shown once it has finished.
+
+        Until then the titles in removing are hidden and those in renaming (Old title | New title) shown under their
+        new names. then(result) and failed(error) are as for Window.RunOnWorker."""
+        removing = set(removing)
+        renaming = dict(renaming or {})
+        self.Removing |= removing
+        self.Renamed.update(renaming)
+
+        def settle():
+            self.Removing -= removing
+            for title in renaming:
+                self.Renamed.pop(title, None)
+            self.Refresh()
+            self.showHotkeys()  # Renamed titles get their keys back
+
+        def done(result):
+            settle()
+            if then is not None:
+                then(result)
+
+        def undone(error):
+            settle()
+            if failed is not None:
+                failed(error)
+            else:
+                tkShowInfo("Update!", "That could not be done, {0}.".format(error))
+
+        future = self.controller.RunOnWorker(function, *args, then=done, failed=undone)
+        if removing or renaming:
+            self.Refresh()
+        return future
+
+    @stats.Timed("render.loadButtons")
+    def scrollTo(self, offset):
+        """Show the titles from the given index onwards, only touching the rows that change"""
+        total = self.total()
+        # Don't scroll past the start of the last page
+        lastPage = max(0, (total - 1) // self.maxPerPage * self.maxPerPage)
+        offset = max(0, min(offset, lastPage))
+        self.Offset = offset
+        self.PageNumber = offset // self.maxPerPage
+
+        titles = self.shownTitles(offset)
+        for row, rowWidgets in enumerate(self.Rows):
+            title = titles[row] if row < len(titles) else None
+            if title == self.RowTitles[row]:
+                continue  # Row is already showing the right thing
+
+            if title is None:
+                # Nothing left to show on this row
+                for widget in rowWidgets:
+                    widget.grid_remove()
+            else:
+                if self.RowTitles[row] is None:
+                    for widget in rowWidgets:
+                        widget.grid()
+                rowWidgets[0].configure(text=title, bg=self.rowColour(title))
+                rowWidgets[5].configure(text=self.hotkeyText(title))
+            self.RowTitles[row] = title
+
+        # Show the empty message if there is nothing in the catalog
+        if total == 0:
+            self.emptyText.grid(row=0, column=0, columnspan=3)
+        else:
+            self.emptyText.grid_remove()
 
-        row = 0
+        # Update the scroll bar and the page number text value
+        if total:
+            self.scrollBar.set(offset / total, min(1.0, (offset + self.maxPerPage) / total))
+        else:
+            self.scrollBar.set(0.0, 1.0)
+        self.PageText.configure(text="Page: " + str(self.PageNumber+1))
 
-        # Loop through all the available titles for the given page and create a label and relevant buttons
-        for title in self.controller.AudioManager.SoundGenerator(max=self.maxPerPage, skip=pageNumber*self.maxPerPage):
-            # Audio title text
-            tk.Label(self.buttonsPanel, text=title, font=FONTS["l"]).grid(row=row, column=0, sticky="nsew")
+    def onScroll(self, action, amount, unit=None):
+        """Scroll bar callback"""
+        total = self.total()
+        if action == "moveto":
+            self.scrollTo(int(float(amount) * total))
+        elif unit == "pages":
+            self.scrollTo(self.Offset + int(amount) * self.maxPerPage)
+        else:
+            self.scrollTo(self.Offset + int(amount))
 
-            # Remove Button
-            tk.Button(self.buttonsPanel, text="Remove", font=FONTS["m"],
-                      command=lambda t=title: self.DeleteElement(t)).grid(row=row, column=1, sticky="nsew")
-            # Rename Button
-            tk.Button(self.buttonsPanel, text="Rename", font=FONTS["m"],
-                      command=lambda t=title: self.renameElement(t)).grid(row=row, column=2, sticky="nsew")
+    def __wheelBind(self, event):
+        """function for the mouse wheel"""
+        self.scrollTo(self.Offset - (1 if event.delta > 0 else -1))
 
-            # Move up button
-            tk.Button(self.buttonsPanel, text="Move Up", font=FONTS["m"],
-                      command=lambda t=title: self.MoveElementUp(t)).grid(row=row, column=3, sticky="nsew")
-            # Move down button
-            tk.Button(self.buttonsPanel, text="Move Down", font=FONTS["m"],
-                      command=lambda t=title: self.MoveElementDown(t)).grid(row=row, column=4, sticky="nsew")
+    def hotkeyText(self, title):
+        """The text of the hot key button for a title"""
+        keys = self.controller.AudioManager.Catalog.HotkeysFor(title)
+        return keys[0] if keys else "Set Key"
 
-            # Increase the row
-            row += 1
+    def setHotkey(self, row):
+        """Wait for a key press and bind it to the title on the given row"""
+        title = self.RowTitles[row]
 
-        # Tell the user than there is no audio files if none have been found!
-        if pageNumber == 0 and row == 0:
-            txt = "No audio files are available.\nAdd one now by pressing the 'Add new audio' button below."
-            tk.Label(self.buttonsPanel,
-                text=txt).grid(row=0, column=0, columnspan=3)
-            return False
-        elif row == 0:
-            # Go back a page as there is nothing on this page.
-            self.prevPage()
-            return False
-        # Return value indicates whether somethings been found or not
-        return True
+        # Update the UI then wait for the user to press a key.
+        self.controller.update()
+        inp = widgets.GetKey(self.controller, question="Key for {0}: ".format(title), font=FONTS["l"])
+        self.controller.wait_window(inp.top)
+
+        if inp.Data is None:
+            return None
+        key, scope = inp.Data, inp.Scope
+        catalog = self.controller.AudioManager.Catalog
+
+        def bind():
+            # A key can only play one title, so this replaces anything it was bound to. An empty key just clears
+            # the title's keys.
+            for oldKey in catalog.HotkeysFor(title):
+                catalog.RemoveHotkey(oldKey)
+            if key:
+                catalog.SetHotkey(key, title, scope)
+
+        # After any rename of the title still on the worker. A key may have moved from another title, which the
+        # edit catches once it's done as every visible key button is updated.
+        self.edit(bind)
+
+    def showHotkeys(self):
+        """Update the text of every visible hot key button"""
+        for rowWidgets, rowTitle in zip(self.Rows, self.RowTitles):
+            if rowTitle is not None:
+                rowWidgets[5].configure(text=self.hotkeyText(rowTitle))
+
+    def rowColour(self, title):
+        """The background of a row's title, highlighted when selected"""
+        return "#8ab4f8" if title in self.Selected else self.labelColour
+
+    def setSelection(self, titles, anchor=None):
+        """Select the given titles and update the rows and the bulk actions to match"""
+        self.Selected = titles
+        if anchor is not None or not titles:
+            self.Anchor = anchor
+
+        for rowWidgets, rowTitle in zip(self.Rows, self.RowTitles):
+            if rowTitle is not None:
+                rowWidgets[0].configure(bg=self.rowColour(rowTitle))
+
+        if titles:
+            self.selectionText.configure(text="{0} selected".format(len(titles)))
+            self.selectionPanel.pack(side="bottom", fill="x")
+        else:
+            self.selectionPanel.pack_forget()
+
+    def pressRow(self, row):
+        """Mouse down on a title, selects it alone unless it is part of the selection, which may be about to be
+        dragged"""
+        title = self.RowTitles[row]
+        self.pressed = (row, title, title in self.Selected)
+        if title not in self.Selected:
+            self.setSelection({title}, anchor=title)
+
+    def releaseRow(self, row, event):
+        """Mouse up after pressing on a title, moves the selection if it was dragged onto a different row"""
+        if self.pressed is None:
+            return
+        pressedRow, title, wasSelected = self.pressed
+        self.pressed = None
+
+        target = self.rowOf.get(self.winfo_containing(event.x_root, event.y_root))
+        if target is not None and target != pressedRow and self.RowTitles[target] is not None:
+            # The dragged titles take the place of the title they were dropped on
+            index = self.Offset + target
+            self.edit(self.controller.AudioManager.MoveEntries, set(self.Selected), index)
+        elif wasSelected and len(self.Selected) > 1:
+            # A plain click on part of the selection, without dragging, selects just that
+            self.setSelection({title}, anchor=title)
+
+    def selectRange(self, row):
+        """Select every title from the last one clicked to this one"""
+        title = self.RowTitles[row]
+        # Looked up in one go, the worker could otherwise move or remove either title in between
+        titles = self.controller.AudioManager.TitlesBetween(self.Anchor, title) if self.Anchor is not None else []
+        if titles:
+            self.setSelection(set(titles), anchor=self.Anchor)
+        else:
+            self.setSelection({title}, anchor=title)
+
+    def toggleRow(self, row):
+        """Add a title to the selection or take it out"""
+        title = self.RowTitles[row]
+        self.setSelection(self.Selected ^ {title}, anchor=title)
+
+    def selectedTitles(self):
+        """The selected titles in list order"""
+        return self.controller.AudioManager.OrderOfTitles(self.Selected)
+
+    def DeleteSelected(self):
+        """Delete every selected entry at once, after confirming"""
+        count = len(self.Selected)
+        result = tkAskYesNo("Delete {0} entries".format(count),
+                            "Are you sure you want to delete {0} entries?\nThis can not be undone.".format(count),
+                            icon="warning")
+        if not result:
+            tkShowInfo("Update!", "Nothing has been deleted!")
+            return
+
+        self.edit(self.controller.AudioManager.DeleteEntries, set(self.Selected), removing=self.Selected)
+        self.setSelection(set())
+
+    def renameSelected(self):
+        """Rename every selected entry from a pattern"""
+        self.controller.update()
+        inp = widgets.GetInput(self.controller, font=FONTS["l"],
+                               question="New names, {title} is the current name and {n} counts up: ")
+        self.controller.wait_window(inp.top)
+        if not inp.Data:
+            return
+
+        titles = self.selectedTitles()
+        try:
+            names = PatternNames(titles, inp.Data)
+        except ValueError as e:
+            tkShowInfo("Update!", "Nothing has been renamed, {0}.".format(e))
+            return
+
+        def failed(error):
+            self.setSelection(set(titles))
+            tkShowInfo("Update!", "Nothing has been renamed, {0}.".format(error))
+
+        self.setSelection(set(names))
+        self.edit(self.controller.AudioManager.RenameEntries, titles, inp.Data, renaming=dict(zip(titles, names)),
+                  failed=failed)
+
+    def moveSelected(self):
+        """Move every selected entry to a position typed in by the user"""
+        total = self.total()
+        self.controller.update()
+        inp = widgets.GetInput(self.controller, question="Move to position (1-{0}): ".format(total),
+                               font=FONTS["l"])
+        self.controller.wait_window(inp.top)
+        if not inp.Data:
+            return
+
+        try:
+            position = int(inp.Data)
+        except ValueError:
+            tkShowInfo("Update!", "{0} is not a position.".format(inp.Data))
+            return
+
+        audioManager = self.controller.AudioManager
+        titles = self.selectedTitles()
+        if not titles:
+            return
+
+        def move():
+            audioManager.MoveEntries(titles, position - 1)
+            # Found on the worker too, so it is where they went rather than where a later edit put them
+            return audioManager.IndexOfTitle(titles[0])
+
+        # Show where they went
+        self.edit(move, then=self.scrollTo)
+
+    def copySelected(self):
+        """Add every selected entry to another board, the audio files are shared rather than copied"""
+        audioManager = self.controller.AudioManager
+        others = [name for name in audioManager.Boards.Names() if name != audioManager.Board]
+        if not others:
+            tkShowInfo("Update!", "There are no other boards, make one from the board menu first.")
+            return
+
+        self.controller.update()
+        inp = widgets.GetInput(self.controller, question="Copy to board ({0}): ".format(", ".join(others)),
+                               font=FONTS["l"])
+        self.controller.wait_window(inp.top)
+        if not inp.Data:
+            return
+
+        name = inp.Data
+        self.controller.RunOnWorker(
+            audioManager.CopyToBoard, self.selectedTitles(), name,
+            then=lambda titles: tkShowInfo("Update!", "{0} entries copied to {1}.".format(len(titles), name)),
+            failed=lambda e: tkShowInfo("Update!", "There is no board called {0}.".format(name)
+                                        if isinstance(e, KeyError) else "Nothing has been copied, {0}.".format(e)))
 
     def MoveElementUp (self, title):
         """Move element up button press event"""
-        self.controller.AudioManager.MoveEntryUp(title)
-        self.PageUpdate()
+        self.edit(self.controller.AudioManager.MoveEntryUp, title)
 
     def MoveElementDown (self, title):
         """Move the element with the given title down event"""
-        self.controller.AudioManager.MoveEntryDown(title)
-        self.PageUpdate()
+        self.edit(self.controller.AudioManager.MoveEntryDown, title)
 
     def DeleteAllElements (self):
         """Remove all elements after confirming the user wants too."""
@@ -583,23 +1105,55 @@ class AddRemoveAudio (tk.Frame):
                             "Are you sure you want to delete all elements?\nThis can NOT be undone.", icon="warning")
 
         if result:  # Run the delete function if user confirms
-            self.controller.AudioManager.DeleteAllEntries()
+            self.edit(self.controller.AudioManager.DeleteAllEntries, removing=self.controller.AudioManager.Snapshot())
         else:  # Tell the user nothing has happened if the cancel
             tkShowInfo("Update!", "Nothing has been deleted!")
 
         # Update the page
         self.PageUpdate()
+        self.setSelection(set())
 
     def AddElement(self):
         """Add a new audio entry"""
-        # Get the file(s) from the user.
-        file = tkFileDialog.askopenfilenames(title="Select audio file(s)", filetypes=(("Wav files", "*.wav"),))
+        if self.importJob is not None:
+            tkShowInfo("Update!", "Wait for the current import to finish first.")
+            return
 
-        # Add the file(s)
-        self.controller.AudioManager.AddEntry(file)
-
-        # Re-load the buttons
-        self.loadButtons(self.PageNumber)
+        # Get the file(s) from the user.
+        audioTypes = " ".join("*" + ext for ext in importer.NATIVE_EXTENSIONS + importer.FFMPEG_EXTENSIONS)
+        file = tkFileDialog.askopenfilenames(title="Select audio file(s)",
+                                             filetypes=(("Audio files", audioTypes), ("Wav files", "*.wav")))
+        if not file:
+            return
+
+        # Import the file(s) in the background and keep an eye on how it's going
+        self.importJob = self.controller.AudioManager.ImportFiles(file)
+        self.importText.pack(side="left")
+        self.cancelImport.pack(side="left")
+        self.pollImport()
+
+    def pollImport(self):
+        """Update the import progress, then re-load the buttons once it's finished"""
+        job = self.importJob
+        self.importText.configure(text="Importing {0}/{1}".format(job.Done, job.Total))
+        if not job.Finished.is_set():
+            self.after(100, self.pollImport)
+            return
+
+        self.importJob = None
+        self.importText.pack_forget()
+        self.cancelImport.pack_forget()
+
+        # Re-load the buttons and level the new clips
+        self.Refresh()
+        self.controller.AudioManager.MeasureLoudness()
+
+        # Let the user know about anything that didn't make it in
+        if job.Errors:
+            errors = "\n".join("{0}: {1}".format(path.split("/")[-1], reason) for path, reason in job.Errors[:10])
+            if len(job.Errors) > 10:
+                errors += "\n...and {0} more".format(len(job.Errors) - 10)
+            tkShowInfo("Update!", "{0} file(s) could not be added:\n{1}".format(len(job.Errors), errors))
 
     def DeleteElement(self, elementName):
         """Deletes an audio entry from the content file."""
@@ -609,13 +1163,10 @@ class AddRemoveAudio (tk.Frame):
                             "Are you sure you want to delete {0}?\nThis can not be undone.".format(elementName), icon="warning")
         # If the user confirms they are sure, run the cancel, otherwise notify them that nothing was done.
         if result:
-            self.controller.AudioManager.DeleteEntry(elementName)
+            self.edit(self.controller.AudioManager.DeleteEntry, elementName, removing={elementName})
         else:
             tkShowInfo("Update!", "{0} has NOT been deleted!".format(elementName))
 
-        # Re-load the buttons
-        self.PageUpdate()
-
     def renameElement(self, elementName):
         """Get the new name of an item and change it"""
 
@@ -627,34 +1178,25 @@ class AddRemoveAudio (tk.Frame):
         # If there is no input data, then user cancelled. If not run the rename function in AudioManager
         if inp.Data is None:
             return None
-        else:
-            self.controller.AudioManager.RenameEntry(elementName, inp.Data)
+        name = inp.Data
 
-        # Re-load buttons
-        self.loadButtons(self.PageNumber)
+        def failed(error):
+            if isinstance(error, ValueError):
+                tkShowInfo("Update!", "There is already an audio file called {0}.".format(name))
+            else:
+                tkShowInfo("Update!", "Nothing has been renamed, {0}.".format(error))
+
+        self.edit(self.controller.AudioManager.RenameEntry, elementName, name, renaming={elementName: name},
+                  failed=failed)
 
     def nextPage(self):
         """Move to the next page if there are elements there."""
-        # Update the buttons with the new page number, if it is successful, update the page number
-        if self.loadButtons(self.PageNumber+1):
-            self.PageNumber += 1
-        else:
-            # If you couldn't update, re-load the current page
-            self.loadButtons(self.PageNumber)
-
-        # Update the page number text value
-        self.PageText.configure(text="Page: " + str(self.PageNumber+1))
+        if self.Offset + self.maxPerPage < self.total():
+            self.scrollTo(self.Offset + self.maxPerPage)
 
     def prevPage(self):
-        """Move to the previous page if not already on the 1st (0th) page"""
-        # If the pagew number is greater than the minimum (0), then update it to be lower
-        if self.PageNumber > 0:
-            self.PageNumber -= 1
-            # Re-load the buttons
-            self.loadButtons(self.PageNumber)
-
-        # Update the page number text value
-        self.PageText.configure(text="Page: " + str(self.PageNumber+1))
+        """Move to the previous page, scrollTo stops at the 1st (0th) page"""
+        self.scrollTo(self.Offset - self.maxPerPage)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,287 @@
+import math
+import struct
+import warnings
+from array import array
+
+with warnings.catch_warnings():
+    # audioop is deprecated in newer versions of python and gone from 3.13, where the audioop-lts package provides
+    # it (see requirements.txt), but it is still the quickest way to do sample maths without numpy.
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError as e:
+        raise ImportError("the audio engine needs audioop, on python 3.13 and later install it with "
+                          "'pip install audioop-lts'") from e
+
+numpy = False  # Optional, only speeds up float conversion. Imported when first needed as it is slow to load.
+
+
+# The native format of the audio engine, every clip is converted to this when it is decoded.
+RATE = 44100
+CHANNELS = 2
+WIDTH = 2  # Bytes per sample, 16 bit signed.
+FRAME_BYTES = CHANNELS * WIDTH
+
+# Loudness measurement, roughly EBU R128 without the K-weighting filter
+LOUDNESS_BLOCK = RATE * 4 // 10  # Frames in each 400ms block
+ABSOLUTE_GATE = -70.0  # dB, blocks quieter than this are ignored
+RELATIVE_GATE = -10.0  # dB, then so are blocks this far below the average of the rest
+PEAK_TAPS = 8  # Samples either side used to work out the values between samples
+
+WIDE_HEADROOM = 256  # How far below full scale widened audio is kept, room for that many full scale voices
+RAMP_STEP = 16  # Frames per step of a gain ramp worked out without numpy
+
+# WAVE format tags
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WaveFormat:
+    """The format and location of the sample data inside a wave file"""
+    def __init__ (self, formatTag, channels, rate, width, dataStart, dataEnd):
+        self.FormatTag = formatTag
+        self.Channels = channels
+        self.Rate = rate
+        self.Width = width
+        self.DataStart = dataStart  # Byte offset of the first sample
+        self.DataEnd = dataEnd  # Byte offset just after the last whole frame
+
+    def IsNative(self):
+        """True if the samples can be played without any conversion"""
+        return (self.FormatTag == WAVE_FORMAT_PCM and self.Channels == CHANNELS
+                and self.Rate == RATE and self.Width == WIDTH)
+
+
+def ReadWaveFormat(buffer):
+    """Parse the RIFF header of a wave file held in buffer (bytes, mmap or memoryview) and return a WaveFormat"""
+    if len(buffer) < 12 or buffer[0:4] != b"RIFF" or buffer[8:12] != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+
+    fmt = None
+    pos = 12
+    # Walk the chunks until both the format and data chunks have been found
+    while pos + 8 <= len(buffer):
+        chunkId = bytes(buffer[pos:pos+4])
+        chunkSize = struct.unpack("<I", buffer[pos+4:pos+8])[0]
+        body = pos + 8
+
+        if chunkId == b"fmt ":
+            formatTag, channels, rate, _byteRate, _blockAlign, bits = struct.unpack("<HHIIHH", buffer[body:body+16])
+            if formatTag == WAVE_FORMAT_EXTENSIBLE and chunkSize >= 40:
+                # The real format tag is the first two bytes of the sub format GUID
+                formatTag = struct.unpack("<H", buffer[body+24:body+26])[0]
+            fmt = (formatTag, channels, rate, (bits + 7) // 8)
+
+        elif chunkId == b"data":
+            if fmt is None:
+                raise ValueError("data chunk found before the fmt chunk")
+            formatTag, channels, rate, width = fmt
+            if channels < 1 or width < 1:
+                raise ValueError("invalid wave format")
+            end = min(body + chunkSize, len(buffer))
+            # Only whole frames are used
+            end -= (end - body) % (channels * width)
+            return WaveFormat(formatTag, channels, rate, width, body, end)
+
+        # Chunks are padded to an even length
+        pos = body + chunkSize + (chunkSize & 1)
+
+    raise ValueError("no data chunk found")
+
+
+def Numpy():
+    """The numpy module, or None if it isn't installed"""
+    global numpy
+    if numpy is False:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy = module
+    return numpy
+
+
+def FloatToInt(data, width):
+    """Convert 32 or 64 bit float samples to 16 bit signed samples"""
+    typecode = "f" if width == 4 else "d"
+    numpy = Numpy()
+    if numpy is not None:
+        samples = numpy.frombuffer(data, dtype="<f4" if width == 4 else "<f8")
+        return (numpy.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+    samples = array(typecode)
+    samples.frombytes(bytes(data))
+    out = array("h", [int((-1.0 if s < -1.0 else 1.0 if s > 1.0 else s) * 32767.0) for s in samples])
+    return out.tobytes()
+
+
+def ToNative(data, fmt, state=None):
+    """Convert raw sample data in the given WaveFormat into the engine's native format.
+
+    Returns the converted data and the resampler state, so long files can be converted in pieces."""
+    width = fmt.Width
+    if fmt.FormatTag == WAVE_FORMAT_IEEE_FLOAT:
+        if width not in (4, 8):
+            raise ValueError("unsupported float width: " + str(width))
+        data = FloatToInt(data, width)
+        width = WIDTH
+    elif fmt.FormatTag == WAVE_FORMAT_PCM:
+        if width == 1:
+            # 8 bit wave files are unsigned
+            data = audioop.bias(data, 1, -128)
+        if width != WIDTH:
+            data = audioop.lin2lin(data, width, WIDTH)
+    else:
+        raise ValueError("unsupported wave format: " + hex(fmt.FormatTag))
+
+    # Channel conversion
+    if fmt.Channels == 1:
+        data = audioop.tostereo(data, WIDTH, 1, 1)
+    elif fmt.Channels != CHANNELS:
+        raise ValueError("unsupported channel count: " + str(fmt.Channels))
+
+    # Sample rate conversion
+    if fmt.Rate != RATE:
+        data, state = audioop.ratecv(data, WIDTH, CHANNELS, fmt.Rate, RATE, state)
+
+    return data, state
+
+
+def Mix(a, b):
+    """Add two blocks of native audio together, clipping rather than wrapping on overflow"""
+    return audioop.add(a, b, WIDTH)
+
+
+def Scale(data, gain):
+    """Multiply a block of native audio by gain"""
+    return audioop.mul(data, WIDTH, gain)
+
+
+def Ramp(data, start, end):
+    """Multiply a block of native audio by a gain going in a straight line from start to end across it, for fades"""
+    frames = len(data) // FRAME_BYTES
+    if not frames:
+        return b""
+    if start == end:
+        return Scale(data, start)
+    numpy = Numpy()
+    if numpy is not None:
+        samples = numpy.frombuffer(data, dtype="<i2").reshape(frames, CHANNELS)
+        gains = numpy.linspace(start, end, frames, endpoint=False, dtype="float32")[:, None]
+        return numpy.clip(samples * gains, -32768, 32767).astype("<i2").tobytes()
+
+    # Steps short enough not to be heard, each at the gain half way through it
+    parts = []
+    step = (end - start) / frames
+    for first in range(0, frames, RAMP_STEP):
+        middle = first + min(RAMP_STEP, frames - first) / 2
+        parts.append(audioop.mul(data[first*FRAME_BYTES:(first+RAMP_STEP)*FRAME_BYTES], WIDTH, start + step * middle))
+    return b"".join(parts)
+
+
+def Envelope(data, points):
+    """The lowest and highest sample in each of points equal slices of some native audio.
+
+    Returns 2 * points signed bytes, the min then max of each slice scaled down to 8 bits."""
+    frames = len(data) // FRAME_BYTES
+    if frames == 0:
+        return bytes(2 * points)
+    starts = [i * frames // points for i in range(points)]
+
+    numpy = Numpy()
+    if numpy is not None:
+        # One pass over the samples for all the slices at once
+        samples = numpy.frombuffer(data, dtype="<i2", count=frames * CHANNELS)
+        offsets = numpy.array(starts) * CHANNELS
+        envelope = numpy.empty(2 * points, dtype="<i2")
+        envelope[0::2] = numpy.minimum.reduceat(samples, offsets)
+        envelope[1::2] = numpy.maximum.reduceat(samples, offsets)
+        return (envelope >> 8).astype("i1").tobytes()
+
+    envelope = array("b")
+    for start, stop in zip(starts, starts[1:] + [frames]):
+        stop = max(stop, start + 1)
+        low, high = audioop.minmax(data[start * FRAME_BYTES:stop * FRAME_BYTES], WIDTH)
+        envelope.append(low >> 8)
+        envelope.append(high >> 8)
+    return envelope.tobytes()
+
+
+def _OversampleFilters(numpy):
+    """Windowed sinc filters giving the values 1/4, 2/4 and 3/4 of the way between samples"""
+    taps = numpy.arange(-PEAK_TAPS + 1, PEAK_TAPS + 1)
+    window = numpy.hanning(2 * PEAK_TAPS + 2)[1:-1]
+    return [numpy.sinc(taps - phase / 4) * window for phase in (1, 2, 3)]
+
+
+def Loudness(data):
+    """The loudness and true peak of some native audio, both in dB relative to full scale (None if silent).
+
+    Loudness is the mean power of the 400ms blocks that pass an absolute and then a relative gate, so quiet gaps don't
+    drag it down. With numpy the peak is measured on a 4x oversampled copy to catch peaks falling between samples,
+    without it the sample peak is used."""
+    frames = len(data) // FRAME_BYTES
+    blockBytes = LOUDNESS_BLOCK * FRAME_BYTES
+    powers = []  # Mean square of each block, full scale is 1
+    peak = 0.0  # Full scale is 1
+
+    numpy = Numpy()
+    if numpy is not None:
+        filters = _OversampleFilters(numpy)
+        chunkBytes = blockBytes * 64  # Keeps the float copies to a few MB however long the clip is
+        overlap = None  # The end of the previous chunk, so the filters see across the joins
+        for start in range(0, frames * FRAME_BYTES, chunkBytes):
+            chunk = data[start:min(start + chunkBytes, frames * FRAME_BYTES)]
+            samples = numpy.frombuffer(chunk, dtype="<i2").astype(numpy.float64) / 32768.0
+            squares = samples * samples
+            whole = len(squares) // (LOUDNESS_BLOCK * CHANNELS) * LOUDNESS_BLOCK * CHANNELS
+            powers.extend(squares[:whole].reshape(-1, LOUDNESS_BLOCK * CHANNELS).mean(axis=1).tolist())
+            if whole < len(squares):
+                powers.append(float(squares[whole:].mean()))
+
+            channels = samples.reshape(-1, CHANNELS).T
+            if overlap is not None:
+                channels = numpy.concatenate((overlap, channels), axis=1)
+            overlap = channels[:, -2 * PEAK_TAPS:]
+            peak = max(peak, float(numpy.abs(samples).max()))
+            for channel in channels:
+                if len(channel) >= 2 * PEAK_TAPS:
+                    for taps in filters:
+                        peak = max(peak, float(numpy.abs(numpy.convolve(channel, taps, "valid")).max()))
+    else:
+        for start in range(0, frames * FRAME_BYTES, blockBytes):
+            block = data[start:min(start + blockBytes, frames * FRAME_BYTES)]
+            powers.append((audioop.rms(block, WIDTH) / 32768.0) ** 2)
+            peak = max(peak, audioop.max(block, WIDTH) / 32768.0)
+
+    peakDb = 20 * math.log10(peak) if peak > 0 else None
+
+    powers = [power for power in powers if power > 10 ** (ABSOLUTE_GATE / 10)]
+    if not powers:
+        return None, peakDb
+    threshold = sum(powers) / len(powers) * 10 ** (RELATIVE_GATE / 10)
+    gated = [power for power in powers if power > threshold]
+    return 10 * math.log10(sum(gated) / len(gated)), peakDb
+
+
+def Widen(data, gain=1.0):
+    """Native audio as 32 bit samples multiplied by gain, so several loud voices can be added up without clipping.
+
+    The samples are kept WIDE_HEADROOM times below the top of the 32 bit range."""
+    return audioop.mul(audioop.lin2lin(data, WIDTH, 4), 4, gain / WIDE_HEADROOM)
+
+
+def MixWide(a, b):
+    """Add two blocks of widened audio together"""
+    return audioop.add(a, b, 4)
+
+
+def PeakWide(data):
+    """The largest absolute sample of some widened audio, full scale is 1"""
+    return audioop.max(data, 4) * WIDE_HEADROOM / 2147483648.0
+
+
+def Narrow(data, gain):
+    """Scale widened audio by gain and bring it back to the native format"""
+    return audioop.lin2lin(audioop.mul(data, 4, gain * WIDE_HEADROOM), 4, WIDTH)
@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+from collections import deque
+
+import audioengine
+import pcm
+
+
+PEAK_POINTS = 256  # Min/max pairs kept per clip, enough for a thumbnail a few hundred pixels wide
+BATCH = 32  # Clips worked out between writes to the cache
+
+SCHEMA = """
+-- The hashes of the files used to be kept here, they are in the shared hashindex.HashIndex now
+DROP TABLE IF EXISTS files;
+CREATE TABLE IF NOT EXISTS peaks (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+"""
+
+
+class PeakStore:
+    """Works out the waveform envelope of clips on a background thread and keeps them in a cache on disk.
+
+    Envelopes are stored by the hash of the file they came from, taken from hashes (a hashindex.HashIndex of the
+    folder) so an unchanged file is never read again. Get never blocks, if an envelope isn't ready it is queued (ahead
+    of anything queued by Queue) and Revision goes up once it is."""
+    def __init__ (self, path, folder, hashes, points=PEAK_POINTS):
+        self.Path = path
+        self.Folder = folder
+        self.Hashes = hashes
+        self.Points = points
+
+        self.Peaks = {}  # Filename | Envelope, only the ones worked out or read back this run
+        self.Revision = 0  # Goes up whenever some envelopes are added to Peaks
+
+        self._Queue = deque()  # Filenames waiting to be worked out, most urgent on the left
+        self._Queued = set()
+        self._Failed = set()  # Filenames that couldn't be read, not tried again this run
+        self._Wake = threading.Condition()
+        self._Thread = None
+        self._Running = False
+
+    def Get(self, filename):
+        """The envelope of a file, or None if it isn't ready yet"""
+        peaks = self.Peaks.get(filename)
+        if peaks is None:
+            self.Queue((filename,), urgent=True)
+        return peaks
+
+    def Queue(self, filenames, urgent=False):
+        """Have the envelopes of some files worked out in the background"""
+        with self._Wake:
+            if urgent:
+                for filename in filenames:
+                    if filename not in self.Peaks and filename not in self._Failed:
+                        self._Queue.appendleft(filename)
+                        self._Queued.add(filename)
+            else:
+                # Whole catalogs get queued at once from the UI thread, so this is kept to set operations
+                new = set(filenames) - self._Queued - self.Peaks.keys() - self._Failed
+                self._Queue.extend(filename for filename in filenames if filename in new)
+                self._Queued |= new
+            self._Wake.notify()
+
+            if self._Thread is None:
+                self._Running = True
+                self._Thread = threading.Thread(target=self._Run, name="PeakStore", daemon=True)
+                self._Thread.start()
+
+    def Pending(self):
+        """The number of queued files that haven't been picked up by the background thread yet"""
+        return len(self._Queued)
+
+    def Close(self):
+        """Stop the background thread once it has finished its current batch"""
+        with self._Wake:
+            self._Running = False
+            self._Wake.notify()
+        if self._Thread is not None:
+            self._Thread.join()
+            self._Thread = None
+
+    def _NextBatch(self):
+        """Wait for some filenames to work on, returns an empty list once closed"""
+        with self._Wake:
+            while self._Running and not self._Queue:
+                self._Wake.wait()
+            if not self._Running:
+                return []
+            batch = []
+            while self._Queue and len(batch) < BATCH:
+                filename = self._Queue.popleft()
+                if filename in self._Queued and filename not in self.Peaks:
+                    # Urgent requests can leave a second copy further back, the set says if it's still wanted
+                    self._Queued.discard(filename)
+                    batch.append(filename)
+            return batch
+
+    def _Run(self):
+        """The background thread, the database is only ever touched from here"""
+        db = sqlite3.connect(self.Path)
+        db.executescript(SCHEMA)
+
+        try:
+            while True:
+                batch = self._NextBatch()
+                if not batch:
+                    break
+
+                found = {}
+                with db:
+                    for filename in batch:
+                        try:
+                            found[filename] = self._Envelope(db, filename)
+                        except (OSError, ValueError) as e:
+                            # Missing or unreadable, the button just goes without
+                            self._Failed.add(filename)
+                            print("Could not read the waveform of {0}: {1}".format(filename, e))
+
+                self.Peaks.update(found)
+                self.Revision += 1
+        finally:
+            db.close()
+
+    def _Envelope(self, db, filename):
+        """Look up or work out the envelope of a single file"""
+        path = self.Folder + filename
+        fileHash = self.Hashes.Hash(filename)
+
+        row = db.execute("SELECT data FROM peaks WHERE hash=?", (fileHash,)).fetchone()
+        if row is not None and len(row[0]) == 2 * self.Points:
+            return row[0]
+
+        clip = audioengine.LoadClip(path)
+        peaks = pcm.Envelope(clip.Data, self.Points)
+        db.execute("INSERT OR REPLACE INTO peaks (hash, data) VALUES (?, ?)", (fileHash, peaks))
+        return peaks
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+
+IDLE = 0.25  # Seconds after a sound is triggered before another clip is loaded, so a burst of triggers has the CPU
+RECORD_INTERVAL = 5.0  # Seconds between writes of the play counts to the catalog
+FAVOURITES = 50  # The board's most played clips loaded after the pages around the one being shown
+HALF_LIFE = 14 * 24 * 3600.0  # Seconds after which a play counts for half as much when picking the favourites
+NICENESS = 10  # Added to the thread's scheduling priority where the OS lets a single thread be lowered
+
+
+def Favourites(usage, count, now=None):
+    """The titles of up to count of the (title, plays, last played) rows in usage, those played most often and most
+    recently first"""
+    now = time.time() if now is None else now
+    score = lambda row: row[1] * 0.5 ** (max(0.0, now - (row[2] or 0.0)) / HALF_LIFE)
+    return [title for title, _plays, _played in sorted(usage, key=score, reverse=True)[:count]]
+
+
+class Prefetcher:
+    """Loads the clips likely to be played next into the clip cache on a low priority background thread, and keeps
+    count of how often and how recently each entry is played.
+
+    Want is told the page being shown, the clips on it are loaded first, then those on the pages either side and then
+    the board's favourites. Nothing is loaded within IDLE of a trigger and clips only go into the space the cache has
+    left (see ClipCache.Prefetch), so prefetching never holds up or pushes out a clip that is being played.
+
+    Played is called on the triggering thread and only appends to a deque, the counts are written to the catalog by
+    the background thread every RECORD_INTERVAL."""
+    def __init__ (self, manager, favourites=FAVOURITES):
+        self.Manager = manager
+        self.Favourites = favourites
+
+        self.Plays = deque()  # (catalog, title, time.time()) of each trigger not yet written to its catalog
+        self.LastTrigger = 0.0  # time.monotonic() of the last trigger
+
+        self._Asked = None  # (catalog, skip, count, results) of the last Want the thread hasn't picked up
+        self._Wake = threading.Condition()
+        self._Recording = threading.Lock()  # Held while plays are written, so a board isn't closed part way
+        self._Running = True
+        self._Thread = threading.Thread(target=self._Run, name="Prefetcher", daemon=True)
+        self._Thread.start()
+
+    def Played(self, catalog, title):
+        """Note that a title has just been triggered, call straight after starting it"""
+        self.LastTrigger = time.monotonic()
+        self.Plays.append((catalog, title, time.time()))
+
+    def Want(self, catalog, skip, count, results=None):
+        """Load the clips of the page of count titles starting at skip and of the pages either side, dropping
+        whatever was asked for before. The pages are of results, a list of titles, if it is given."""
+        with self._Wake:
+            self._Asked = (catalog, skip, count, results)
+            self._Wake.notify()
+
+    def Record(self):
+        """Write the plays noted so far to their catalogs, call before closing a board so none of its plays are lost"""
+        with self._Recording:
+            counts = {}  # Catalog | Title | [times played, last played]
+            while True:
+                try:
+                    catalog, title, played = self.Plays.popleft()
+                except IndexError:
+                    break
+                count = counts.setdefault(catalog, {}).setdefault(title, [0, played])
+                count[0] += 1
+                count[1] = played
+            for catalog, titles in counts.items():
+                catalog.RecordPlays((title, count, played) for title, (count, played) in titles.items())
+
+    def Close(self):
+        """Stop loading clips and write the last of the plays"""
+        with self._Wake:
+            self._Running = False
+            self._Wake.notify()
+        self._Thread.join()
+        self.Record()
+
+    def _Titles(self, catalog, skip, count, results):
+        """The titles to load for a Want, most likely to be played first"""
+        if results is not None:
+            page = lambda start: results[start:start + count]
+        else:
+            page = lambda start: catalog.Page(start, count)
+        titles = page(skip) + page(skip + count) + (page(skip - count) if skip >= count else [])
+        if self.Favourites:
+            try:
+                # Fetched a few times over, as the most recently played of them can beat the most played
+                titles += Favourites(catalog.Usage(self.Favourites * 4), self.Favourites)
+            except sqlite3.Error:
+                pass  # Closed since it was asked for
+        return deque(dict.fromkeys(titles))
+
+    def _Run(self):
+        """The prefetch thread"""
+        if sys.platform.startswith("linux"):
+            try:
+                # Each thread has its own priority on Linux, elsewhere this would lower the whole process
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), NICENESS)
+            except (AttributeError, OSError):
+                pass
+
+        catalog = None
+        waiting = deque()  # Titles still to load
+        recorded = time.monotonic()
+        while True:
+            with self._Wake:
+                if self._Running and self._Asked is None:
+                    # Stay out of the way of any trigger, or sleep until there is something to do
+                    quiet = IDLE - (time.monotonic() - self.LastTrigger)
+                    if waiting and quiet > 0:
+                        self._Wake.wait(quiet)
+                    elif not waiting:
+                        self._Wake.wait(RECORD_INTERVAL)
+                if not self._Running:
+                    return
+                asked, self._Asked = self._Asked, None
+
+            try:
+                now = time.monotonic()
+                if now - recorded >= RECORD_INTERVAL:
+                    recorded = now
+                    self.Record()
+                if asked is not None:
+                    catalog = asked[0]
+                    waiting = self._Titles(*asked)
+                    continue
+                if not waiting or now - self.LastTrigger < IDLE:
+                    continue
+
+                filename = catalog.FilenameOf(waiting.popleft())
+                if filename is None:
+                    continue
+                try:
+                    if not self.Manager.Cache.Prefetch(filename):
+                        waiting.clear()  # The cache is full, anything else would have to push a played clip out
+                except (OSError, ValueError) as e:
+                    print("Could not prefetch {0}: {1}".format(filename, e))
+            except sqlite3.Error as e:
+                # Only those plays or that page are lost, the thread carries on with the next Want
+                print("Could not record plays or prefetch: {0}".format(e))
+                waiting.clear()
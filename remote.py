@@ -0,0 +1,382 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+
+HOST = "127.0.0.1"  # Only this machine, unless told otherwise
+PORT = 8765
+MAX_BODY = 64 * 1024  # Bytes, larger HTTP bodies and WebSocket messages are refused
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# WebSocket opcodes
+CONTINUATION = 0x0
+TEXT = 0x1
+BINARY = 0x2
+CLOSE = 0x8
+PING = 0x9
+PONG = 0xA
+
+# Commands run straight away on the loop, they only hand work to the engine or the Tk thread
+INLINE = ("stop", "loop", "page")
+# Commands run one at a time on the server's own playback lane, never behind a catalog edit on the worker
+TRIGGERS = ("play", "queue", "repeat", "status", "boards")
+
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 413: "Payload Too Large"}
+
+
+def Address(text):
+    """The (host, port) of a "host:port" or "port" string"""
+    host, _, port = text.rpartition(":")
+    return host or HOST, int(port)
+
+
+def Flag(value):
+    """A true or false value from JSON or a query string"""
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def Unmask(data, mask):
+    """Undo the masking every WebSocket client applies to what it sends, a whole message at a time"""
+    size = len(data)
+    key = (mask * (size // 4 + 1))[:size]
+    return (int.from_bytes(data, "little") ^ int.from_bytes(key, "little")).to_bytes(size, "little")
+
+
+def Frame(opcode, payload):
+    """A single unmasked WebSocket frame, as sent by servers"""
+    size = len(payload)
+    if size < 126:
+        header = struct.pack("!BB", 0x80 | opcode, size)
+    elif size < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, size)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, size)
+    return header + payload
+
+
+class RemoteServer:
+    """Lets stream decks, scripts and other machines control the board over HTTP and WebSockets.
+
+    The server runs on its own thread with its own asyncio loop. Stop goes straight to the audio engine's command
+    queue and commands that change the window are put on Commands for the Tk thread to run with Drain, so neither is
+    ever kept waiting. Play, queue, repeat and the status commands run in order on a playback lane of their own, so
+    loading a clip never holds up the loop and a trigger never waits behind a sync, delete or board switch on the
+    AudioManager's worker. Reading the catalog and searching run on the loop's default executor.
+
+    Every command is a JSON object with a "cmd" key. Over HTTP the path is the command and the query string and any
+    JSON body are its arguments, e.g. GET /play?title=Airhorn. Over a WebSocket at /ws each text message is one
+    command (or a list of them) and gets a reply, with the command's "id" if it had one."""
+    def __init__ (self, manager, host=HOST, port=PORT, token=None, loopState=None):
+        self.Manager = manager
+        self.Host = host
+        self.Port = port  # 0 picks a free port, the real one is filled in by Start
+        self.Token = token  # If set, every request has to give it
+        self.LoopState = loopState if loopState is not None else [False]  # Whether clips loop unless told otherwise
+
+        self.Commands = deque()  # (name, command) waiting for the Tk thread
+        self.Handled = 0  # Commands carried out
+
+        self._Loop = None
+        self._Server = None
+        self._Writers = set()  # One per open connection
+        self._Thread = None
+        self._Playback = None  # The lane TRIGGERS run on, made by Start
+        self._Ready = threading.Event()
+        self._Error = None
+
+    def Start(self):
+        """Start serving in the background, raises OSError if the address can't be used"""
+        self._Playback = ThreadPoolExecutor(max_workers=1, thread_name_prefix="RemotePlayback")
+        self._Thread = threading.Thread(target=self._Run, name="RemoteServer", daemon=True)
+        self._Thread.start()
+        self._Ready.wait()
+        if self._Error is not None:
+            self._Thread.join()
+            self._Thread = None
+            self._Playback.shutdown()
+            raise self._Error
+        return self
+
+    def Close(self):
+        """Stop serving and drop every connection"""
+        if self._Thread is None:
+            return
+        self._Loop.call_soon_threadsafe(self._Loop.stop)
+        self._Thread.join()
+        self._Thread = None
+        self._Playback.shutdown()
+
+    def Drain(self, handler):
+        """Run handler(name, command) for every command waiting for the UI, call from the Tk thread"""
+        while True:
+            try:
+                name, command = self.Commands.popleft()
+            except IndexError:
+                return
+            handler(name, command)
+
+    def Execute(self, command):
+        """Carry out a single command and return the reply, see _Execute for the thread each one runs on"""
+        self.Handled += 1
+        manager = self.Manager
+        name = command.get("cmd")
+        try:
+            if name == "play":
+                title = command.get("title")
+                if title is None and "index" in command:
+                    if int(command["index"]) < 0:
+                        return {"ok": False, "error": "index can't be negative"}
+                    titles = manager.Catalog.Page(int(command["index"]), 1)
+                    title = titles[0] if titles else None
+                loop = Flag(command["loop"]) if "loop" in command else self.LoopState[0]
+                manager.PlaySoundByTitle(title, loop=loop)
+                return {"ok": True, "title": title}
+
+            if name == "stop":
+                manager.StopSound(float(command["fade"]) if "fade" in command else None)
+                return {"ok": True}
+
+            if name == "queue":
+                manager.QueueSoundByTitle(command.get("title"))
+                return {"ok": True, "title": command.get("title")}
+
+            if name == "repeat":
+                if "bpm" not in command:
+                    return {"ok": False, "error": "repeat needs a bpm"}
+                count = int(command["count"]) if "count" in command else None
+                manager.RepeatSoundByTitle(command.get("title"), float(command.get("bpm")),
+                                           beats=float(command.get("beats", 1.0)), count=count)
+                return {"ok": True, "title": command.get("title")}
+
+            if name in ("loop", "page"):
+                self.Commands.append((name, command))
+                return {"ok": True}
+
+            if name == "board":
+                if command.get("name") not in manager.Boards:
+                    return {"ok": False, "error": "no such board: {0}".format(command.get("name"))}
+                self.Commands.append((name, command))
+                return {"ok": True}
+
+            if name == "boards":
+                return {"ok": True, "boards": manager.Boards.Names(), "board": manager.Board}
+
+            if name == "catalog":
+                start = int(command.get("start", 0))
+                count = int(command.get("count", 100))
+                if start < 0 or count < 0:
+                    return {"ok": False, "error": "start and count can't be negative"}
+                return {"ok": True, "total": len(manager.Catalog), "start": start,
+                        "titles": manager.Catalog.Page(start, count)}
+
+            if name == "search":
+                limit = int(command.get("limit", 25))
+                if limit < 0:
+                    return {"ok": False, "error": "limit can't be negative"}
+                return {"ok": True, "titles": manager.Search(str(command.get("query", "")))[:limit]}
+
+            if name == "status":
+                return {"ok": True, "entries": len(manager.Catalog), "voices": manager.Engine.ActiveVoices(),
+                        "loop": self.LoopState[0], "board": manager.Board}
+
+        except KeyError as e:
+            return {"ok": False, "error": "no such title: {0}".format(e)}
+        except (OSError, ValueError, TypeError) as e:
+            return {"ok": False, "error": str(e)}
+
+        return {"ok": False, "error": "unknown command: {0}".format(name)}
+
+    async def _Execute(self, command):
+        """Execute a command on its lane and wait for its reply without holding up the loop"""
+        name = command.get("cmd")
+        if name in INLINE:
+            return self.Execute(command)
+        try:
+            return await self._Loop.run_in_executor(self._Playback if name in TRIGGERS else None, self.Execute, command)
+        except RuntimeError:
+            return {"ok": False, "error": "shutting down"}  # The lane has already stopped
+
+    def _Run(self):
+        """The server thread"""
+        loop = self._Loop = asyncio.new_event_loop()
+        try:
+            self._Server = loop.run_until_complete(asyncio.start_server(self._Client, self.Host, self.Port))
+        except OSError as e:
+            self._Error = e
+            self._Ready.set()
+            loop.close()
+            return
+        self.Port = self._Server.sockets[0].getsockname()[1]
+        self._Ready.set()
+
+        try:
+            loop.run_forever()
+        finally:
+            # Closing the connections ends each client's task as though the other end had gone
+            self._Server.close()
+            for writer in self._Writers:
+                writer.close()
+            tasks = asyncio.all_tasks(loop)
+            if tasks:
+                loop.run_until_complete(asyncio.wait(tasks, timeout=1.0))
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+
+    def _Allowed(self, headers, query):
+        """True if the request gave the token, or none is needed"""
+        if self.Token is None:
+            return True
+        given = query.get("token") or headers.get("authorization", "").partition("Bearer ")[2]
+        return hmac.compare_digest(given.encode(), self.Token.encode())
+
+    async def _Client(self, reader, writer):
+        """Serve HTTP requests on a connection until it closes or becomes a WebSocket"""
+        self._Writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    _method, target, _version = line.decode("latin-1").split()
+                except ValueError:
+                    self._Respond(writer, 400, {"ok": False, "error": "bad request line"}, close=True)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = headers.get("content-length") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    self._Respond(writer, 400, {"ok": False, "error": "bad Content-Length"}, close=True)
+                    break
+                length = int(length)
+                if length > MAX_BODY:
+                    self._Respond(writer, 413, {"ok": False, "error": "body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                url = urlsplit(target)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                if not self._Allowed(headers, query):
+                    self._Respond(writer, 401, {"ok": False, "error": "a token is needed"})
+                elif url.path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                    await self._WebSocket(reader, writer, headers)
+                    break
+                else:
+                    status, reply = await self._Http(url.path, query, body)
+                    self._Respond(writer, status, reply)
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Went away or sent something we can't make sense of, either way the connection is done
+        finally:
+            self._Writers.discard(writer)
+            writer.close()
+
+    async def _Http(self, path, query, body):
+        """The (status, reply) for an HTTP request"""
+        command = dict(query)
+        if body:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                return 400, {"ok": False, "error": "body is not JSON"}
+            if not isinstance(data, dict):
+                return 400, {"ok": False, "error": "body must be a JSON object"}
+            command.update(data)
+        command["cmd"] = path.strip("/")
+
+        reply = await self._Execute(command)
+        if reply["ok"]:
+            return 200, reply
+        return 404 if reply["error"].startswith(("unknown", "no such")) else 400, reply
+
+    def _Respond(self, writer, status, reply, close=False):
+        """Write an HTTP response holding a JSON reply"""
+        body = json.dumps(reply).encode()
+        writer.write("HTTP/1.1 {0} {1}\r\nContent-Type: application/json\r\nContent-Length: {2}\r\n{3}\r\n".format(
+            status, REASONS[status], len(body), "Connection: close\r\n" if close else "").encode() + body)
+
+    async def _WebSocket(self, reader, writer, headers):
+        """Finish the WebSocket handshake then run every message received as a command"""
+        key = headers.get("sec-websocket-key")
+        if key is None:
+            self._Respond(writer, 400, {"ok": False, "error": "no Sec-WebSocket-Key"}, close=True)
+            return
+        accept = base64.b64encode(hashlib.sha1(key.encode() + WEBSOCKET_GUID).digest()).decode()
+        writer.write("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     "Sec-WebSocket-Accept: {0}\r\n\r\n".format(accept).encode())
+
+        fragments = []
+        while True:
+            head = await reader.readexactly(2)
+            final = head[0] & 0x80
+            opcode = head[0] & 0x0F
+            size = head[1] & 0x7F
+            if size == 126:
+                size = struct.unpack("!H", await reader.readexactly(2))[0]
+            elif size == 127:
+                size = struct.unpack("!Q", await reader.readexactly(8))[0]
+            if size + sum(len(fragment) for fragment in fragments) > MAX_BODY:
+                writer.write(Frame(CLOSE, struct.pack("!H", 1009)))
+                return
+            mask = await reader.readexactly(4) if head[1] & 0x80 else None
+            payload = await reader.readexactly(size)
+            if mask is not None:
+                payload = Unmask(payload, mask)
+
+            if opcode == CLOSE:
+                writer.write(Frame(CLOSE, payload[:2]))
+                return
+            if opcode == PING:
+                writer.write(Frame(PONG, payload))
+                continue
+            if opcode == PONG:
+                continue
+
+            # Text, binary or the rest of a fragmented message
+            fragments.append(payload)
+            if not final:
+                continue
+            message = b"".join(fragments)
+            fragments = []
+
+            writer.write(Frame(TEXT, json.dumps(await self._Message(message)).encode()))
+            await writer.drain()
+
+    async def _Message(self, message):
+        """The reply to a WebSocket message, a list of replies if it held a list of commands"""
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return {"ok": False, "error": "message is not JSON"}
+
+        async def run(command):
+            if not isinstance(command, dict):
+                return {"ok": False, "error": "commands must be JSON objects"}
+            reply = await self._Execute(command)
+            if "id" in command:
+                reply["id"] = command["id"]
+            return reply
+
+        if isinstance(data, list):
+            # One after another, so they happen in the order they were sent
+            return [await run(command) for command in data]
+        return await run(data)
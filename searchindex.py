@@ -0,0 +1,163 @@
+import re
+from collections import Counter
+
+
+RESULT_LIMIT = 500  # Most results a search returns
+FUZZY_MATCH = 0.5  # Share of a query's trigrams a title needs to contain to be a fuzzy match
+
+_WORDS = re.compile(r"\w+")
+
+
+def Normalise(text):
+    """Lower case and collapse whitespace, so searches ignore case and spacing"""
+    return " ".join(text.casefold().split())
+
+
+def Trigrams(text):
+    """The set of three character pieces of some normalised text"""
+    return {text[i:i+3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """Finds titles as the user types. Built once and then kept up to date by Add, Remove and Rename.
+
+    Three kinds of match are tried in order: titles with a word starting with the query (a trie over every word),
+    titles containing the query anywhere (an index of three character pieces), and then titles sharing most of the
+    query's pieces to catch typos."""
+    def __init__ (self, titles=()):
+        self._Trie = {}  # Character | Child node, a node's "" key holds the titles with a word ending there
+        self._Trigrams = {}  # Trigram | Set of titles
+        self._Normalised = {}  # Title | Normalised title
+        for title in titles:
+            self.Add(title)
+
+    def __len__ (self):
+        return len(self._Normalised)
+
+    def __contains__ (self, title):
+        return title in self._Normalised
+
+    def Add(self, title):
+        """Index a new title"""
+        if title in self._Normalised:
+            return
+        text = Normalise(title)
+        self._Normalised[title] = text
+
+        for word in set(_WORDS.findall(text)):
+            node = self._Trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node.setdefault("", set()).add(title)
+
+        for trigram in Trigrams(text):
+            self._Trigrams.setdefault(trigram, set()).add(title)
+
+    def Remove(self, title):
+        """Forget a title"""
+        text = self._Normalised.pop(title, None)
+        if text is None:
+            return
+
+        for word in set(_WORDS.findall(text)):
+            # Walk down to the end of the word, remembering the way back so empty branches can be pruned
+            path = []
+            node = self._Trie
+            for char in word:
+                path.append((node, char))
+                node = node[char]
+            node[""].discard(title)
+            if not node[""]:
+                del node[""]
+            for parent, char in reversed(path):
+                if parent[char]:
+                    break
+                del parent[char]
+
+        for trigram in Trigrams(text):
+            titles = self._Trigrams[trigram]
+            titles.discard(title)
+            if not titles:
+                del self._Trigrams[trigram]
+
+    def Rename(self, curName, newName):
+        """Re-index a title under its new name"""
+        self.Remove(curName)
+        self.Add(newName)
+
+    def Clear(self):
+        """Forget every title"""
+        self._Trie = {}
+        self._Trigrams = {}
+        self._Normalised = {}
+
+    def _Prefix(self, prefix, limit):
+        """Titles with a word starting with prefix"""
+        node = self._Trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+
+        # Depth first walk of everything under the prefix, stopping once there are enough results
+        found = {}
+        stack = [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            for char, child in node.items():
+                if char == "":
+                    for title in child:
+                        found[title] = None
+                else:
+                    stack.append(child)
+        return list(found)[:limit]
+
+    def _Substring(self, text, limit, exclude):
+        """Titles containing text anywhere"""
+        postings = sorted((self._Trigrams.get(trigram, ()) for trigram in Trigrams(text)), key=len)
+        if not postings or not postings[0]:
+            return []
+
+        # Intersect starting with the rarest piece, then check the pieces really are in order
+        candidates = set(postings[0])
+        for titles in postings[1:]:
+            candidates &= titles
+            if not candidates:
+                return []
+
+        found = []
+        for title in candidates:
+            if title not in exclude and text in self._Normalised[title]:
+                found.append(title)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def _Fuzzy(self, text, limit, exclude):
+        """Titles sharing most of text's trigrams, best first"""
+        trigrams = Trigrams(text)
+        needed = max(1, int(len(trigrams) * FUZZY_MATCH))
+        counts = Counter()
+        for trigram in trigrams:
+            counts.update(self._Trigrams.get(trigram, ()))
+        return [title for title, count in counts.most_common() if count >= needed and title not in exclude][:limit]
+
+    def Search(self, query, limit=RESULT_LIMIT):
+        """Titles matching query, best matches first"""
+        text = Normalise(query)
+        if not text:
+            return []
+
+        results = []
+        words = _WORDS.findall(text)
+        if len(words) == 1 and words[0] == text:
+            # A single word, so the trie can answer it directly
+            results = self._Prefix(text, limit)
+
+        if len(results) < limit and len(text) >= 3:
+            results += self._Substring(text, limit - len(results), set(results))
+
+        if not results and len(text) >= 3:
+            results = self._Fuzzy(text, limit, ())
+
+        return results
@@ -0,0 +1,116 @@
+import json
+import os
+import time
+from collections import deque
+
+
+WINDOW = 2048  # Samples kept per histogram, older ones roll off
+
+# Collection is off unless asked for, every entry point checks this first so it costs next to nothing when off.
+ENABLED = os.environ.get("SOUNDBOARD_STATS", "") not in ("", "0")
+
+_Histograms = {}  # Name | Histogram
+
+
+class Histogram:
+    """The most recent timings of one thing, in seconds"""
+    def __init__ (self, name, window=WINDOW):
+        self.Name = name
+        self.Samples = deque(maxlen=window)  # Appends are atomic, so any thread can record
+        self.Total = 0  # Every sample ever recorded, not just those in the window
+
+    def Record(self, seconds):
+        """Add a timing"""
+        self.Samples.append(seconds)
+        self.Total += 1
+
+    def Summary(self):
+        """Count, mean, percentiles and a log2 bucketed histogram of the window, in milliseconds"""
+        samples = sorted(self.Samples)
+        summary = {"total": self.Total, "count": len(samples)}
+        if not samples:
+            return summary
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+        summary.update({
+            "mean": sum(samples) / len(samples) * 1000,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": samples[-1] * 1000,
+        })
+
+        # Bucket n holds samples between 2**(n-1) and 2**n microseconds
+        buckets = {}
+        for sample in samples:
+            bucket = max(0, int(sample * 1000000)).bit_length()
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+        summary["buckets_us"] = {str(1 << bucket): count for bucket, count in sorted(buckets.items())}
+        return summary
+
+
+def Enable(enabled=True):
+    """Turn collection on or off"""
+    global ENABLED
+    ENABLED = enabled
+
+
+def Get(name):
+    """The histogram called name, created if needed"""
+    histogram = _Histograms.get(name)
+    if histogram is None:
+        histogram = _Histograms.setdefault(name, Histogram(name))
+    return histogram
+
+
+def Record(name, seconds):
+    """Record a timing if collection is on"""
+    if ENABLED:
+        Get(name).Record(seconds)
+
+
+def Start():
+    """Start timing something. Returns None when collection is off, so Stop can return straight away."""
+    return time.perf_counter() if ENABLED else None
+
+
+def Stop(name, start):
+    """Record the time since Start"""
+    if start is not None:
+        Get(name).Record(time.perf_counter() - start)
+
+
+def Timed(name):
+    """Decorator that records how long each call of a function takes"""
+    def decorator(function):
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                Get(name).Record(time.perf_counter() - start)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+    return decorator
+
+
+def Snapshot():
+    """Summaries of every histogram"""
+    return {name: histogram.Summary() for name, histogram in sorted(list(_Histograms.items()))}
+
+
+def Reset():
+    """Forget everything recorded so far"""
+    _Histograms.clear()
+
+
+def Dump(path):
+    """Write a snapshot to a JSON file"""
+    with open(path, "w") as out:
+        json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "enabled": ENABLED, "stats": Snapshot()}, out,
+                  indent=2)
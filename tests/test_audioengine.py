@@ -0,0 +1,153 @@
+import os
+import sys
+import unittest
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audioengine
+import pcm
+
+
+class CaptureSink (audioengine.NullSink):
+    """Keeps everything the engine outputs"""
+    def __init__ (self):
+        self.Data = bytearray()
+
+    def Write(self, data):
+        self.Data += data
+
+
+def Constant(value, frames):
+    """A clip whose every sample is value"""
+    return audioengine.Clip(array("h", [value] * (frames * pcm.CHANNELS)).tobytes())
+
+
+class EngineTest(unittest.TestCase):
+    """Voices mixed offline with Render, the output checked sample by sample"""
+    def setUp(self):
+        self.Sink = CaptureSink()
+        self.Engine = audioengine.AudioEngine(self.Sink, maxVoices=4, blockFrames=256)
+        self.addCleanup(self.Engine.Close)
+
+    def left(self, first=0, last=None):
+        """The left channel of the frames rendered so far"""
+        return list(array("h", bytes(self.Sink.Data))[first * pcm.CHANNELS:None if last is None
+                                                      else last * pcm.CHANNELS:pcm.CHANNELS])
+
+    def testMix(self):
+        self.Engine.Play(Constant(1000, 1024))
+        self.Engine.Play(Constant(500, 512))
+        self.Engine.Render(1024)
+        samples = self.left()
+        self.assertEqual(len(samples), 1024)
+        self.assertEqual(set(samples[:512]), {1500})
+        self.assertEqual(set(samples[512:]), {1000})
+        self.Engine.Render(256)
+        self.assertEqual(self.Engine.ActiveVoices(), 0)
+        self.assertEqual(set(self.left(1024)), {0})
+
+    def testClipping(self):
+        self.Engine.Play(Constant(30000, 256))
+        self.Engine.Play(Constant(30000, 256))
+        self.Engine.Render(256)
+        self.assertEqual(set(self.left()), {32767})  # Saturates rather than wrapping round
+
+    def testGain(self):
+        self.Engine.Play(Constant(1000, 256))
+        self.Engine.Play(Constant(2000, 256), gain=0.5)
+        self.Engine.Play(Constant(3000, 256), gain=0.0)
+        self.Engine.Render(256)
+        self.assertEqual(set(self.left()), {2000})
+
+    def testLimiter(self):
+        self.Engine.SetLimiter(True)
+        self.Engine.Play(Constant(30000, 256))
+        self.Engine.Play(Constant(30000, 256))
+        self.Engine.Render(256)
+        self.assertLessEqual(max(self.left()), int(32768 * 10 ** (audioengine.LIMITER_CEILING / 20)) + 1)
+
+    def testVoiceStealing(self):
+        voices = [self.Engine.Play(Constant(100, 4096), loop=True) for _ in range(6)]
+        self.Engine.Render(256)
+        self.assertEqual(self.Engine.ActiveVoices(), 4)
+        self.assertEqual(self.Engine.Stolen, 2)
+        self.assertNotIn(voices[0], self.Engine._Voices)  # The oldest go first
+        self.assertNotIn(voices[1], self.Engine._Voices)
+        self.assertEqual(set(self.left()), {400})
+
+
+    def testScheduledStart(self):
+        voice = self.Engine.Play(Constant(1000, 100), at=300)
+        self.Engine.Render(768)
+        samples = self.left()
+        self.assertEqual(set(samples[:300]), {0})
+        self.assertEqual(set(samples[300:400]), {1000})
+        self.assertEqual(set(samples[400:]), {0})
+        self.assertEqual(voice.StartFrame, 300)
+        self.assertEqual(self.Engine.SchedulingStats()["late"], 0)
+
+    def testFadeInAndStop(self):
+        voice = self.Engine.Play(Constant(10000, 4096), fadeIn=512 / pcm.RATE)
+        self.Engine.Render(1024)
+        samples = self.left()
+        self.assertLess(samples[0], 1000)  # Ramped in steps, so only close to silence
+        self.assertEqual(samples, sorted(samples))  # Only ever gets louder
+        self.assertEqual(set(samples[512:]), {10000})
+
+        self.Engine.Stop(voice, at=1024 + 100, fade=100 / pcm.RATE)
+        self.Engine.Render(256)
+        fading = self.left(1024 + 100, 1024 + 200)
+        self.assertEqual(fading, sorted(fading, reverse=True))
+        self.assertEqual(set(self.left(1024, 1024 + 100)), {10000})
+        self.assertEqual(set(self.left(1024 + 200)), {0})
+        self.assertTrue(voice.Finished)
+
+    def testPlaylistCrossfade(self):
+        crossfade = 128
+        playlist = audioengine.Playlist([Constant(1000, 512), Constant(3000, 512)], crossfade=crossfade / pcm.RATE)
+        self.Engine.PlaySequence(playlist)
+        self.Engine.Render(1280)
+        samples = self.left()
+        overlap = samples[512 - crossfade:512]
+        self.assertEqual(set(samples[:512 - crossfade]), {1000})
+        self.assertTrue(all(1000 <= sample <= 3000 for sample in overlap))
+        self.assertEqual(set(samples[512:1024 - crossfade]), {3000})
+        self.assertEqual(set(samples[1024 - crossfade:]), {0})
+        self.assertTrue(playlist.Finished)
+
+    def testRepeater(self):
+        repeater = audioengine.Repeater(Constant(1000, 10), bpm=pcm.RATE * 60 / 300, count=3, startFrame=0)
+        self.Engine.PlaySequence(repeater)
+        self.Engine.Render(1024)
+        samples = self.left()
+        hits = [frame for frame in range(len(samples)) if samples[frame] and not (frame and samples[frame - 1])]
+        self.assertEqual(hits, [0, 300, 600])
+        self.assertEqual(repeater.Hits, 3)
+
+    def testSequence(self):
+        """A Sequence only has to say which voices are due, the mixer does the rest"""
+        class Once (audioengine.Sequence):
+            def Due(self, engine, blockStart, until):
+                voices = []
+                if not self.Playing and self.StartFrame < until:
+                    voice = engine.NewVoice(Constant(1000, 10))
+                    voice.StartFrame = self.StartFrame
+                    self._Started(voice)
+                    voices.append(voice)
+                elif self.Playing and self.Playing[0].Finished:
+                    self.Finished = True
+                return voices
+
+        with self.assertRaises(TypeError):
+            audioengine.Sequence()
+        sequence = Once(startFrame=400)
+        self.Engine.PlaySequence(sequence)
+        self.Engine.Render(1024)
+        samples = self.left()
+        self.assertEqual([frame for frame in range(len(samples)) if samples[frame]], list(range(400, 410)))
+        self.assertTrue(sequence.Finished)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+
+
+class CatalogTest(unittest.TestCase):
+    """The order of the entries, kept in memory and in the database"""
+    def setUp(self):
+        self.Folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.Folder, ignore_errors=True)
+        self.Path = os.path.join(self.Folder, "content.db")
+        self.Catalog = self.open()
+        self.addCleanup(lambda: self.Catalog.Close())
+        self.Catalog.AddMany([(title, title.lower() + ".wav") for title in "ABCDEFGH"])
+
+    def open(self):
+        return catalog.Open(self.Path, snapshot=os.path.join(self.Folder, "content.snapshot"))
+
+    def reopen(self):
+        """Close the catalog and open it again, so everything is read back from disk"""
+        self.Catalog.Close()
+        self.Catalog = self.open()
+        return self.Catalog
+
+    def order(self):
+        return "".join(self.Catalog.Titles())
+
+    def testPages(self):
+        self.assertEqual(self.Catalog.Page(0, 3), ["A", "B", "C"])
+        self.assertEqual(self.Catalog.Page(6, 5), ["G", "H"])
+        self.assertEqual(self.Catalog.Page(10, 5), [])
+        self.assertEqual(self.Catalog.IndexOf("E"), 4)
+
+    def testDeleteAndRename(self):
+        self.assertEqual(self.Catalog.Delete("C"), "c.wav")
+        self.assertIsNone(self.Catalog.Delete("C"))
+        self.assertEqual(self.Catalog.DeleteMany(["A", "missing", "H"]), {"A": "a.wav", "H": "h.wav"})
+        self.Catalog.Rename("D", "Dee")
+        self.Catalog.Add("I", "i.wav")
+        with self.assertRaises(ValueError):
+            self.Catalog.Rename("B", "E")
+        self.assertEqual(list(self.Catalog.Titles()), ["B", "Dee", "E", "F", "G", "I"])
+        self.assertEqual(list(self.reopen().Titles()), ["B", "Dee", "E", "F", "G", "I"])
+        self.assertEqual(self.Catalog.FilenameOf("Dee"), "d.wav")
+
+    def testMoveUpAndDown(self):
+        self.assertFalse(self.Catalog.MoveUp("A"))
+        self.assertFalse(self.Catalog.MoveDown("H"))
+        self.assertTrue(self.Catalog.MoveUp("C"))
+        self.assertTrue(self.Catalog.MoveDown("D"))
+        self.assertEqual(self.order(), "ACBEDFGH")
+        self.reopen()
+        self.assertEqual(self.order(), "ACBEDFGH")
+
+    def testMoveMany(self):
+        self.assertTrue(self.Catalog.MoveMany(["F", "B"], 0))  # To the front, keeping their order
+        self.assertEqual(self.order(), "BFACDEGH")
+        self.assertTrue(self.Catalog.MoveMany(["B", "F"], 100))  # Past the end goes to the end
+        self.assertEqual(self.order(), "ACDEGHBF")
+        self.assertTrue(self.Catalog.MoveMany(["A", "H"], 3))
+        self.assertEqual(self.order(), "CDEAHGBF")
+        self.assertFalse(self.Catalog.MoveMany(["A", "H"], 3))  # Already there
+        self.assertFalse(self.Catalog.MoveMany(["missing"], 0))
+        self.reopen()
+        self.assertEqual(self.order(), "CDEAHGBF")
+
+    def testMoveManyWithoutRoom(self):
+        """Moving into a gap with no free keys deals the keys of the span out again"""
+        for _ in range(3):
+            self.Catalog.MoveMany(["A", "B", "C"], 4)
+            self.Catalog.MoveMany(["E", "F"], 1)
+        order = self.order()
+        self.assertEqual(sorted(order), list("ABCDEFGH"))
+        self.reopen()
+        self.assertEqual(self.order(), order)
+
+    def testSetOrder(self):
+        self.assertEqual(self.Catalog.SetOrder(["H", "missing", "A", "H"]), 8)
+        self.assertEqual(self.order(), "HABCDEFG")
+        self.assertEqual(self.Catalog.SetOrder(["H"]), 0)
+        self.reopen()
+        self.assertEqual(self.order(), "HABCDEFG")
+
+    def testSearch(self):
+        self.Catalog.AddMany([("Airhorn", "airhorn.wav"), ("Air raid", "raid.wav"), ("Drumroll", "drum.wav")])
+        self.assertEqual(set(self.Catalog.Search("air")), {"Airhorn", "Air raid"})
+        self.Catalog.Rename("Airhorn", "Foghorn")
+        self.assertEqual(self.Catalog.Search("air"), ["Air raid"])
+        self.assertIn("Foghorn", self.Catalog.Search("horn"))
+
+    def testSyncFromAnotherInstance(self):
+        self.Catalog.Flush()
+        other = catalog.Catalog(self.Path)
+        self.addCleanup(other.Close)
+        other.MoveMany(["H"], 0)
+        other.Delete("D")
+        self.assertTrue(self.Catalog.Sync())
+        self.assertEqual(self.order(), "HABCEFG")
+        self.assertFalse(self.Catalog.Sync())
+
+
+if __name__ == "__main__":
+    unittest.main()
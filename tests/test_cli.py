@@ -0,0 +1,52 @@
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cli
+import pcm
+
+
+class PlayTest(unittest.TestCase):
+    """play checks its titles before the sink it was asked for is opened"""
+    def setUp(self):
+        self.Root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.Root, ignore_errors=True)
+        audio = os.path.join(self.Root, "Files", "Audio")
+        os.makedirs(audio)
+        with wave.open(os.path.join(audio, "beep.wav"), "wb") as fle:
+            fle.setnchannels(pcm.CHANNELS)
+            fle.setsampwidth(pcm.WIDTH)
+            fle.setframerate(pcm.RATE)
+            fle.writeframes(b"\x00\x10\x00\xf0" * (pcm.RATE // 20))
+        with open(os.path.join(self.Root, "Files", "content.csv"), "w") as content:
+            content.write("Beep,beep.wav\n")
+        self.Output = os.path.join(self.Root, "out.wav")
+
+    def play(self, *titles):
+        errors = io.StringIO()
+        with contextlib.redirect_stderr(errors):
+            code = cli.Main(["play", *titles, "--root", self.Root, "--backend", "wav:" + self.Output])
+        return code, errors.getvalue()
+
+    def testMissingTitle(self):
+        code, errors = self.play("Beep", "Missing")
+        self.assertEqual(code, 1)
+        self.assertIn("no such title: Missing", errors)
+        self.assertFalse(os.path.exists(self.Output))
+
+    def testPlayed(self):
+        self.assertEqual(self.play("Beep")[0], 0)
+        with wave.open(self.Output, "rb") as rendered:
+            self.assertGreaterEqual(rendered.getnframes(), pcm.RATE // 20)
+            self.assertIn(b"\x00\x10\x00\xf0", rendered.readframes(rendered.getnframes()))
+
+
+if __name__ == "__main__":
+    unittest.main()
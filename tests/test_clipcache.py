@@ -0,0 +1,70 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clipcache
+import pcm
+
+
+FRAMES = 1000
+CLIP_BYTES = FRAMES * pcm.FRAME_BYTES
+
+
+class ClipCacheTest(unittest.TestCase):
+    """Clips are kept until the byte budget is used up, then the least recently played go first"""
+    def setUp(self):
+        self.Folder = tempfile.mkdtemp() + os.sep
+        self.addCleanup(shutil.rmtree, self.Folder, ignore_errors=True)
+        for name in ("a", "b", "c"):
+            self.write(name + ".wav", FRAMES)
+
+    def write(self, filename, frames):
+        with wave.open(self.Folder + filename, "wb") as fle:
+            fle.setnchannels(pcm.CHANNELS)
+            fle.setsampwidth(pcm.WIDTH)
+            fle.setframerate(pcm.RATE)
+            fle.writeframes(bytes(frames * pcm.FRAME_BYTES))
+
+    def testEviction(self):
+        cache = clipcache.ClipCache(self.Folder, budget=2 * CLIP_BYTES)
+        first = cache.Get("a.wav")
+        self.assertEqual(len(first), CLIP_BYTES)
+        cache.Get("b.wav")
+        self.assertIs(cache.Get("a.wav"), first)  # Held, and now the most recently played
+        self.assertEqual((cache.Hits, cache.Misses), (1, 2))
+
+        cache.Get("c.wav")
+        self.assertEqual(sorted(cache._Clips), ["a.wav", "c.wav"])
+        self.assertEqual(cache.Size, 2 * CLIP_BYTES)
+        cache.Get("b.wav")
+        self.assertEqual(sorted(cache._Clips), ["b.wav", "c.wav"])
+        self.assertEqual(cache.Misses, 4)
+
+    def testOverBudget(self):
+        """A clip bigger than the whole budget is played but never kept"""
+        cache = clipcache.ClipCache(self.Folder, budget=2 * CLIP_BYTES)
+        cache.Get("a.wav")
+        self.write("big.wav", 3 * FRAMES)
+        self.assertEqual(len(cache.Get("big.wav")), 3 * CLIP_BYTES)
+        self.assertNotIn("big.wav", cache)
+        self.assertIn("a.wav", cache)
+        self.assertEqual(cache.Size, CLIP_BYTES)
+
+    def testEvictAndClear(self):
+        cache = clipcache.ClipCache(self.Folder, budget=3 * CLIP_BYTES)
+        cache.Get("a.wav")
+        cache.Get("b.wav")
+        cache.Evict("a.wav")
+        cache.Evict("missing.wav")
+        self.assertEqual((len(cache), cache.Size), (1, CLIP_BYTES))
+        cache.Clear()
+        self.assertEqual((len(cache), cache.Size), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audioengine
+import convertcache
+import hashindex
+
+
+class ConvertCacheTest(unittest.TestCase):
+    """Files not in the native format are converted once, into a copy named after their audio and the output format"""
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.Audio = os.path.join(root, "Audio") + os.sep
+        os.mkdir(self.Audio)
+        self.Hashes = hashindex.HashIndex(os.path.join(root, "hashes.db"), self.Audio)
+        self.addCleanup(self.Hashes.Close)
+        self.Converted = convertcache.ConvertCache(os.path.join(root, "Cache") + os.sep, self.Audio, self.Hashes)
+
+    def write(self, filename, value=0, rate=22050, channels=1):
+        with wave.open(self.Audio + filename, "wb") as fle:
+            fle.setnchannels(channels)
+            fle.setsampwidth(2)
+            fle.setframerate(rate)
+            fle.writeframes(bytes([value]) * (rate // 10 * channels * 2))
+
+    def forget(self, filenames):
+        """Drop the files' copies and then their hashes, as a delete does"""
+        self.Converted.Forget(filenames)
+        self.Hashes.Forget(filenames)
+
+    def copies(self):
+        return sorted(name for name in os.listdir(self.Converted.Folder) if name.endswith(".raw"))
+
+    def testConvertedOnce(self):
+        self.write("a.wav", value=1)
+        clip = self.Converted.Load("a.wav")
+        self.assertEqual(bytes(clip.Data), bytes(audioengine.LoadClip(self.Audio + "a.wav").Data))
+        self.assertEqual(self.Converted.Converted, 1)
+        self.assertEqual(len(self.copies()), 1)
+        self.assertTrue(self.copies()[0].endswith("-" + convertcache.FormatKey() + ".raw"))
+
+        self.Converted.Load("a.wav")
+        self.assertEqual(self.Converted.Converted, 1)
+
+    def testNativeNotCopied(self):
+        self.write("native.wav", rate=44100, channels=2)
+        self.Converted.Load("native.wav")
+        self.assertEqual((self.Converted.Converted, self.copies()), (0, []))
+
+    def testChangedFile(self):
+        self.write("a.wav", value=1)
+        self.Converted.Load("a.wav")
+        first = self.copies()
+        self.write("a.wav", value=2)
+        os.utime(self.Audio + "a.wav", ns=(0, 0))  # However quickly it was rewritten
+        self.Converted.Load("a.wav")
+        self.assertEqual(self.Converted.Converted, 2)
+        self.assertEqual(len(set(self.copies()) - set(first)), 1)
+
+    def testForgetShared(self):
+        self.write("a.wav", value=1)
+        self.write("same.wav", value=1)
+        self.write("b.wav", value=2)
+        for filename in ("a.wav", "same.wav", "b.wav"):
+            self.Converted.Load(filename)
+        self.assertEqual(len(self.copies()), 2)
+
+        self.forget(["a.wav", "b.wav"])
+        self.assertEqual(len(self.copies()), 1)  # Still used by same.wav
+        self.forget(["same.wav"])
+        self.assertEqual(self.copies(), [])
+
+    def testCollect(self):
+        self.write("a.wav", value=1)
+        self.write("b.wav", value=2)
+        self.Converted.Load("a.wav")
+        self.Converted.Load("b.wav")
+        for stray in ("0123-8000x1x8.raw", "half.tmp"):
+            open(self.Converted.Folder + stray, "wb").close()
+
+        self.Converted.Collect(["a.wav"])
+        self.assertEqual(len(self.copies()), 1)
+        self.assertNotIn("0123-8000x1x8.raw", self.copies())
+        self.assertNotIn("half.tmp", os.listdir(self.Converted.Folder))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audioengine
+import contentindex
+import hashindex
+from audiomanager import AudioManager
+
+
+def WriteWave(path, frames, value=0):
+    with wave.open(path, "wb") as fle:
+        fle.setnchannels(2)
+        fle.setsampwidth(2)
+        fle.setframerate(44100)
+        fle.writeframes(bytes([value]) * (frames * 4))
+
+
+class ContentIndexTest(unittest.TestCase):
+    """Files with the same audio are found, and a file matched by an import isn't removed until it lets go"""
+    def setUp(self):
+        self.Folder = tempfile.mkdtemp() + os.sep
+        self.addCleanup(shutil.rmtree, self.Folder, ignore_errors=True)
+        self.Hashes = hashindex.HashIndex(os.path.join(self.Folder, ".hashes.db"), self.Folder)
+        self.addCleanup(self.Hashes.Close)
+        self.Blobs = contentindex.ContentIndex(self.Folder, self.Hashes)
+
+    def testStore(self):
+        WriteWave(self.Folder + "a.wav", 100)
+        WriteWave(self.Folder + "b.wav", 100, value=1)  # Same size, different audio
+        self.assertEqual(self.Blobs.Store("a.wav"), "a.wav")
+        self.assertEqual(self.Blobs.Store("b.wav"), "b.wav")
+        WriteWave(self.Folder + "c.wav", 100)
+        self.assertEqual(self.Blobs.Store("c.wav"), "a.wav")
+
+    def testCopiesImportedTogether(self):
+        """Two copies moved into the folder before either is stored can't each match the other"""
+        WriteWave(self.Folder + "a.wav", 100)
+        WriteWave(self.Folder + "b.wav", 100)
+        self.assertEqual(self.Blobs.Store("b.wav"), "a.wav")
+        self.assertEqual(self.Blobs.Store("a.wav"), "a.wav")
+
+    def testInFlightNotMatched(self):
+        """Copies moved in by one import are only matched once they have been stored, as the importer removes those
+        that match something. Stored in the order that used to leave an entry playing a removed copy."""
+        names = ["clip{0}.wav".format(number) for number in range(4)]
+        for name in names:
+            self.Blobs.Expect(name)
+            WriteWave(self.Folder + name, 100)
+        played = []
+        for name in names:
+            stored = self.Blobs.Store(name)
+            if stored != name:
+                os.remove(self.Folder + name)  # As the importer does
+            played.append(stored)
+        self.assertEqual(played, ["clip0.wav"] * 4)
+        self.assertEqual([name for name in os.listdir(self.Folder) if name.endswith(".wav")], ["clip0.wav"])
+
+    def testAbandoned(self):
+        self.Blobs.Expect("a.wav")
+        WriteWave(self.Folder + "a.wav", 100)
+        self.Blobs.Abandon("a.wav")
+        WriteWave(self.Folder + "b.wav", 100)
+        self.assertEqual(self.Blobs.Store("b.wav"), "a.wav")
+
+    def testHeldUntilReleased(self):
+        WriteWave(self.Folder + "a.wav", 100)
+        WriteWave(self.Folder + "copy.wav", 100)
+        self.assertEqual(self.Blobs.Store("copy.wav"), "a.wav")
+        os.remove(self.Folder + "copy.wav")  # As the importer does
+
+        self.assertEqual(self.Blobs.Remove(["a.wav"]), [])
+        self.assertTrue(os.path.exists(self.Folder + "a.wav"))
+
+        self.Blobs.Release(["a.wav"])
+        self.assertEqual(self.Blobs.Remove(["a.wav"]), ["a.wav"])
+        self.assertFalse(os.path.exists(self.Folder + "a.wav"))
+        # Gone from the index too, so nothing matches it any more
+        WriteWave(self.Folder + "again.wav", 100)
+        self.assertEqual(self.Blobs.Store("again.wav"), "again.wav")
+
+
+class SharedImportTest(unittest.TestCase):
+    """Audio imported twice plays one file, which is only deleted along with the last entry playing it"""
+    def setUp(self):
+        self.Root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.Root, ignore_errors=True)
+        self.Manager = AudioManager(root=self.Root, sink=audioengine.NullSink())
+        self.addCleanup(self.Manager.Close)
+        self.Manager.Catalog.Loaded.wait()
+
+    def source(self, name, value=0):
+        path = os.path.join(self.Root, name)
+        WriteWave(path, 4410, value)
+        return path
+
+    def testManyCopies(self):
+        """Every entry of a batch of identical files plays a file that is still there"""
+        job = self.Manager.ImportFiles([self.source("copy{0}.wav".format(number)) for number in range(8)], workers=4)
+        job.Wait()
+        self.assertEqual((job.Shared, job.Errors), (7, []))
+        files = self.Manager.Snapshot()
+        self.assertEqual(len(files), 8)
+        for title, filename in files.items():
+            self.assertTrue(os.path.exists(self.Manager.AudioPath + filename), title)
+        self.assertEqual(len(os.listdir(self.Manager.AudioPath)), 1)
+
+    def testDeleteShared(self):
+        self.Manager.ImportFiles([self.source("one.wav")]).Wait()
+        job = self.Manager.ImportFiles([self.source("two.wav"), self.source("three.wav", value=2)])
+        job.Wait()
+        self.assertEqual((job.Shared, job.Errors), (1, []))
+        files = self.Manager.Snapshot()
+        self.assertEqual(files["two"], files["one"])
+        self.assertEqual(sorted(os.listdir(self.Manager.AudioPath)), ["one.wav", "three.wav"])
+
+        self.Manager.DeleteEntry("one", deleteAudioFile=True)
+        self.assertTrue(os.path.exists(self.Manager.AudioPath + "one.wav"))  # Still played by two
+        self.Manager.DeleteEntries(["two", "three"], deleteAudioFiles=True)
+        self.assertEqual(os.listdir(self.Manager.AudioPath), [])
+        self.assertEqual(len(self.Manager.Catalog), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
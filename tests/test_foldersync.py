@@ -0,0 +1,59 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audioengine
+import boards
+from audiomanager import AudioManager
+
+
+class FolderSyncTest(unittest.TestCase):
+    """Files added to or removed from the shared audio folder are dealt with the same whichever board is shown"""
+    def setUp(self):
+        self.Root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.Root, ignore_errors=True)
+        self.Manager = AudioManager(root=self.Root, sink=audioengine.NullSink())
+        self.addCleanup(self.Manager.Close)
+        self.Manager.Catalog.Loaded.wait()
+        self.Manager.SyncAudioFolder()  # Takes stock of the empty folder
+
+    def drop(self, filename):
+        with wave.open(self.Manager.AudioPath + filename, "wb") as fle:
+            fle.setnchannels(2)
+            fle.setsampwidth(2)
+            fle.setframerate(44100)
+            fle.writeframes(bytes(400))
+
+    def testAddedToDefaultBoard(self):
+        self.Manager.CreateBoard("Other")
+        self.Manager.SwitchBoard("Other")
+        self.drop("new.wav")
+        self.assertFalse(self.Manager.SyncAudioFolder())  # Nothing on the board being shown changed
+        self.assertEqual(len(self.Manager.Catalog), 0)
+        self.assertEqual(self.Manager.Boards.Get(boards.DEFAULT_BOARD).FilenameOf("new"), "new.wav")
+
+    def testRemovedFromEveryBoard(self):
+        self.drop("gone.wav")
+        self.drop("kept.wav")
+        self.assertTrue(self.Manager.SyncAudioFolder())
+        self.Manager.CreateBoard("Other")
+        self.Manager.CreateBoard("Closed")
+        self.Manager.CopyToBoard(["gone", "kept"], "Other")
+        self.Manager.CopyToBoard(["gone"], "Closed")
+        self.Manager.Boards._Close("Closed")
+
+        self.Manager.SwitchBoard("Other")
+        os.remove(self.Manager.AudioPath + "gone.wav")
+        self.assertTrue(self.Manager.SyncAudioFolder())
+        self.assertEqual(list(self.Manager.Catalog.Titles()), ["kept"])
+        self.assertEqual(list(self.Manager.Boards.Get(boards.DEFAULT_BOARD).Titles()), ["kept"])
+        self.assertEqual(len(self.Manager.Boards.Get("Closed")), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import marshal
+import os
+import shutil
+import sqlite3
+import stat
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import catalog
+
+
+class JournalTest(unittest.TestCase):
+    """Edits kept in the journal survive a crash and are written to the database once, however often it is replayed"""
+    def setUp(self):
+        self.Folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.Folder, ignore_errors=True)
+        self.Path = os.path.join(self.Folder, "content.db")
+        self.Journal = self.Path + catalog.JOURNAL_SUFFIX
+
+    def crash(self, edits):
+        """Run edits against a fresh catalog in another process that dies before the flusher writes them out"""
+        script = textwrap.dedent("""
+            import os, sys
+            sys.path.insert(0, {root!r})
+            import catalog
+            catalog.FLUSH_INTERVAL = 60
+            cat = catalog.Open({path!r})
+            {edits}
+            os._exit(0)
+        """).format(root=ROOT, path=self.Path, edits=edits)
+        subprocess.run([sys.executable, "-c", script], check=True, timeout=60)
+
+    def rows(self):
+        with sqlite3.connect(self.Path) as db:
+            return db.execute("SELECT title, filename, plays FROM entries ORDER BY position").fetchall()
+
+    def testCrashBeforeFlush(self):
+        self.crash('cat.AddMany([("a", "a.wav"), ("b", "b.wav"), ("c", "c.wav")])\n'
+                   'cat.Rename("b", "bee")\ncat.MoveMany(["c"], 0)')
+        self.assertEqual(self.rows(), [])  # Only in the journal
+        with open(self.Journal, "rb") as fle:
+            self.assertEqual(len(catalog.ReadJournal(fle.read())), 3)
+
+        cat = catalog.Open(self.Path)
+        try:
+            self.assertEqual(list(cat.Titles()), ["c", "a", "bee"])
+            self.assertEqual(os.path.getsize(self.Journal), 0)
+        finally:
+            cat.Close()
+        self.assertEqual([title for title, _filename, _plays in self.rows()], ["c", "a", "bee"])
+
+    def testReplayIsIdempotent(self):
+        self.crash('cat.Add("a", "a.wav")\ncat.RecordPlays([("a", 1, 0.0)])')
+        with open(self.Journal, "rb") as fle:
+            journal = fle.read()
+
+        catalog.Open(self.Path).Close()
+        # The same journal again, as if the last run had died before emptying it
+        with open(self.Journal, "wb") as fle:
+            fle.write(journal)
+        catalog.Open(self.Path).Close()
+        self.assertEqual(self.rows(), [("a", "a.wav", 1)])
+
+    def testDuplicateRecords(self):
+        """A record compacted and then appended as well is only run once"""
+        catalog.Open(self.Path).Close()
+        edits = [(1, [("INSERT INTO entries (title, filename, position) VALUES (?, ?, ?)", [("a", "a.wav", 0)])]),
+                 (2, [("UPDATE entries SET plays=plays+? WHERE title=?", [(1, "a")])])]
+        with open(self.Journal, "wb") as fle:
+            for edit in edits + edits[1:]:
+                record = marshal.dumps(edit)
+                fle.write(catalog.RECORD.pack(len(record)) + record)
+            fle.write(b"\x10\x00")  # A record only partly written
+
+        cat = catalog.Open(self.Path)
+        try:
+            self.assertEqual(list(cat.Titles()), ["a"])
+        finally:
+            cat.Close()
+        self.assertEqual(self.rows(), [("a", "a.wav", 1)])
+
+    def testCompaction(self):
+        cat = catalog.Open(self.Path)
+        try:
+            cat.AddMany([("a", "a.wav"), ("b", "b.wav")])
+            with cat._Journalled:
+                cat._CompactJournal()
+            with open(self.Journal, "rb") as fle:
+                self.assertEqual([sequence for sequence, _statements in catalog.ReadJournal(fle.read())],
+                                 [sequence for sequence, _statements in cat._Pending])
+            cat.Add("c", "c.wav")
+        finally:
+            cat.Close()
+
+        cat = catalog.Open(self.Path)
+        try:
+            self.assertEqual(list(cat.Titles()), ["a", "b", "c"])
+        finally:
+            cat.Close()
+
+    @unittest.skipIf(os.name == "nt", "no execute bit")
+    def testJournalMode(self):
+        cat = catalog.Open(self.Path)
+        try:
+            self.assertEqual(stat.S_IMODE(os.stat(self.Journal).st_mode) & 0o111, 0)
+            cat.Add("a", "a.wav")
+            with cat._Journalled:
+                cat._CompactJournal()
+            self.assertEqual(stat.S_IMODE(os.stat(self.Journal).st_mode) & 0o111, 0)
+        finally:
+            cat.Close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+import clipcache
+import pcm
+import prefetch
+
+
+class Manager:
+    """The parts of AudioManager the prefetcher uses"""
+    def __init__ (self, cache):
+        self.Cache = cache
+
+
+class PrefetchTest(unittest.TestCase):
+    """Plays are counted per entry, and clips are loaded most likely first into whatever room the cache has left"""
+    def setUp(self):
+        self.Folder = tempfile.mkdtemp() + os.sep
+        self.addCleanup(shutil.rmtree, self.Folder, ignore_errors=True)
+        self.Catalog = catalog.Open(self.Folder + "content.db")
+        self.addCleanup(self.Catalog.Close)
+        self.Catalog.AddMany([(str(number), "{0}.wav".format(number)) for number in range(10)])
+
+        self.Cache = clipcache.ClipCache(self.Folder, budget=3 * 4000)
+        self.Prefetcher = prefetch.Prefetcher(Manager(self.Cache), favourites=2)
+        self.addCleanup(self.Prefetcher.Close)
+
+    def write(self, filename):
+        with wave.open(self.Folder + filename, "wb") as fle:
+            fle.setnchannels(pcm.CHANNELS)
+            fle.setsampwidth(pcm.WIDTH)
+            fle.setframerate(pcm.RATE)
+            fle.writeframes(bytes(4000))
+
+    def usage(self):
+        self.Catalog.Flush()
+        return {title: plays for title, plays, _played in self.Catalog.Usage(10)}
+
+    def testPlayCounts(self):
+        for title in ("3", "7", "3", "missing"):
+            self.Prefetcher.Played(self.Catalog, title)
+        self.Prefetcher.Record()
+        self.assertEqual(self.usage(), {"3": 2, "7": 1})
+        self.Prefetcher.Played(self.Catalog, "7")
+        self.Prefetcher.Record()
+        self.assertEqual(self.usage(), {"3": 2, "7": 2})
+
+    def testFavourites(self):
+        now = time.time()
+        usage = [("often", 8, now - prefetch.HALF_LIFE * 2), ("lately", 4, now), ("once", 1, now)]
+        self.assertEqual(prefetch.Favourites(usage, 3, now), ["lately", "often", "once"])
+        self.assertEqual(prefetch.Favourites(usage, 1, now), ["lately"])
+
+    def testOrder(self):
+        """The page being shown, then the next and previous pages, then the favourites not already in them"""
+        for title in ("9", "9", "4"):
+            self.Prefetcher.Played(self.Catalog, title)
+        self.Prefetcher.Record()
+        self.Catalog.Flush()
+        titles = list(self.Prefetcher._Titles(self.Catalog, 2, 2, None))
+        self.assertEqual(titles, ["2", "3", "4", "5", "0", "1", "9"])
+        results = ["8", "6", "1"]
+        self.assertEqual(list(self.Prefetcher._Titles(self.Catalog, 0, 2, results))[:3], results)
+
+    def testPrefetchIntoSpareRoom(self):
+        for filename in ("a.wav", "b.wav", "c.wav", "d.wav"):
+            self.write(filename)
+        self.Cache.Get("a.wav")
+        self.assertTrue(self.Cache.Prefetch("b.wav"))
+        self.assertTrue(self.Cache.Prefetch("c.wav"))
+        self.assertFalse(self.Cache.Prefetch("d.wav"))  # Would push out a clip
+        self.assertEqual((self.Cache.Hits, self.Cache.Misses, self.Cache.Prefetched), (0, 1, 2))
+
+        self.Cache.Get("d.wav")  # A guess goes before a clip that has been played
+        self.assertEqual(sorted(self.Cache._Clips), ["a.wav", "b.wav", "d.wav"])
+
+
+if __name__ == "__main__":
+    unittest.main()
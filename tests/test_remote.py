@@ -0,0 +1,156 @@
+import base64
+import http.client
+import json
+import os
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import unittest
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audioengine
+import remote
+from audiomanager import AudioManager
+
+
+class RemoteServerTest(unittest.TestCase):
+    """Commands sent to a server listening on the loopback interface, over HTTP and a WebSocket"""
+    @classmethod
+    def setUpClass(cls):
+        cls.Root = tempfile.mkdtemp()
+        source = os.path.join(cls.Root, "source")
+        os.mkdir(source)
+        paths = []
+        for number in range(5):
+            path = os.path.join(source, "clip{0}.wav".format(number))
+            with wave.open(path, "wb") as fle:
+                fle.setnchannels(2)
+                fle.setsampwidth(2)
+                fle.setframerate(44100)
+                fle.writeframes(bytes(4410 * 4))
+            paths.append(path)
+
+        cls.Manager = AudioManager(root=cls.Root, sink=audioengine.NullSink())
+        cls.Manager.Catalog.Loaded.wait()
+        cls.Manager.ImportFiles(paths).Wait()
+        cls.Server = remote.RemoteServer(cls.Manager, port=0).Start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.Server.Close()
+        cls.Manager.Close()
+        shutil.rmtree(cls.Root, ignore_errors=True)
+
+    def request(self, method, path, body=None):
+        connection = http.client.HTTPConnection(remote.HOST, self.Server.Port, timeout=10)
+        try:
+            connection.request(method, path, body=body)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            connection.close()
+
+    def webSocket(self):
+        connection = socket.create_connection((remote.HOST, self.Server.Port), timeout=10)
+        key = base64.b64encode(os.urandom(16)).decode()
+        connection.sendall("GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                           "Sec-WebSocket-Key: {0}\r\nSec-WebSocket-Version: 13\r\n\r\n".format(key).encode())
+        response = b""
+        while not response.endswith(b"\r\n\r\n"):
+            response += connection.recv(1)
+        self.assertTrue(response.startswith(b"HTTP/1.1 101"))
+        self.addCleanup(connection.close)
+        return connection
+
+    def send(self, connection, message):
+        """Send a masked text frame, as clients do, and return the decoded reply"""
+        payload = json.dumps(message).encode()
+        mask = os.urandom(4)
+        connection.sendall(struct.pack("!BB", 0x81, 0x80 | len(payload)) + mask + remote.Unmask(payload, mask))
+        head = self.receive(connection, 2)
+        self.assertEqual(head[0] & 0x0F, remote.TEXT)
+        size = head[1] & 0x7F
+        if size == 126:
+            size = struct.unpack("!H", self.receive(connection, 2))[0]
+        elif size == 127:
+            size = struct.unpack("!Q", self.receive(connection, 8))[0]
+        return json.loads(self.receive(connection, size))
+
+    def receive(self, connection, size):
+        data = b""
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            self.assertTrue(chunk, "connection closed")
+            data += chunk
+        return data
+
+    def testHttpCommands(self):
+        status, reply = self.request("GET", "/catalog?start=1&count=2")
+        self.assertEqual(status, 200)
+        self.assertEqual(reply["total"], 5)
+        self.assertEqual(reply["titles"], ["clip1", "clip2"])
+
+        status, reply = self.request("POST", "/play", body=json.dumps({"title": "clip3"}))
+        self.assertEqual((status, reply["title"]), (200, "clip3"))
+        self.assertEqual(self.request("GET", "/stop")[0], 200)
+        self.assertEqual(self.request("GET", "/search?query=clip&limit=2")[1]["titles"][:2],
+                         self.Manager.Search("clip")[:2])
+
+    def testHttpErrors(self):
+        self.assertEqual(self.request("GET", "/nothing")[0], 404)
+        self.assertEqual(self.request("GET", "/play?title=missing")[0], 404)
+        self.assertEqual(self.request("GET", "/board?name=missing")[0], 404)
+        self.assertEqual(self.request("GET", "/catalog?start=-1")[0], 400)
+        self.assertEqual(self.request("GET", "/catalog?count=-5")[0], 400)
+        self.assertEqual(self.request("GET", "/play?index=-1")[0], 400)
+        self.assertEqual(self.request("GET", "/catalog?start=x")[0], 400)
+        self.assertEqual(self.request("GET", "/repeat?title=clip0")[0], 400)
+        self.assertEqual(self.request("POST", "/play", body="not json")[0], 400)
+        self.assertEqual(self.request("POST", "/play", body="[1]")[0], 400)
+
+    def testBadContentLength(self):
+        for length in ("abc", "-5"):
+            connection = socket.create_connection((remote.HOST, self.Server.Port), timeout=10)
+            self.addCleanup(connection.close)
+            connection.sendall("POST /play HTTP/1.1\r\nContent-Length: {0}\r\n\r\n".format(length).encode())
+            self.assertTrue(connection.recv(4096).startswith(b"HTTP/1.1 400"))
+
+    def testWebSocketCommands(self):
+        connection = self.webSocket()
+        reply = self.send(connection, {"cmd": "play", "title": "clip0", "id": 7})
+        self.assertEqual(reply, {"ok": True, "title": "clip0", "id": 7})
+
+        replies = self.send(connection, [{"cmd": "catalog", "start": 0, "count": 1}, {"cmd": "status"},
+                                         {"cmd": "catalog", "start": -1}, {"cmd": "missing"}, "play"])
+        self.assertEqual(replies[0]["titles"], ["clip0"])
+        self.assertEqual(replies[1]["entries"], 5)
+        self.assertFalse(replies[2]["ok"])
+        self.assertTrue(replies[3]["error"].startswith("unknown command"))
+        self.assertEqual(replies[4]["error"], "commands must be JSON objects")
+
+        self.assertTrue(self.send(connection, {"cmd": "stop", "fade": 0})["ok"])
+
+    def testWorkerBusy(self):
+        """Triggers and status never wait behind an operation on the AudioManager's worker"""
+        release = threading.Event()
+        self.Manager.Worker.Submit(release.wait, 10)
+        try:
+            self.assertEqual(self.request("GET", "/play?title=clip1")[0], 200)
+            self.assertEqual(self.request("GET", "/stop")[0], 200)
+            connection = self.webSocket()
+            self.assertEqual(self.send(connection, {"cmd": "status"})["entries"], 5)
+            self.assertEqual(self.Manager.Worker.Waiting, 1)
+        finally:
+            release.set()
+        self.Manager.Worker.Close()
+        self.assertEqual(self.Manager.Worker.Waiting, 0)
+        self.assertEqual(len(self.Manager.Worker._Posted), 0)  # Nothing was waiting for a window to drain it
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from searchindex import SearchIndex
+
+
+TITLES = ["Airhorn", "Air raid siren", "Chair squeak", "Drumroll", "Sad trombone", "AIRPORT announcement"]
+
+
+class SearchIndexTest(unittest.TestCase):
+    """Word prefixes rank first, then titles containing the query, and typos are only tried when nothing else fits"""
+    def setUp(self):
+        self.Index = SearchIndex(TITLES)
+
+    def testPrefixBeforeSubstring(self):
+        results = self.Index.Search("air")
+        self.assertEqual(set(results[:3]), {"Airhorn", "Air raid siren", "AIRPORT announcement"})
+        self.assertEqual(results[3:], ["Chair squeak"])
+
+    def testLaterWord(self):
+        self.assertEqual(self.Index.Search("trom"), ["Sad trombone"])
+        self.assertEqual(self.Index.Search("  RAID  "), ["Air raid siren"])  # Case and spacing don't matter
+
+    def testSubstring(self):
+        self.assertEqual(self.Index.Search("rroll"), ["Drumroll"])
+        self.assertEqual(self.Index.Search("d sir"), ["Air raid siren"])  # Across words
+
+    def testFuzzy(self):
+        self.assertEqual(self.Index.Search("drumrol"), ["Drumroll"])  # A prefix, so no need to guess
+        self.assertEqual(self.Index.Search("durmroll"), ["Drumroll"])
+        self.assertEqual(self.Index.Search("xyzzy"), [])
+
+    def testLimit(self):
+        self.assertEqual(len(self.Index.Search("air", limit=2)), 2)
+
+    def testUpdates(self):
+        self.Index.Rename("Airhorn", "Foghorn")
+        self.Index.Remove("AIRPORT announcement")
+        self.Index.Remove("missing")
+        self.Index.Add("Airlock hiss")
+        self.assertEqual(set(self.Index.Search("air")), {"Air raid siren", "Airlock hiss", "Chair squeak"})
+        self.assertEqual(self.Index.Search("fog"), ["Foghorn"])
+        self.assertEqual(len(self.Index), len(TITLES))
+        self.Index.Clear()
+        self.assertEqual(self.Index.Search("air"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import wave
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audioengine
+import pcm
+
+
+class CaptureSink (audioengine.NullSink):
+    """Keeps everything the engine outputs"""
+    def __init__ (self):
+        self.Data = bytearray()
+
+    def Write(self, data):
+        self.Data += data
+
+
+class StreamClipTest(unittest.TestCase):
+    """A streamed clip holds only its head, and the audio read after it matches the clip loaded whole"""
+    def setUp(self):
+        self.Folder = tempfile.mkdtemp() + os.sep
+        self.addCleanup(shutil.rmtree, self.Folder, ignore_errors=True)
+
+    def write(self, filename, seconds, rate=pcm.RATE, channels=pcm.CHANNELS):
+        """A wave file of a sawtooth, so any sample out of place shows"""
+        frames = int(seconds * rate)
+        samples = array("h", (frame % 2000 - 1000 for frame in range(frames) for _channel in range(channels)))
+        with wave.open(self.Folder + filename, "wb") as fle:
+            fle.setnchannels(channels)
+            fle.setsampwidth(2)
+            fle.setframerate(rate)
+            fle.writeframes(samples.tobytes())
+        return self.Folder + filename
+
+    def load(self, path):
+        """The clip streamed, and loaded whole"""
+        stream = audioengine.LoadClip(path, streamThreshold=0)
+        whole = audioengine.LoadClip(path)
+        self.assertIsInstance(stream, audioengine.StreamClip)
+        self.assertIsInstance(whole, audioengine.Clip)
+        return stream, whole
+
+    def testReadAhead(self):
+        stream, whole = self.load(self.write("long.wav", 2.5))
+        self.assertEqual(len(stream), len(stream.Head))
+        self.assertGreaterEqual(len(stream.Head), audioengine.READ_AHEAD * pcm.RATE * pcm.FRAME_BYTES)
+        self.assertLess(len(stream.Head), len(whole))
+        self.assertEqual(stream.Frames, whole.Frames)
+        self.assertEqual(stream.Head + b"".join(stream.Chunks()), bytes(whole.Data))
+
+    def testResampledChunks(self):
+        """The resampler carries on from where the head stopped, so the joins don't click"""
+        stream, whole = self.load(self.write("mono.wav", 2.5, rate=22050, channels=1))
+        self.assertEqual(stream.Head + b"".join(stream.Chunks()), bytes(whole.Data))
+
+    def testLoop(self):
+        stream, whole = self.load(self.write("loop.wav", 1.5))
+        chunks = stream.Chunks(loop=True)
+        data = stream.Head
+        while len(data) < 2 * len(whole):
+            data += next(chunks)
+        self.assertEqual(data[:2 * len(whole)], bytes(whole.Data) * 2)
+
+    def testShortClip(self):
+        """A clip all in its head loops on the head alone"""
+        stream, whole = self.load(self.write("short.wav", 0.5))
+        self.assertEqual(stream.Head, bytes(whole.Data))
+        self.assertEqual(list(stream.Chunks()), [])
+        self.assertEqual(next(stream.Chunks(loop=True)), stream.Head)
+
+    def testRender(self):
+        path = self.write("render.wav", 2.5)
+        rendered = []
+        for clip in self.load(path):
+            sink = CaptureSink()
+            engine = audioengine.AudioEngine(sink)
+            self.addCleanup(engine.Close)
+            engine.Play(clip)
+            engine.Render(3 * pcm.RATE)
+            rendered.append(bytes(sink.Data))
+        self.assertEqual(rendered[0], rendered[1])
+        self.assertEqual(engine.Streamer.Underruns, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
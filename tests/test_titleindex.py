@@ -0,0 +1,70 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from titleindex import TitleIndex
+
+
+class TitleIndexTest(unittest.TestCase):
+    """Pages are plain slices, and a title's index is found from its key however the titles have been moved"""
+    def setUp(self):
+        self.Index = TitleIndex()
+        for title in "ABCDEF":
+            self.Index.Append(title)
+
+    def testSlice(self):
+        self.assertEqual(self.Index.Slice(0, 4), ["A", "B", "C", "D"])
+        self.assertEqual(self.Index.Slice(4, 8), ["E", "F"])
+        self.assertEqual(self.Index.Slice(8, 12), [])
+        self.assertEqual(len(self.Index), 6)
+
+    def testSparseKeys(self):
+        index = TitleIndex()
+        for title, position in (("A", 10), ("B", 20), ("C", 35)):
+            index.Append(title, position)
+        self.assertEqual([index.IndexOf(title) for title in "ABC"], [0, 1, 2])
+        self.assertEqual(index.NextPosition(), 36)
+        with self.assertRaises(ValueError):
+            index.Append("D", 30)
+
+    def testSwap(self):
+        keys = [self.Index.PositionOf(title) for title in "ABCDEF"]
+        self.Index.Swap(1, 4)
+        self.assertEqual(list(self.Index), ["A", "E", "C", "D", "B", "F"])
+        self.assertEqual((self.Index.IndexOf("B"), self.Index.IndexOf("E")), (4, 1))
+        self.assertEqual([self.Index.PositionOf(title) for title in self.Index], keys)  # Only the owners changed
+
+    def testReorder(self):
+        keys = self.Index.Keys()
+        self.Index.Reorder(1, ["D", "B", "C"])
+        self.assertEqual(list(self.Index), ["A", "D", "B", "C", "E", "F"])
+        self.assertEqual([self.Index.IndexOf(title) for title in "DBC"], [1, 2, 3])
+        self.assertEqual(self.Index.Keys(), keys)
+
+    def testInsertAndRemoveMany(self):
+        index = TitleIndex()
+        for title, position in (("A", 0), ("B", 100)):
+            index.Append(title, position)
+        index.InsertMany(1, ["X", "Y"], [40, 60])
+        self.assertEqual(list(index), ["A", "X", "Y", "B"])
+        self.assertEqual(index.IndexOf("Y"), 2)
+        index.RemoveMany(["A", "Y", "missing"])
+        self.assertEqual(list(index), ["X", "B"])
+        self.assertEqual((index.IndexOf("X"), index.IndexOf("B")), (0, 1))
+        self.assertNotIn("Y", index)
+
+    def testRenameAndRemove(self):
+        self.assertEqual(self.Index.Rename("C", "See"), 2)
+        self.assertNotIn("C", self.Index)
+        self.assertEqual(self.Index.IndexOf("See"), 2)
+        self.assertEqual(self.Index.Remove("B"), 1)
+        self.assertEqual(self.Index.Slice(0, 3), ["A", "See", "D"])
+        self.assertEqual(self.Index.IndexOf("F"), 4)
+        with self.assertRaises(KeyError):
+            self.Index.IndexOf("B")
+
+
+if __name__ == "__main__":
+    unittest.main()
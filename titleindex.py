@@ -0,0 +1,126 @@
+from bisect import bisect_left
+
+
+class TitleIndex:
+    """Titles in display order, backed by parallel lists so any page is a plain slice.
+
+    Each title has a sparse position key. Keys only ever go up along the list, so the index of a title is found by
+    bisecting its key and swapping two neighbours only swaps which title owns which key."""
+    def __init__ (self):
+        self._Titles = []  # Titles in order
+        self._Keys = []  # Position keys in ascending order, parallel to _Titles
+        self._Position = {}  # Title | Position key
+
+    def __len__ (self):
+        return len(self._Titles)
+
+    def __contains__ (self, title):
+        return title in self._Position
+
+    def __iter__ (self):
+        return iter(self._Titles)
+
+    def __getitem__ (self, index):
+        return self._Titles[index]
+
+    def Keys(self):
+        """A copy of the position keys, in the same order as the titles"""
+        return list(self._Keys)
+
+    def Slice(self, start, stop):
+        """The titles from index start up to (but not including) stop"""
+        return self._Titles[start:stop]
+
+    def IndexOf(self, title):
+        """The index of a title, raises KeyError if it isn't in the index"""
+        return bisect_left(self._Keys, self._Position[title])
+
+    def PositionOf(self, title):
+        """The position key of a title"""
+        return self._Position[title]
+
+    def NextPosition(self):
+        """The position key the next appended title will get"""
+        return self._Keys[-1] + 1 if self._Keys else 0
+
+    def Append(self, title, position=None):
+        """Add a title to the end, returns its position key"""
+        if position is None:
+            position = self.NextPosition()
+        elif self._Keys and position <= self._Keys[-1]:
+            raise ValueError("positions must be appended in ascending order")
+        self._Titles.append(title)
+        self._Keys.append(position)
+        self._Position[title] = position
+        return position
+
+    def Insert(self, title, position):
+        """Add a title at the index its position key belongs at, returns that index"""
+        index = bisect_left(self._Keys, position)
+        if index < len(self._Keys) and self._Keys[index] == position:
+            raise ValueError("position {0} is already taken".format(position))
+        self._Titles.insert(index, title)
+        self._Keys.insert(index, position)
+        self._Position[title] = position
+        return index
+
+    def InsertMany(self, index, titles, positions):
+        """Add titles at an index, their keys must be ascending and fit between the keys either side"""
+        self._Titles[index:index] = titles
+        self._Keys[index:index] = positions
+        self._Position.update(zip(titles, positions))
+
+    def Remove(self, title):
+        """Remove a title, returns the index it was at"""
+        index = self.IndexOf(title)
+        del self._Titles[index]
+        del self._Keys[index]
+        del self._Position[title]
+        return index
+
+    def RemoveMany(self, titles):
+        """Remove a number of titles in one pass over the index"""
+        titles = set(titles)
+        kept = [(title, key) for title, key in zip(self._Titles, self._Keys) if title not in titles]
+        self._Titles = [title for title, _key in kept]
+        self._Keys = [key for _title, key in kept]
+        for title in titles:
+            self._Position.pop(title, None)
+
+    def Rename(self, curName, newName):
+        """Give the title at curName's index a new name"""
+        index = self.IndexOf(curName)
+        self._Titles[index] = newName
+        self._Position[newName] = self._Position.pop(curName)
+        return index
+
+    def Swap(self, index, otherIndex):
+        """Swap the titles at two indexes, the keys stay where they are"""
+        title = self._Titles[index]
+        other = self._Titles[otherIndex]
+        self._Titles[index] = other
+        self._Titles[otherIndex] = title
+        self._Position[title] = self._Keys[otherIndex]
+        self._Position[other] = self._Keys[index]
+
+    def Reorder(self, start, titles):
+        """Put titles, which must be the ones already there in some order, at the indexes from start onwards.
+
+        The keys stay where they are, like Swap."""
+        for index, title in enumerate(titles, start):
+            self._Titles[index] = title
+            self._Position[title] = self._Keys[index]
+
+    def Load(self, titles, positions):
+        """Replace every title at once, positions must be in ascending order"""
+        titles = list(titles)
+        positions = list(positions)
+        self._Position = dict(zip(titles, positions))
+        self._Keys = positions
+        self._Titles = titles
+
+    def Clear(self):
+        """Remove every title"""
+        self._Titles = []
+        self._Keys = []
+        self._Position = {}
@@ -1,5 +1,10 @@
 import tkinter as tk
 import threading
+import time
+from array import array
+
+import hotkeys
+import stats
 
 class GetInput:
     """Creates a new window to get the input from a question answer is saved to Data attribute"""
@@ -48,3 +53,141 @@ class GetInput:
     def KillSelf(self):
         """Destroys the main holding window"""
         self.top.destroy()
+
+
+class GetKey:
+    """Creates a new window that waits for a key to be pressed, the key is saved to the Data attribute"""
+    def __init__ (self, parent, title=None, question=None, font=None):
+        top = self.top = tk.Toplevel(parent)
+
+        if title:
+            top.title(str(title))
+
+        if question:
+            tk.Label(top, text=str(question), font=font).pack(side="top", fill="x")
+
+        self.KeyText = tk.Label(top, text="Press a key... (Escape to cancel)", font=font)
+        self.KeyText.pack(side="top", fill="x")
+
+        # Whether the key should work when the sound board page doesn't have focus
+        self.Global = tk.BooleanVar(top, value=False)
+        tk.Checkbutton(top, text="Works everywhere", variable=self.Global, font=font,
+                       takefocus=False).pack(side="top")
+
+        # Clear Button
+        tk.Button(top, text="Clear", font=font, takefocus=False,
+                  command=lambda: self.Clear()).pack(side="left")
+
+        # Cancel Button
+        tk.Button(top, text="Cancel", font=font, takefocus=False,
+                  command=lambda: self.Cancel()).pack(side="right")
+
+        top.bind("<KeyPress>", lambda event: self.KeyPress(event))
+        top.focus_set()
+
+        self.Data = None  # The key name, "" to clear the key or None if cancelled
+        self.Scope = hotkeys.SCOPE_WINDOW
+
+    def KeyPress(self, event):
+        """Function run when any key is pressed."""
+        if event.keysym == "Escape":
+            self.Cancel()
+            return
+
+        key = hotkeys.KeyFromEvent(event)
+        if key is None:
+            # Just a modifier so far, wait for the real key
+            return
+
+        self.Data = key
+        self.Scope = hotkeys.SCOPE_GLOBAL if self.Global.get() else hotkeys.SCOPE_WINDOW
+        self.KillSelf()
+
+    def Clear(self):
+        """Function run when clear is pressed."""
+        self.Data = ""
+        self.KillSelf()
+
+    def Cancel(self):
+        """Function run when cancel is pressed."""
+        self.KillSelf()
+
+    def KillSelf(self):
+        """Destroys the main holding window"""
+        self.top.destroy()
+
+
+class StatsWindow:
+    """A window showing the live timing stats, refreshed twice a second"""
+    REFRESH = 500  # ms
+
+    def __init__ (self, parent, extra=None, font=None):
+        top = self.top = tk.Toplevel(parent)
+        top.title("Stats")
+
+        self.Extra = extra  # Function returning a dictionary of other figures to show
+        self.Text = tk.Label(top, font=font, justify="left", anchor="nw")
+        self.Text.pack(side="top", fill="both", expand=True)
+
+        # Dump Button
+        tk.Button(top, text="Dump JSON", font=font,
+                  command=lambda: self.Dump()).pack(side="left")
+
+        # Reset Button
+        tk.Button(top, text="Reset", font=font,
+                  command=lambda: stats.Reset()).pack(side="left")
+
+        self.Refresh()
+
+    def Refresh(self):
+        """Redraw the stats table"""
+        if not self.top.winfo_exists():
+            return
+
+        lines = ["{0:<22}{1:>8}{2:>10}{3:>10}{4:>10}{5:>10}".format("ms", "count", "mean", "p50", "p95", "max")]
+        for name, summary in stats.Snapshot().items():
+            if summary["count"]:
+                lines.append("{0:<22}{1:>8}{2:>10.3f}{3:>10.3f}{4:>10.3f}{5:>10.3f}".format(
+                    name, summary["count"], summary["mean"], summary["p50"], summary["p95"], summary["max"]))
+        if self.Extra is not None:
+            lines.append("")
+            for name, value in self.Extra().items():
+                lines.append("{0:<22}{1:>8}".format(name, value))
+
+        self.Text.configure(text="\n".join(lines))
+        self.top.after(self.REFRESH, self.Refresh)
+
+    def Dump(self):
+        """Save the stats to a JSON file in the current folder"""
+        path = "stats-{0}.json".format(time.strftime("%Y%m%d-%H%M%S"))
+        stats.Dump(path)
+        print("Stats written to " + path)
+
+    def KillSelf(self):
+        """Destroys the main holding window"""
+        self.top.destroy()
+
+
+def WaveformImage(peaks, width, height, colour="#3b6ea5", background="#d9d9d9"):
+    """Draw an envelope from peaks.PeakStore into a new width x height PhotoImage"""
+    envelope = array("b", peaks)
+    points = len(envelope) // 2
+    middle = height / 2
+    scale = middle / 128
+
+    # The rows of pixels each column of the image is filled between
+    columns = []
+    for x in range(width):
+        start = x * points // width
+        stop = max(start + 1, (x + 1) * points // width)
+        low = min(envelope[2*start:2*stop:2])
+        high = max(envelope[2*start+1:2*stop:2])
+        columns.append((int(middle - high * scale), int(middle - low * scale)))
+
+    # Built as one string so the whole image goes to Tk in a single call
+    rows = []
+    for y in range(height):
+        rows.append("{" + " ".join(colour if top <= y <= bottom else background for top, bottom in columns) + "}")
+    image = tk.PhotoImage(width=width, height=height)
+    image.put(" ".join(rows))
+    return image